@@ -6,6 +6,7 @@
 
 from django.contrib import admin
 from .models import Huella, MenuConfig, ImportacionHuella, IneMunicipio, InePoblacion, AuditLog
+from .signals import auditoria_masiva
 
 # Registro del modelo Huella en el admin de Django
 @admin.register(Huella)
@@ -122,6 +123,11 @@ class HuellaAdmin(admin.ModelAdmin):
     
     ordering = ['-created']
 
+    def delete_queryset(self, request, queryset):
+        """Borrado masivo: los AuditLog de cada fila se escriben por lotes."""
+        with auditoria_masiva():
+            super().delete_queryset(request, queryset)
+
 # Registro del modelo MenuConfig en el admin de Django
 @admin.register(MenuConfig)
 class MenuConfigAdmin(admin.ModelAdmin):
@@ -191,4 +197,6 @@ class AuditLogAdmin(admin.ModelAdmin):
     list_filter = ('action', 'model_name', 'user')
     search_fields = ('user__username', 'model_name', 'instance_id')
     readonly_fields = ('timestamp', 'user', 'action', 'model_name', 'instance_id', 'changes')
-    date_hierarchy = 'timestamp'
\ No newline at end of file
+    date_hierarchy = 'timestamp'
+    # Evita el count(*) sobre todas las particiones en cada listado
+    show_full_result_count = False
\ No newline at end of file
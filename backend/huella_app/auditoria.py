@@ -0,0 +1,244 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Escritura diferida de AuditLog. Las señales dejan cada registro en una
+# lista de Redis (al confirmar la transacción) y la tarea volcar_auditoria
+# los escribe por lotes con bulk_create, fuera de la petición HTTP. Cada lote
+# pasa antes a una lista "en proceso" y se borra de ella al guardarse, así que
+# un volcado interrumpido no pierde ni duplica registros.
+# Si Redis no está disponible, el registro se guarda en el momento.
+# Mantenimiento de las particiones mensuales de huella_app_auditlog: creación
+# por adelantado y purga por retención (DETACH / DROP, sin DELETE masivo).
+
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from redis.exceptions import LockNotOwnedError
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+CLAVE_PENDIENTES = 'huella:auditoria:pendientes'
+# Lote que se está escribiendo en AuditLog
+CLAVE_PROCESANDO = 'huella:auditoria:procesando'
+# Cerrojo para que solo un proceso vuelque la lista a la vez
+CLAVE_BLOQUEO = 'huella:auditoria:bloqueo'
+# Marca de "volcado ya encolado" para no lanzar una tarea por cada registro
+CLAVE_VOLCADO_ENCOLADO = 'huella:auditoria:volcado-encolado'
+
+# Particiones mensuales: huella_app_auditlog_pAAAA_MM (ver migración 0011)
+PREFIJO_PARTICION = 'huella_app_auditlog_p'
+PARTICION_DEFECTO = 'huella_app_auditlog_default'
+
+_cliente = None
+
+
+def cliente():
+    global _cliente
+    if _cliente is None:
+        _cliente = redis.Redis.from_url(settings.HUELLA_AUDITORIA_REDIS_URL)
+    return _cliente
+
+
+def _serializar(registro):
+    return json.dumps({
+        'user_id': registro.user_id,
+        'action': registro.action,
+        'model_name': registro.model_name,
+        'instance_id': registro.instance_id,
+        'timestamp': registro.timestamp.isoformat(),
+        'changes': registro.changes,
+    })
+
+
+def _deserializar(dato):
+    valores = json.loads(dato)
+    valores['timestamp'] = parse_datetime(valores['timestamp'])
+    return AuditLog(**valores)
+
+
+def encolar(registro):
+    """
+    Deja el registro en la lista de pendientes cuando se confirme la
+    transacción en curso (si se deshace, no se audita nada).
+    """
+    dato = _serializar(registro)
+    transaction.on_commit(lambda: _enviar(registro, dato))
+
+
+def _enviar(registro, dato):
+    try:
+        pendientes = cliente().rpush(CLAVE_PENDIENTES, dato)
+        if pendientes >= settings.HUELLA_AUDITORIA_TAMANO_VOLCADO and cliente().set(
+            CLAVE_VOLCADO_ENCOLADO, 1, nx=True, ex=settings.HUELLA_AUDITORIA_INTERVALO_VOLCADO
+        ):
+            from .tasks import volcar_auditoria
+            volcar_auditoria.delay()
+    except redis.RedisError as e:
+        logger.warning('Auditoría: Redis no disponible (%s), se guarda el registro directamente', e)
+        registro.save()
+
+
+def _mover_lote(conexion, tamano_lote):
+    """Pasa hasta `tamano_lote` registros de la lista de pendientes a la de en proceso (atómico)."""
+    with conexion.pipeline(transaction=True) as pipe:
+        for _ in range(tamano_lote):
+            pipe.lmove(CLAVE_PENDIENTES, CLAVE_PROCESANDO, 'LEFT', 'RIGHT')
+        return [dato for dato in pipe.execute() if dato is not None]
+
+
+def _sin_escritos(registros):
+    """
+    Quita de un lote recuperado los registros que ya están en AuditLog (el
+    volcado anterior murió después de guardarlos y antes de borrar el lote).
+    """
+    existentes = set(AuditLog.objects.filter(
+        timestamp__in={registro.timestamp for registro in registros}
+    ).values_list('timestamp', 'model_name', 'instance_id', 'action'))
+    return [
+        registro for registro in registros
+        if (registro.timestamp, registro.model_name, registro.instance_id, registro.action) not in existentes
+    ]
+
+
+def volcar(tamano_lote=None):
+    """
+    Escribe en AuditLog todos los registros pendientes, en lotes de
+    `tamano_lote` con bulk_create. Cada lote se mueve primero a la lista en
+    proceso y se borra de ella solo después de guardarse; si un volcado
+    anterior se interrumpió, su lote se escribe primero, sin los registros
+    que ya llegaron a guardarse. Devuelve el número de registros escritos.
+    """
+    tamano_lote = tamano_lote or settings.HUELLA_AUDITORIA_TAMANO_VOLCADO
+    conexion = cliente()
+    bloqueo = conexion.lock(CLAVE_BLOQUEO, timeout=300)
+    if not bloqueo.acquire(blocking=False):
+        # Otro proceso está volcando
+        return 0
+
+    escritos = 0
+    try:
+        conexion.delete(CLAVE_VOLCADO_ENCOLADO)
+        datos = conexion.lrange(CLAVE_PROCESANDO, 0, -1)
+        recuperado = bool(datos)
+        while True:
+            if not datos:
+                datos = _mover_lote(conexion, tamano_lote)
+                if not datos:
+                    break
+            registros = [_deserializar(dato) for dato in datos]
+            if recuperado:
+                registros = _sin_escritos(registros)
+                recuperado = False
+            AuditLog.objects.bulk_create(registros)
+            conexion.delete(CLAVE_PROCESANDO)
+            escritos += len(registros)
+            datos = None
+            try:
+                # El cerrojo caduca a los 300 s: se renueva en cada lote
+                bloqueo.reacquire()
+            except LockNotOwnedError:
+                # Ya lo tiene otro proceso, que sigue con el volcado
+                break
+    finally:
+        try:
+            bloqueo.release()
+        except LockNotOwnedError:
+            logger.warning('Auditoría: el cerrojo del volcado caducó antes de terminar')
+    return escritos
+
+
+# ==========================================
+# PARTICIONES MENSUALES DE AUDITLOG
+# ==========================================
+
+def _mes(fecha, desplazamiento=0):
+    """Primer instante (UTC) del mes de `fecha` desplazado `desplazamiento` meses."""
+    indice = fecha.year * 12 + fecha.month - 1 + desplazamiento
+    return datetime(indice // 12, indice % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _particiones(cursor):
+    """Particiones mensuales existentes como {nombre: inicio del mes}."""
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass',
+        [AuditLog._meta.db_table],
+    )
+    particiones = {}
+    for (nombre,) in cursor.fetchall():
+        if nombre.startswith(PREFIJO_PARTICION):
+            anio, mes = nombre[len(PREFIJO_PARTICION):].split('_')
+            particiones[nombre] = datetime(int(anio), int(mes), 1, tzinfo=dt_timezone.utc)
+    return particiones
+
+
+def asegurar_particiones(meses_adelante=None, using='default'):
+    """
+    Crea las particiones del mes actual y de los `meses_adelante` siguientes
+    que falten. Si la partición por defecto ya tiene filas de ese mes, se
+    mueven a la nueva antes de adjuntarla. Devuelve los nombres creados.
+    """
+    if meses_adelante is None:
+        meses_adelante = settings.HUELLA_AUDITORIA_MESES_ADELANTE
+    tabla = AuditLog._meta.db_table
+    ahora = datetime.now(dt_timezone.utc)
+    creadas = []
+    with connections[using].cursor() as cursor:
+        existentes = _particiones(cursor)
+        for desplazamiento in range(meses_adelante + 1):
+            desde, hasta = _mes(ahora, desplazamiento), _mes(ahora, desplazamiento + 1)
+            nombre = f'{PREFIJO_PARTICION}{desde:%Y_%m}'
+            if nombre in existentes:
+                continue
+            with transaction.atomic(using=using):
+                cursor.execute(f'CREATE TABLE {nombre} (LIKE {tabla} INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH movidas AS (DELETE FROM {PARTICION_DEFECTO} '
+                    f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+                    f'INSERT INTO {nombre} SELECT * FROM movidas',
+                    [desde, hasta],
+                )
+                cursor.execute(
+                    f'ALTER TABLE {tabla} ATTACH PARTITION {nombre} FOR VALUES FROM (%s) TO (%s)',
+                    [desde, hasta],
+                )
+            creadas.append(nombre)
+    return creadas
+
+
+def purgar_particiones(retencion_meses=None, modo=None, using='default'):
+    """
+    Quita las particiones de meses anteriores a la retención: 'drop' las
+    borra y 'detach' las desengancha y deja la tabla para archivarla. Es una
+    operación de catálogo; solo las filas antiguas que hubieran caído en la
+    partición por defecto se borran con DELETE. Devuelve los nombres purgados.
+    """
+    if retencion_meses is None:
+        retencion_meses = settings.HUELLA_AUDITORIA_RETENCION_MESES
+    modo = modo or settings.HUELLA_AUDITORIA_PURGA
+    if modo not in ('drop', 'detach'):
+        raise ValueError(f"Modo de purga no válido: {modo} (use 'drop' o 'detach')")
+
+    tabla = AuditLog._meta.db_table
+    limite = _mes(datetime.now(dt_timezone.utc), -retencion_meses)
+    purgadas = []
+    with connections[using].cursor() as cursor:
+        for nombre, desde in sorted(_particiones(cursor).items()):
+            if _mes(desde, 1) > limite:
+                continue
+            with transaction.atomic(using=using):
+                cursor.execute(f'ALTER TABLE {tabla} DETACH PARTITION {nombre}')
+                if modo == 'drop':
+                    cursor.execute(f'DROP TABLE {nombre}')
+            purgadas.append(nombre)
+        cursor.execute(f'DELETE FROM {PARTICION_DEFECTO} WHERE "timestamp" < %s', [limite])
+    return purgadas
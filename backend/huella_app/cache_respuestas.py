@@ -0,0 +1,143 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Caché en Redis de las respuestas de lectura de HuellaViewSet (listado,
+# acciones por_* y estadisticas). La clave incluye la "versión de la huella",
+# un contador que sube cada vez que se confirma una escritura en Huella o
+# termina una importación: las respuestas anteriores dejan de leerse sin
+# tener que buscarlas ni borrarlas, y caducan solas a los
+# HUELLA_CACHE_TTL segundos. Si Redis no está disponible la vista responde
+# sin caché.
+
+import hashlib
+import json
+import logging
+from functools import partial, wraps
+
+import redis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION = 'huella:respuestas:version'
+PREFIJO_RESPUESTA = 'huella:respuestas'
+# Parámetros que los filtros comparan ya normalizados (ver filtros.filtro_direccion)
+PARAMETROS_DIRECCION = {'provincia', 'poblacion', 'nombrevia'}
+# Atributo de la conexión con el id de la última transacción que subió la versión
+ATRIBUTO_ULTIMA_TRANSACCION = 'huella_version_transaccion'
+
+_cliente = None
+
+
+def cliente():
+    global _cliente
+    if _cliente is None:
+        _cliente = redis.Redis.from_url(
+            settings.HUELLA_CACHE_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5
+        )
+    return _cliente
+
+
+def _incrementar_version():
+    try:
+        cliente().incr(CLAVE_VERSION)
+    except redis.RedisError as e:
+        logger.warning('Caché de respuestas: no se pudo subir la versión (%s)', e)
+
+
+def version():
+    """Versión actual de la huella, o None si Redis no está disponible."""
+    try:
+        return int(cliente().get(CLAVE_VERSION) or 0)
+    except redis.RedisError as e:
+        logger.warning('Caché de respuestas: no se pudo leer la versión (%s)', e)
+        return None
+
+
+def _subir_version(conexion, transaccion):
+    """Al confirmar: solo la primera llamada de cada transacción sube la versión."""
+    if getattr(conexion, ATRIBUTO_ULTIMA_TRANSACCION, None) == transaccion:
+        return
+    setattr(conexion, ATRIBUTO_ULTIMA_TRANSACCION, transaccion)
+    _incrementar_version()
+
+
+def invalidar(using='default'):
+    """
+    Sube la versión de la huella cuando se confirme la transacción en curso,
+    una sola vez por transacción aunque se escriban miles de filas. La
+    transacción se reconoce por su id en PostgreSQL: cada llamada deja su
+    on_commit, y al confirmar solo el primero sube la versión (si se deshace
+    un savepoint, Django descarta los suyos y quedan los del resto).
+    """
+    conexion = transaction.get_connection(using)
+    if not conexion.in_atomic_block:
+        _incrementar_version()
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute('SELECT pg_current_xact_id()::text')
+        (transaccion,) = cursor.fetchone()
+    transaction.on_commit(partial(_subir_version, conexion, transaccion), using=using)
+
+
+def _parametros(request):
+    """Parámetros de la petición en orden fijo; los de dirección, normalizados."""
+    # normalization depende de importador, que importa este módulo
+    from .normalization import normalizar_texto
+
+    parametros = []
+    for nombre, valores in sorted(request.query_params.lists()):
+        if nombre in PARAMETROS_DIRECCION:
+            valores = [normalizar_texto(valor) for valor in valores]
+        parametros.append([nombre, sorted(valores)])
+    return parametros
+
+
+def _clave(conexion, nombre, request, kwargs):
+    version = int(conexion.get(CLAVE_VERSION) or 0)
+    # Los enlaces next/previous llevan el host: forma parte de la clave
+    firma = json.dumps([request.build_absolute_uri('/'), kwargs, _parametros(request)], sort_keys=True)
+    return f'{PREFIJO_RESPUESTA}:{version}:{nombre}:{hashlib.md5(firma.encode("utf-8")).hexdigest()}'
+
+
+def respuesta_cacheada(nombre):
+    """
+    Decorador para métodos de un ViewSet: devuelve la respuesta guardada para
+    los mismos parámetros y versión, o calcula y guarda la respuesta si es un
+    200. La cabecera X-Cache indica HIT o MISS.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(self, request, *args, **kwargs):
+            if not settings.HUELLA_CACHE_ACTIVA:
+                return vista(self, request, *args, **kwargs)
+            try:
+                conexion = cliente()
+                clave = _clave(conexion, nombre, request, kwargs)
+                guardada = conexion.get(clave)
+            except redis.RedisError as e:
+                logger.warning('Caché de respuestas: Redis no disponible (%s)', e)
+                return vista(self, request, *args, **kwargs)
+
+            if guardada is not None:
+                respuesta = Response(json.loads(guardada))
+                respuesta['X-Cache'] = 'HIT'
+                return respuesta
+
+            respuesta = vista(self, request, *args, **kwargs)
+            if respuesta.status_code == 200:
+                try:
+                    conexion.set(
+                        clave, json.dumps(respuesta.data, cls=DjangoJSONEncoder), ex=settings.HUELLA_CACHE_TTL
+                    )
+                except redis.RedisError as e:
+                    logger.warning('Caché de respuestas: no se pudo guardar (%s)', e)
+                respuesta['X-Cache'] = 'MISS'
+            return respuesta
+        return envoltura
+    return decorador
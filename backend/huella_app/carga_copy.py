@@ -0,0 +1,207 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Carga de ficheros de huella mediante COPY FROM STDIN (psycopg 3).
+# El fichero se vuelca en una tabla temporal de staging (se borra al terminar
+# la transacción), se valida con SQL y se fusiona en huella_app_huella con
+# una única sentencia set-based.
+
+import csv
+import io
+import time
+import uuid
+
+from django.db import connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils import timezone
+
+from . import cache_respuestas
+from .importador import (
+    CAMPOS_COORDENADAS, CAMPOS_OBLIGATORIOS, COLUMNAS_CABECERAS,
+    LONGITUDES_MAXIMAS, NUM_CAMPOS_MINIMOS, params_auditoria, sql_upsert,
+)
+
+# Número máximo de errores que se conservan en el resumen
+MAX_ERRORES_RESUMEN = 50
+
+
+class CargaRechazada(Exception):
+    """El fichero tiene filas inválidas y no se permiten rechazos."""
+
+    def __init__(self, resumen):
+        self.resumen = resumen
+        super().__init__(f'{resumen["rechazadas"]} filas rechazadas')
+
+
+def _sql_validacion(staging):
+    """UPDATE que marca en la columna error las filas que no pueden cargarse."""
+    condiciones = [
+        (f"btrim(coalesce({campo}, '')) = ''", f'{campo} está vacío')
+        for campo in CAMPOS_OBLIGATORIOS
+    ] + [
+        (f'length({campo}) > {maximo}', f'{campo} supera {maximo} caracteres')
+        for campo, maximo in LONGITUDES_MAXIMAS.items()
+    ]
+    casos = ' '.join(f"WHEN {condicion} THEN '{motivo}'" for condicion, motivo in condiciones)
+    # Solo se reescriben las filas inválidas
+    filtro = ' OR '.join(condicion for condicion, _ in condiciones)
+    return f'UPDATE {staging} SET error = CASE {casos} END WHERE {filtro}'
+
+
+def _sql_origen(staging):
+    """
+    SELECT con las filas válidas de staging, tipadas y sin duplicados
+    (para cada iddomicilioto gana la última línea del fichero).
+    """
+    columnas = []
+    for campo in COLUMNAS_CABECERAS:
+        if campo in CAMPOS_COORDENADAS:
+            # Mismo criterio que importador._a_decimal: lo que no sea un
+            # número de dos cifras enteras se guarda como NULL
+            columnas.append(
+                f"CASE WHEN btrim({campo}) ~ '^[-+]?[0-9]{{1,2}}([.,][0-9]+)?$' "
+                f"THEN replace(btrim({campo}), ',', '.')::numeric END"
+            )
+        else:
+            columnas.append(f"coalesce({campo}, '')")
+    return (
+        f'SELECT DISTINCT ON (iddomicilioto) {", ".join(columnas)} '
+        f'FROM {staging} WHERE error IS NULL '
+        f'ORDER BY iddomicilioto, num_linea DESC'
+    )
+
+
+def cargar_fichero_copy(fichero, delimiter=';', permitir_rechazos=True, using='default',
+                        usuario_id=None, contexto_auditoria=None):
+    """
+    Carga un fichero CH abierto en modo texto mediante COPY + fusión SQL.
+
+    Devuelve un diccionario con las filas cargadas en staging, rechazadas,
+    duplicadas, creadas, actualizadas y sin cambios, además de una muestra
+    de errores (número de línea, motivo).
+
+    Si `permitir_rechazos` es False y hay filas inválidas, no se fusiona nada
+    y se lanza CargaRechazada. `usuario_id` y `contexto_auditoria` van al
+    AuditLog resumen de la fusión.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or not is_psycopg3:
+        raise RuntimeError('La carga con COPY requiere PostgreSQL y psycopg 3')
+
+    inicio = time.monotonic()
+    staging = f'huella_staging_{uuid.uuid4().hex[:12]}'
+    columnas_staging = ', '.join(f'{campo} text' for campo in COLUMNAS_CABECERAS)
+
+    resumen = {
+        'cargadas': 0,
+        'rechazadas': 0,
+        'duplicadas': 0,
+        'creadas': 0,
+        'actualizadas': 0,
+        'sin_cambios': 0,
+        'errores': [],
+    }
+
+    # Todo en una transacción: la tabla temporal desaparece al terminar, también
+    # si el proceso muere a mitad de la carga
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE {staging} '
+            f'(num_linea bigint, {columnas_staging}, error text) ON COMMIT DROP'
+        )
+        # 1. COPY: las filas con menos columnas de las mínimas se rechazan
+        #    aquí; el resto se rellena hasta 36 columnas
+        reader = csv.reader(fichero, delimiter=delimiter)
+        total_columnas = len(COLUMNAS_CABECERAS)
+        copy_sql = (
+            f'COPY {staging} (num_linea, {", ".join(COLUMNAS_CABECERAS)}) FROM STDIN'
+        )
+        with cursor.copy(copy_sql) as copy:
+            for num_linea, row in enumerate(reader, 1):
+                if len(row) < NUM_CAMPOS_MINIMOS:
+                    resumen['rechazadas'] += 1
+                    if len(resumen['errores']) < MAX_ERRORES_RESUMEN:
+                        resumen['errores'].append((
+                            num_linea,
+                            f'esperadas al menos {NUM_CAMPOS_MINIMOS} columnas, '
+                            f'se encontraron {len(row)}',
+                        ))
+                    continue
+                valores = row[:total_columnas]
+                valores += [''] * (total_columnas - len(valores))
+                copy.write_row([num_linea] + valores)
+                resumen['cargadas'] += 1
+
+        # 2. Validación set-based
+        cursor.execute(_sql_validacion(staging))
+        cursor.execute(
+            f'SELECT count(*) FILTER (WHERE error IS NOT NULL), '
+            f'count(DISTINCT iddomicilioto) FILTER (WHERE error IS NULL) FROM {staging}'
+        )
+        invalidas, distintas = cursor.fetchone()
+        resumen['rechazadas'] += invalidas
+        resumen['duplicadas'] = resumen['cargadas'] - invalidas - distintas
+
+        hueco = MAX_ERRORES_RESUMEN - len(resumen['errores'])
+        if invalidas and hueco > 0:
+            cursor.execute(
+                f'SELECT num_linea, error FROM {staging} WHERE error IS NOT NULL '
+                f'ORDER BY num_linea LIMIT %s',
+                [hueco],
+            )
+            resumen['errores'].extend(cursor.fetchall())
+            resumen['errores'].sort()
+
+        if resumen['rechazadas'] and not permitir_rechazos:
+            raise CargaRechazada(resumen)
+
+        # 3. Fusión en huella_app_huella
+        ahora = timezone.now()
+        cursor.execute(
+            sql_upsert(_sql_origen(staging), using),
+            [ahora, ahora] + params_auditoria(usuario_id, contexto_auditoria),
+        )
+        creadas, actualizadas = cursor.fetchone()
+        if creadas or actualizadas:
+            cache_respuestas.invalidar(using)
+        resumen['creadas'] = creadas
+        resumen['actualizadas'] = actualizadas
+        resumen['sin_cambios'] = distintas - creadas - actualizadas
+
+    resumen['segundos'] = round(time.monotonic() - inicio, 2)
+    return resumen
+
+
+def formatear_resumen(resumen):
+    """Texto legible del resumen de carga para log_proceso o la consola."""
+    lineas = [
+        f"Filas cargadas en staging: {resumen['cargadas']}",
+        f"Filas rechazadas: {resumen['rechazadas']}",
+        f"Filas duplicadas: {resumen['duplicadas']}",
+        f"Fusionadas: {resumen['creadas']} creadas, {resumen['actualizadas']} actualizadas, "
+        f"{resumen['sin_cambios']} sin cambios",
+    ]
+    if 'segundos' in resumen:
+        lineas.append(f"Tiempo: {resumen['segundos']} s")
+    for num_linea, error in resumen['errores']:
+        lineas.append(f'  Línea {num_linea}: {error}')
+    return '\n'.join(lineas)
+
+
+def cargar_importacion(importacion, delimiter=';'):
+    """
+    Carga con COPY el fichero de una ImportacionHuella (el normalizado si
+    existe) y añade el resumen a su log_proceso. Devuelve el resumen.
+    """
+    with importacion.fichero_a_cargar.open('rb') as binario:
+        fichero = io.TextIOWrapper(binario, encoding='utf-8', newline='')
+        resumen = cargar_fichero_copy(
+            fichero, delimiter=delimiter, usuario_id=importacion.usuario_id,
+            contexto_auditoria={'importacion': importacion.id},
+        )
+
+    importacion.log_proceso += f"\n[CARGA COPY]\n{formatear_resumen(resumen)}"
+    importacion.save(update_fields=['log_proceso'])
+    return resumen
@@ -0,0 +1,140 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Estadísticas de Huella a partir de la tabla de contadores EstadisticaHuella.
+# Los triggers de la migración 0023 apuntan en CambioEstadistica lo que suma o
+# resta cada INSERT/UPDATE/DELETE sobre Huella, sin tocar los contadores;
+# aplicar_cambios() suma esas diferencias en los contadores (una sola
+# ejecución a la vez, en orden fijo) y reconciliar() los recalcula desde cero
+# por si alguna escritura se los hubiera saltado (p. ej. un TRUNCATE).
+
+import logging
+
+from django.db import connections, transaction
+from django.db.models import Count
+
+from . import cache_respuestas
+from .models import CambioEstadistica, EstadisticaHuella, Huella
+
+logger = logging.getLogger(__name__)
+
+TAMANO_TOP = 5
+# Bloqueo consultivo de aplicar_cambios (tasks.CLAVE_BLOQUEO_TRAMOS usa 4201
+# y exportacion.CLAVE_BLOQUEO_EXPORTACIONES 4202)
+CLAVE_BLOQUEO_CAMBIOS = 4203
+
+# Contadores recalculados con una sola lectura de Huella (GROUPING SETS)
+SQL_RECALCULAR = """
+SELECT CASE
+           WHEN GROUPING(provincia) = 0 THEN 'provincia'
+           WHEN GROUPING(poblacion) = 0 THEN 'poblacion'
+           WHEN GROUPING(codigopostal) = 0 THEN 'codigopostal'
+           ELSE 'total'
+       END AS dimension,
+       coalesce(provincia, poblacion, codigopostal, '') AS valor,
+       count(*) AS cantidad
+FROM {huella}
+GROUP BY GROUPING SETS ((provincia), (poblacion), (codigopostal), ())
+"""
+
+
+def leer_estadisticas():
+    """Datos del endpoint estadisticas: consultas sobre los contadores, sin leer Huella."""
+    total = EstadisticaHuella.objects.filter(
+        dimension=EstadisticaHuella.TOTAL
+    ).values_list('cantidad', flat=True).first()
+    distintos = dict(
+        EstadisticaHuella.objects.filter(
+            dimension__in=EstadisticaHuella.DIMENSIONES, cantidad__gt=0
+        ).values('dimension').annotate(valores=Count('id')).values_list('dimension', 'valores')
+    )
+
+    def top(dimension):
+        filas = EstadisticaHuella.objects.filter(
+            dimension=dimension, cantidad__gt=0
+        ).order_by('-cantidad').values_list('valor', 'cantidad')[:TAMANO_TOP]
+        return [{dimension: valor, 'cantidad': cantidad} for valor, cantidad in filas]
+
+    return {
+        'total_huellas': total or 0,
+        'total_provincias': distintos.get('provincia', 0),
+        'total_poblaciones': distintos.get('poblacion', 0),
+        'total_codigos_postal': distintos.get('codigopostal', 0),
+        'top_provincias': top('provincia'),
+        'top_poblaciones': top('poblacion'),
+    }
+
+
+def aplicar_cambios(using='default'):
+    """
+    Suma en EstadisticaHuella las diferencias pendientes de CambioEstadistica
+    y las borra, en una transacción. Solo escribe en los contadores este
+    proceso (si ya hay otro en curso, no hace nada), así que las
+    importaciones no se bloquean entre sí por ellos. Los contadores que
+    quedan a 0 se borran. Devuelve el número de contadores modificados.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    tabla = qn(EstadisticaHuella._meta.db_table)
+    cambios = qn(CambioEstadistica._meta.db_table)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s, 0)', [CLAVE_BLOQUEO_CAMBIOS])
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute(
+            f'CREATE TEMP TABLE estadisticas_cambios ON COMMIT DROP AS '
+            f'WITH movidos AS (DELETE FROM {cambios} RETURNING dimension, valor, delta) '
+            f'SELECT dimension, valor, sum(delta)::bigint AS delta FROM movidos '
+            f'GROUP BY dimension, valor HAVING sum(delta) <> 0'
+        )
+        cursor.execute(
+            f'INSERT INTO {tabla} AS e (dimension, valor, cantidad) '
+            f'SELECT dimension, valor, delta FROM estadisticas_cambios ORDER BY dimension, valor '
+            f'ON CONFLICT (dimension, valor) DO UPDATE SET cantidad = e.cantidad + EXCLUDED.cantidad'
+        )
+        aplicados = cursor.rowcount
+        cursor.execute(
+            f'DELETE FROM {tabla} e USING estadisticas_cambios c '
+            f'WHERE e.dimension = c.dimension AND e.valor = c.valor AND e.cantidad = 0'
+        )
+        if aplicados:
+            cache_respuestas.invalidar(using)
+    return aplicados
+
+
+def reconciliar(using='default'):
+    """
+    Recalcula todos los contadores desde Huella y apunta en
+    CambioEstadistica la corrección de los que estén mal (la suma el
+    siguiente aplicar_cambios). No bloquea Huella: con REPEATABLE READ,
+    Huella, los contadores y los cambios pendientes se leen de la misma foto,
+    y en esa foto los contadores más los cambios pendientes deben dar lo que
+    hay en Huella. Debe llamarse fuera de cualquier transacción.
+    Devuelve el número de contadores que estaban mal.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    huella = qn(Huella._meta.db_table)
+    tabla = qn(EstadisticaHuella._meta.db_table)
+    cambios = qn(CambioEstadistica._meta.db_table)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cursor.execute(
+            'CREATE TEMP TABLE estadisticas_recalculadas ON COMMIT DROP AS '
+            + SQL_RECALCULAR.format(huella=huella)
+        )
+        cursor.execute(
+            f'INSERT INTO {cambios} (dimension, valor, delta) '
+            f'SELECT dimension, valor, coalesce(r.cantidad, 0) - coalesce(e.cantidad, 0) - coalesce(p.delta, 0) '
+            f'FROM estadisticas_recalculadas r '
+            f'FULL JOIN {tabla} e USING (dimension, valor) '
+            f'FULL JOIN (SELECT dimension, valor, sum(delta) AS delta FROM {cambios} GROUP BY dimension, valor) p '
+            f'USING (dimension, valor) '
+            f'WHERE coalesce(r.cantidad, 0) <> coalesce(e.cantidad, 0) + coalesce(p.delta, 0)'
+        )
+        corregidos = cursor.rowcount
+    if corregidos:
+        logger.warning('[ESTADISTICAS] Reconciliación: %s contadores corregidos', corregidos)
+    return corregidos
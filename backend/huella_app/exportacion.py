@@ -0,0 +1,225 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Última Modificación: 17-10-2026
+# Cambio realizado: la firma de una exportación incluye la versión de la huella
+# y solo se reutilizan las exportaciones del mismo usuario.
+# Descripción:
+# Exportación de huellas a CSV. Las filas se leen con un cursor de servidor
+# (values_list().iterator()) y el CSV se genera por bloques, de modo que la
+# memoria no depende del número de filas y el primer byte sale enseguida.
+# Las exportaciones grandes se piden como ExportacionHuella: un worker de
+# Celery escribe el fichero (CSV o NDJSON con gzip) en el almacenamiento de
+# media y la misma petición del mismo usuario dentro de HUELLA_EXPORTACION_TTL
+# lo reutiliza mientras no se haya escrito en Huella.
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache_respuestas
+from .filtros import filtro_direccion
+from .models import ExportacionHuella, Huella
+from .normalization import normalizar_texto
+
+# Columnas exportadas, en orden
+CAMPOS_EXPORTACION = [
+    'iddomicilioto', 'codigopostal', 'provincia', 'poblacion', 'tipovia', 'nombrevia',
+    'numero', 'codigoolt', 'codigocto', 'tipocto', 'observaciones',
+]
+# Filtros admitidos por la exportación
+FILTROS_EXPORTACION = ['codigopostal', 'provincia', 'poblacion', 'codigoolt', 'codigocto']
+# Filtros que filtrar_exportacion compara normalizados (ver filtros.filtro_direccion)
+FILTROS_DIRECCION = {'provincia', 'poblacion'}
+
+# Espacio de claves de los advisory locks que evitan crear dos exportaciones
+# con la misma firma a la vez (tasks.CLAVE_BLOQUEO_TRAMOS usa 4201)
+CLAVE_BLOQUEO_EXPORTACIONES = 4202
+
+
+def filtrar_exportacion(filtros):
+    """
+    Huellas a exportar según `filtros` (diccionario con las claves de
+    FILTROS_EXPORTACION; las vacías se ignoran). Sin orden: ordenar obligaría
+    a leer todas las filas antes de enviar la primera.
+    """
+    queryset = Huella.objects.order_by()
+    if filtros.get('codigopostal'):
+        queryset = queryset.filter(codigopostal=filtros['codigopostal'])
+    if filtros.get('provincia'):
+        queryset = queryset.filter(filtro_direccion('provincia', filtros['provincia'], prefijo=True))
+    if filtros.get('poblacion'):
+        queryset = queryset.filter(filtro_direccion('poblacion', filtros['poblacion'], prefijo=True))
+    if filtros.get('codigoolt'):
+        queryset = queryset.filter(codigoolt__icontains=filtros['codigoolt'])
+    if filtros.get('codigocto'):
+        queryset = queryset.filter(codigocto__icontains=filtros['codigocto'])
+    return queryset
+
+
+def filas_exportacion(queryset, tamano_bloque=None):
+    """
+    Tuplas con CAMPOS_EXPORTACION leídas con un cursor de servidor,
+    `tamano_bloque` filas por viaje. La lectura va dentro de una transacción:
+    en autocommit el cursor de servidor se declara WITH HOLD y PostgreSQL
+    calcula el resultado entero antes de devolver la primera fila. La
+    transacción se cierra al agotar o abandonar el generador.
+    """
+    tamano_bloque = tamano_bloque or settings.HUELLA_EXPORTACION_TAMANO_BLOQUE
+    with transaction.atomic(using=queryset.db):
+        yield from queryset.values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=tamano_bloque)
+
+
+def generar_csv(queryset, tamano_bloque=None):
+    """
+    Genera el CSV de `queryset` como trozos de texto: primero la cabecera y
+    después un trozo cada `tamano_bloque` filas.
+    """
+    tamano_bloque = tamano_bloque or settings.HUELLA_EXPORTACION_TAMANO_BLOQUE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CAMPOS_EXPORTACION)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pendientes = 0
+    for fila in filas_exportacion(queryset, tamano_bloque):
+        writer.writerow(fila)
+        pendientes += 1
+        if pendientes == tamano_bloque:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    if pendientes:
+        yield buffer.getvalue()
+
+
+# ==========================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ==========================================
+
+def normalizar_filtros(filtros):
+    """
+    Filtros de FILTROS_EXPORTACION con valor, sin espacios sobrantes. Los de
+    dirección se guardan normalizados para que "A Coruña" y "coruña" den la
+    misma firma (filtrar_exportacion los vuelve a normalizar sin cambiarlos).
+    """
+    normalizados = {}
+    for campo in FILTROS_EXPORTACION:
+        valor = str(filtros.get(campo) or '').strip()
+        if campo in FILTROS_DIRECCION:
+            valor = normalizar_texto(valor)
+        if valor:
+            normalizados[campo] = valor
+    return normalizados
+
+
+def firma_exportacion(formato, filtros, version=None):
+    """
+    Hash de `formato`, los filtros ya normalizados y la `version` de la
+    huella (cache_respuestas.CLAVE_VERSION), que sube con cada escritura en
+    Huella: un fichero generado antes de una importación no se reutiliza
+    después.
+    """
+    datos = json.dumps([formato, filtros, version], sort_keys=True)
+    return hashlib.md5(datos.encode('utf-8')).hexdigest()
+
+
+def solicitar_exportacion(formato, filtros, usuario=None):
+    """
+    Devuelve (exportacion, reutilizada). Si `usuario` tiene una exportación
+    con la misma firma creada hace menos de HUELLA_EXPORTACION_TTL segundos
+    y no ha fallado, se devuelve esa; si no, se crea una PENDIENTE que hay
+    que encolar. Un advisory lock por firma impide que dos peticiones
+    iguales simultáneas generen dos ficheros. Sin Redis no se conoce la
+    versión de la huella y no se reutiliza nada.
+    """
+    filtros = normalizar_filtros(filtros)
+    version = cache_respuestas.version()
+    firma = firma_exportacion(formato, filtros, version)
+    limite = timezone.now() - timedelta(seconds=settings.HUELLA_EXPORTACION_TTL)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, hashtext(%s))', [CLAVE_BLOQUEO_EXPORTACIONES, firma])
+        existente = None
+        if version is not None:
+            existente = (
+                ExportacionHuella.objects
+                .filter(firma=firma, usuario=usuario, fecha_creacion__gte=limite)
+                .exclude(estado='ERROR')
+                .order_by('-fecha_creacion')
+                .first()
+            )
+        if existente is not None:
+            return existente, True
+        exportacion = ExportacionHuella.objects.create(
+            usuario=usuario, formato=formato, filtros=filtros, firma=firma,
+        )
+    return exportacion, False
+
+
+def _escribir_csv(salida, filas):
+    writer = csv.writer(salida)
+    writer.writerow(CAMPOS_EXPORTACION)
+    total = 0
+    for fila in filas:
+        writer.writerow(fila)
+        total += 1
+    return total
+
+
+def _escribir_ndjson(salida, filas):
+    total = 0
+    for fila in filas:
+        salida.write(json.dumps(dict(zip(CAMPOS_EXPORTACION, fila)), ensure_ascii=False))
+        salida.write('\n')
+        total += 1
+    return total
+
+
+def escribir_exportacion(exportacion, tamano_bloque=None):
+    """
+    Escribe el fichero de `exportacion` comprimido con gzip en un temporal
+    del worker y lo guarda en su FileField. Las filas se leen con el cursor
+    de servidor de filas_exportacion. Devuelve el número de filas escritas.
+    """
+    queryset = filtrar_exportacion(exportacion.filtros)
+    filas = filas_exportacion(queryset, tamano_bloque)
+    escribir = _escribir_ndjson if exportacion.formato == 'ndjson' else _escribir_csv
+
+    with tempfile.TemporaryFile() as temporal:
+        with gzip.open(temporal, 'wt', encoding='utf-8', newline='') as salida:
+            total = escribir(salida, filas)
+        temporal.seek(0)
+        nombre = f'huella_export_{exportacion.id}.{exportacion.formato}.gz'
+        exportacion.fichero.save(nombre, File(temporal), save=False)
+    exportacion.filas = total
+    return total
+
+
+def limpiar_exportaciones(retencion=None):
+    """
+    Borra las exportaciones (y sus ficheros) creadas hace más de `retencion`
+    segundos (HUELLA_EXPORTACION_RETENCION). Devuelve cuántas se borran.
+    """
+    if retencion is None:
+        retencion = settings.HUELLA_EXPORTACION_RETENCION
+    limite = timezone.now() - timedelta(seconds=retencion)
+    caducadas = list(ExportacionHuella.objects.filter(fecha_creacion__lt=limite))
+    for exportacion in caducadas:
+        if exportacion.fichero:
+            exportacion.fichero.delete(save=False)
+        exportacion.delete()
+    return len(caducadas)
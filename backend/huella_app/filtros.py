@@ -0,0 +1,147 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Filtros de la API de huellas. La búsqueda (?search=) usa la columna de texto
+# completo Huella.busqueda (índice GIN) en lugar de un ILIKE por cada campo,
+# y ordena los resultados por relevancia (salvo con paginación por cursor).
+# Los términos se buscan como prefijo de palabra; en los códigos de OLT y CTO
+# también como subcadena, sobre sus índices de trigramas.
+# Los filtros por provincia, población y vía comparan el valor normalizado
+# (sin tildes, mayúsculas, sin signos) con las columnas *_normalizada, por
+# igualdad o por prefijo, de modo que usan sus índices.
+
+import re
+
+import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from .models import Huella
+from .normalization import ARTICULOS, normalizar_texto
+from .paginacion import HuellaCursorPagination
+
+# Mismo diccionario que el trigger que calcula Huella.busqueda (migración 0015)
+CONFIGURACION_BUSQUEDA = 'simple'
+
+# Campos en los que un término de ?search= también vale como trozo intermedio
+# ("432CT" encuentra "1505432CT0419"), con índice de trigramas (migración 0014)
+CAMPOS_BUSQUEDA_CODIGO = ['codigoolt', 'codigocto']
+# Los trigramas solo ayudan con términos de al menos 3 caracteres
+LONGITUD_MINIMA_SUBCADENA = 3
+
+# Artículos con los que puede empezar un nombre ya normalizado ("L'" → "L")
+ARTICULOS_NORMALIZADOS = sorted({normalizar_texto(articulo) for articulo in ARTICULOS})
+
+
+def filtro_direccion(campo, valor, prefijo=False):
+    """
+    Q sobre la columna normalizada de `campo` ('provincia', 'poblacion' o
+    'nombrevia'). Se acepta el valor con o sin artículo inicial: "coruña",
+    "A CORUNA" y "a coruña" encuentran "A CORUÑA". Con `prefijo` basta con
+    que el nombre empiece por el valor. Cada alternativa es una búsqueda por
+    igualdad o por LIKE 'prefijo%' sobre el índice de la columna.
+    """
+    normalizado = normalizar_texto(valor)
+    if not normalizado:
+        return Q(pk__in=[])
+    columna = f'{campo}_normalizada'
+    candidatos = [normalizado] + [f'{articulo} {normalizado}' for articulo in ARTICULOS_NORMALIZADOS]
+    if not prefijo:
+        return Q(**{f'{columna}__in': candidatos})
+    condicion = Q()
+    for candidato in candidatos:
+        condicion |= Q(**{f'{columna}__startswith': candidato})
+    return condicion
+
+
+class HuellaFilter(django_filters.FilterSet):
+    """Filtros del listado de huellas; los de dirección ignoran tildes, mayúsculas y artículo."""
+    provincia = django_filters.CharFilter(method='filtrar_direccion')
+    poblacion = django_filters.CharFilter(method='filtrar_direccion')
+    nombrevia = django_filters.CharFilter(method='filtrar_direccion')
+
+    class Meta:
+        model = Huella
+        fields = [
+            'iddomicilioto',
+            'codigopostal',
+            'provincia',
+            'poblacion',
+            'tipovia',
+            'nombrevia',
+            'codigoolt',
+            'codigocto',
+            'tipocto',
+        ]
+
+    def filtrar_direccion(self, queryset, name, value):
+        return queryset.filter(filtro_direccion(name, value))
+
+
+def consulta_prefijos(terminos):
+    """
+    Convierte los términos de búsqueda en un tsquery en el que todos deben
+    aparecer y cada uno vale como prefijo ('1505432CT' encuentra
+    '1505432CT0419'). Cada término va entre comillas para que PostgreSQL lo
+    trocee con el mismo analizador que la columna.
+    """
+    partes = []
+    for termino in terminos:
+        termino = termino.replace('\\', '\\\\').replace("'", "''")
+        partes.append(f"'{termino}':*")
+    return ' & '.join(partes)
+
+
+class BusquedaTextoFilter(filters.SearchFilter):
+    """
+    Búsqueda de texto completo sobre Huella.busqueda.
+
+    Deben aparecer todos los términos, cada uno como comienzo de una palabra
+    de algún campo: "mayor" encuentra "CALLE MAYOR" y "1505432" encuentra
+    "1505432CT0419", pero "ayor" no encuentra nada. En codigoolt y codigocto
+    (CAMPOS_BUSQUEDA_CODIGO) un término de 3 o más caracteres vale además
+    como subcadena, como hacía la búsqueda por ILIKE ("432CT").
+
+    Sin ?ordering explícito los resultados salen por relevancia (ts_rank;
+    pesan más los códigos que la dirección y esta más que las observaciones;
+    las coincidencias solo por subcadena puntúan 0). Ordenar por relevancia
+    obliga a puntuar todas las coincidencias antes de devolver la primera
+    página: con términos muy comunes conviene pedir ?ordering=-created.
+    Con ?paginacion=cursor tampoco se ordena por relevancia: el cursor solo
+    recorre el orden (-created, -id).
+    Debe ir detrás de OrderingFilter en filter_backends para que el orden por
+    defecto de la vista no tape el de relevancia.
+    """
+
+    @staticmethod
+    def condicion_termino(termino):
+        """Q de las huellas que contienen `termino` como prefijo o, en los códigos, como subcadena."""
+        condicion = Q(busqueda=SearchQuery(
+            consulta_prefijos([termino]), config=CONFIGURACION_BUSQUEDA, search_type='raw'
+        ))
+        if len(termino) >= LONGITUD_MINIMA_SUBCADENA:
+            for campo in CAMPOS_BUSQUEDA_CODIGO:
+                condicion |= Q(**{f'{campo}__icontains': termino})
+        return condicion
+
+    def filter_queryset(self, request, queryset, view):
+        terminos = [termino for termino in self.get_search_terms(request) if re.search(r'\w', termino)]
+        if not terminos:
+            return queryset
+
+        for termino in terminos:
+            queryset = queryset.filter(self.condicion_termino(termino))
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        if isinstance(getattr(view, 'paginator', None), HuellaCursorPagination):
+            return queryset
+        consulta = SearchQuery(
+            consulta_prefijos(terminos), config=CONFIGURACION_BUSQUEDA, search_type='raw'
+        )
+        return queryset.annotate(
+            relevancia=SearchRank(F('busqueda'), consulta)
+        ).order_by('-relevancia', '-created', '-id')
@@ -0,0 +1,177 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Consultas espaciales sobre Huella.lat/lng sin PostGIS. Cada huella guarda
+# en celda_geo la celda de una rejilla de 2^26 x 2^26 sobre longitud y
+# latitud, numerada en orden Z (bits de x e y intercalados, como un geohash
+# binario). Con ese orden, cualquier celda de un nivel más grueso es un rango
+# continuo de celda_geo, así que un área se cubre con unas pocas celdas y se
+# lee con otros tantos rangos del índice B-tree; después se filtra con las
+# coordenadas exactas. La misma numeración la calcula en SQL la función
+# huella_celda_geo (migración 0020).
+
+import math
+from decimal import ROUND_FLOOR, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+# Nivel de la rejilla guardada en celda_geo (celdas de ~0,6 m x 0,3 m)
+NIVEL_MAXIMO = 26
+# Radio medio de la Tierra en metros (distancia haversine)
+RADIO_TIERRA = 6371008.8
+METROS_POR_GRADO = math.pi * RADIO_TIERRA / 180
+
+# Máscaras para intercalar los bits de un entero de hasta 32 bits
+MASCARAS_BITS = [
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+]
+
+
+def _expandir_bits(valor):
+    """Separa los bits de `valor` con un cero entre cada dos (abc → 0a0b0c)."""
+    for desplazamiento, mascara in MASCARAS_BITS:
+        valor = (valor | (valor << desplazamiento)) & mascara
+    return valor
+
+
+def _indice(valor, minimo, rango, nivel):
+    """Columna (o fila) de la rejilla de `nivel` en la que cae `valor`."""
+    # Decimal: el mismo redondeo que el numeric de PostgreSQL en los bordes
+    divisiones = 1 << nivel
+    indice = ((Decimal(str(valor)) - minimo) / rango * divisiones).to_integral_value(rounding=ROUND_FLOOR)
+    return min(max(int(indice), 0), divisiones - 1)
+
+
+def indices_celda(lat, lng, nivel=NIVEL_MAXIMO):
+    """(x, y) de la celda de `nivel` que contiene el punto."""
+    return _indice(lng, -180, 360, nivel), _indice(lat, -90, 180, nivel)
+
+
+def numero_celda(x, y):
+    """Número en orden Z de la celda (x, y): bits de x en las posiciones pares y de y en las impares."""
+    return _expandir_bits(x) | (_expandir_bits(y) << 1)
+
+
+def celda(lat, lng, nivel=NIVEL_MAXIMO):
+    """Número de la celda de `nivel` que contiene el punto (igual que huella_celda_geo en SQL)."""
+    return numero_celda(*indices_celda(lat, lng, nivel))
+
+
+def rango_celda(numero, nivel):
+    """Rango [desde, hasta] de celda_geo que ocupa la celda `numero` de `nivel`."""
+    desplazamiento = 2 * (NIVEL_MAXIMO - nivel)
+    return numero << desplazamiento, ((numero + 1) << desplazamiento) - 1
+
+
+def cubrir_area(sur, oeste, norte, este, max_celdas=None):
+    """
+    Devuelve (nivel, celdas): el nivel más fino en el que el área se cubre con
+    como mucho `max_celdas` celdas (HUELLA_GEO_MAX_CELDAS) y los números de
+    esas celdas, ordenados.
+    """
+    max_celdas = max_celdas or settings.HUELLA_GEO_MAX_CELDAS
+    for nivel in range(NIVEL_MAXIMO, -1, -1):
+        x0, y0 = indices_celda(sur, oeste, nivel)
+        x1, y1 = indices_celda(norte, este, nivel)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_celdas:
+            break
+    celdas = sorted(numero_celda(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return nivel, celdas
+
+
+def rangos_area(sur, oeste, norte, este, max_celdas=None):
+    """Rangos [desde, hasta] de celda_geo que cubren el área, unidos si son contiguos."""
+    nivel, celdas = cubrir_area(sur, oeste, norte, este, max_celdas)
+    rangos = []
+    for numero in celdas:
+        desde, hasta = rango_celda(numero, nivel)
+        if rangos and rangos[-1][1] + 1 == desde:
+            rangos[-1][1] = hasta
+        else:
+            rangos.append([desde, hasta])
+    return rangos
+
+
+def filtro_area(sur, oeste, norte, este):
+    """
+    Q de las huellas dentro del área: los rangos de celda_geo (índice) y,
+    para recortar los bordes de las celdas, las coordenadas exactas.
+    """
+    condicion = Q()
+    for desde, hasta in rangos_area(sur, oeste, norte, este):
+        condicion |= Q(celda_geo__range=(desde, hasta))
+    return condicion & Q(
+        lat__gte=Decimal(str(sur)), lat__lte=Decimal(str(norte)),
+        lng__gte=Decimal(str(oeste)), lng__lte=Decimal(str(este)),
+    )
+
+
+def area_radio(lat, lng, radio):
+    """(sur, oeste, norte, este) del rectángulo que contiene el círculo de `radio` metros."""
+    grados_lat = radio / METROS_POR_GRADO
+    # Cerca de los polos el círculo abarca todas las longitudes
+    coseno = math.cos(math.radians(lat))
+    grados_lng = 180 if coseno < 1e-6 else min(grados_lat / coseno, 180)
+    return (
+        max(lat - grados_lat, -90), max(lng - grados_lng, -180),
+        min(lat + grados_lat, 90), min(lng + grados_lng, 180),
+    )
+
+
+def expresion_distancia(lat, lng):
+    """Distancia haversine, en metros, de cada huella al punto (lat, lng)."""
+    lat_huella = Radians(Cast('lat', FloatField()))
+    lng_huella = Radians(Cast('lng', FloatField()))
+    lat_punto = math.radians(lat)
+    seno_lat = Power(Sin((lat_huella - Value(lat_punto)) / Value(2.0)), 2)
+    seno_lng = Power(Sin((lng_huella - Value(math.radians(lng))) / Value(2.0)), 2)
+    a = seno_lat + Value(math.cos(lat_punto)) * Cos(lat_huella) * seno_lng
+    return Value(2 * RADIO_TIERRA) * ASin(Least(Sqrt(a), Value(1.0)))
+
+
+def huellas_en_radio(queryset, lat, lng, radio):
+    """
+    Huellas de `queryset` a `radio` metros o menos del punto, con la
+    anotación `distancia` y ordenadas de la más cercana a la más lejana.
+    """
+    return queryset.filter(filtro_area(*area_radio(lat, lng, radio))).annotate(
+        distancia=expresion_distancia(lat, lng)
+    ).filter(distancia__lte=radio).order_by('distancia', 'id')
+
+
+def leer_numero(parametros, nombre, minimo, maximo, defecto=None):
+    """
+    Lee el parámetro `nombre` como número entre `minimo` y `maximo`.
+    Lanza ValueError con el mensaje para el cliente si falta o no es válido.
+    """
+    texto = parametros.get(nombre)
+    if texto in (None, ''):
+        if defecto is None:
+            raise ValueError(f'Se requiere parámetro "{nombre}"')
+        return defecto
+    try:
+        valor = float(Decimal(texto))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'El parámetro "{nombre}" debe ser un número')
+    if not minimo <= valor <= maximo:
+        raise ValueError(f'El parámetro "{nombre}" debe estar entre {minimo} y {maximo}')
+    return valor
+
+
+def leer_area(parametros):
+    """(sur, oeste, norte, este) de los parámetros de la petición; ValueError si no es válida."""
+    sur = leer_numero(parametros, 'sur', -90, 90)
+    oeste = leer_numero(parametros, 'oeste', -180, 180)
+    norte = leer_numero(parametros, 'norte', -90, 90)
+    este = leer_numero(parametros, 'este', -180, 180)
+    if sur > norte or oeste > este:
+        raise ValueError('El área debe cumplir sur <= norte y oeste <= este')
+    return sur, oeste, norte, este
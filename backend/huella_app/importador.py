@@ -0,0 +1,482 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Motor de carga masiva de líneas de huella.
+# Las filas del fichero CH se acumulan en lotes y cada lote se escribe con una
+# única sentencia INSERT ... ON CONFLICT (iddomicilioto) DO UPDATE. Solo se
+# escriben las filas cuyo hash de contenido difiere del guardado.
+
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import cache_respuestas
+from .models import AuditLog, Huella
+
+
+# Orden de columnas del estándar CH. Los ficheros reales traen entre 27 y 36
+# columnas; las que falten se completan con valores vacíos.
+COLUMNAS_CABECERAS = [
+    'iddomicilioto',                    # 1
+    'codigopostal',                     # 2
+    'provincia',                        # 3
+    'poblacion',                        # 4
+    'tipovia',                          # 5
+    'nombrevia',                        # 6
+    'idtecnicovia',                     # 7
+    'numero',                           # 8
+    'bisduplicado',                     # 9
+    'bloquedelafinca',                  # 10
+    'identificadorfincaportal',         # 11
+    'letrafinca',                       # 12
+    'escalera',                         # 13
+    'planta',                           # 14
+    'mano1',                            # 15
+    'mano2',                            # 16
+    'observaciones',                    # 17
+    'flagdummy',                        # 18
+    'codigoinevia',                     # 19
+    'codigocensal',                     # 20
+    'codigopai',                        # 21
+    'codigoolt',                        # 22
+    'codigocto',                        # 23
+    'tipocto',                          # 24
+    'direccioncto',                     # 25
+    'tipopermiso',                      # 26
+    'tipocajaderivacion',               # 27
+    'numunidadesinmobiliarias',         # 28
+    'numviviendas',                     # 29
+    'fechaalta',                        # 30
+    'codigocajaderivacion',             # 31
+    'ubicacioncajaderivacion',          # 32
+    'coinv',                            # 33
+    'area_comercial',                   # 34
+    'lat',                              # 35
+    'lng',                              # 36
+]
+
+NUM_CAMPOS_MINIMOS = 27
+CAMPOS_OBLIGATORIOS = ['iddomicilioto', 'codigopostal', 'provincia', 'poblacion']
+CAMPOS_COORDENADAS = ['lat', 'lng']
+TAMANO_LOTE = 5000
+TAMANO_BLOQUE_LECTURA = 1024 * 1024
+# Errores que cada tramo devuelve con detalle (el resto solo se cuenta)
+MAX_ERRORES_TRAMO = 1000
+# Filas como máximo en cada AuditLog resumen de una fusión. Con COPY el fichero
+# entero es una sola sentencia: las diferencias de todas las filas
+# actualizadas en un único jsonb podrían superar el límite de tamaño
+FILAS_POR_AUDITORIA = TAMANO_LOTE
+# Tabla temporal (de cada conexión) a la que se copia cada lote antes de fusionarlo
+TABLA_LOTE = 'huella_lote_importacion'
+
+# Longitud máxima de cada columna de texto según el modelo
+LONGITUDES_MAXIMAS = {
+    campo: Huella._meta.get_field(campo).max_length
+    for campo in COLUMNAS_CABECERAS
+    if Huella._meta.get_field(campo).max_length
+}
+
+
+class FilaInvalida(ValueError):
+    """Fila del fichero que no cumple el formato CH. `campo` es None si falla la fila entera."""
+
+    def __init__(self, mensaje, campo=None):
+        self.campo = campo
+        super().__init__(mensaje)
+
+
+def _a_decimal(valor):
+    """Convierte una coordenada a Decimal; devuelve None si no es válida."""
+    valor = valor.strip()
+    if not valor:
+        return None
+    try:
+        numero = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        return None
+    if not numero.is_finite() or abs(numero) >= 100:
+        return None
+    return numero
+
+
+def parsear_fila(row):
+    """
+    Convierte una fila del CSV en un diccionario con los campos de Huella.
+    Lanza FilaInvalida si la fila no puede guardarse.
+    """
+    if len(row) < NUM_CAMPOS_MINIMOS:
+        raise FilaInvalida(
+            f'esperadas al menos {NUM_CAMPOS_MINIMOS} columnas, se encontraron {len(row)}'
+        )
+
+    valores = row[:len(COLUMNAS_CABECERAS)]
+    valores += [''] * (len(COLUMNAS_CABECERAS) - len(valores))
+    datos = dict(zip(COLUMNAS_CABECERAS, valores))
+
+    for campo in CAMPOS_OBLIGATORIOS:
+        if not datos[campo].strip():
+            raise FilaInvalida(f'{campo} está vacío', campo)
+
+    for campo, maximo in LONGITUDES_MAXIMAS.items():
+        if len(datos[campo]) > maximo:
+            raise FilaInvalida(f'{campo} supera {maximo} caracteres', campo)
+
+    for campo in CAMPOS_COORDENADAS:
+        datos[campo] = _a_decimal(datos[campo])
+
+    return datos
+
+
+def sql_hash_contenido(alias='', using='default'):
+    """
+    Expresión SQL con el hash de contenido de una fila de Huella: md5 de los
+    campos de COLUMNAS_CABECERAS separados por el carácter 0x1F, como uuid.
+    Las coordenadas se convierten al tipo de la columna antes de pasarlas a
+    texto, para que el hash de la fila entrante coincida con el guardado.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    prefijo = f'{alias}.' if alias else ''
+    partes = []
+    for nombre in COLUMNAS_CABECERAS:
+        campo = Huella._meta.get_field(nombre)
+        columna = f'{prefijo}{qn(campo.column)}'
+        if nombre in CAMPOS_COORDENADAS:
+            partes.append(f"coalesce({columna}::{campo.db_type(connection)}::text, '')")
+        else:
+            partes.append(columna)
+    return f'md5(concat_ws(chr(31), {", ".join(partes)}))::uuid'
+
+
+def sql_upsert(origen, using='default'):
+    """
+    Construye la sentencia que fusiona en Huella las filas de `origen`.
+
+    `origen` es una consulta SQL que devuelve las columnas de
+    COLUMNAS_CABECERAS en ese orden. Los dos primeros parámetros de la
+    sentencia son los valores de created y updated; después van los de
+    `origen` y, al final, el id del usuario y un objeto JSON con el contexto
+    de la carga para AuditLog. La sentencia devuelve una única fila
+    (creadas, actualizadas).
+
+    Las filas cuyo hash de contenido coincide con el guardado no llegan al
+    INSERT: no se bloquean ni se reescriben y no generan WAL.
+
+    En lugar de un AuditLog por fila, la misma sentencia escribe un registro
+    resumen por acción (CREATED / UPDATED) y por cada FILAS_POR_AUDITORIA
+    filas, con el número de filas y los rangos de ids que cubre. Los de
+    UPDATED incluyen en 'cambios' las diferencias campo a campo de sus filas,
+    {id: {campo: [antes, después]}}, calculadas contra los valores que había
+    antes de la fusión.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    tabla = qn(Huella._meta.db_table)
+    auditoria = qn(AuditLog._meta.db_table)
+    columnas = [qn(Huella._meta.get_field(nombre).column) for nombre in COLUMNAS_CABECERAS]
+    actualizables = columnas[1:] + ['"hash_contenido"', '"updated"']
+
+    diferencias = []
+    for nombre, columna in zip(COLUMNAS_CABECERAS[1:], columnas[1:]):
+        nuevo = f'e.{columna}'
+        if nombre in CAMPOS_COORDENADAS:
+            nuevo += f'::{Huella._meta.get_field(nombre).db_type(connection)}'
+        diferencias.append(
+            f"'{nombre}', CASE WHEN h.{columna} IS DISTINCT FROM {nuevo} "
+            f"THEN jsonb_build_array(h.{columna}, {nuevo}) END"
+        )
+
+    return (
+        f'WITH entrada AS ('
+        f'SELECT o.*, {sql_hash_contenido("o", using)} AS hash_contenido, '
+        f'%s::timestamptz AS created, %s::timestamptz AS updated '
+        f'FROM ({origen}) AS o({", ".join(columnas)})), '
+        # Valores anteriores de las filas que van a cambiar: todas las CTE ven
+        # la misma instantánea, anterior a la fusión
+        f'anteriores AS ('
+        f'SELECT h."id", jsonb_strip_nulls(jsonb_build_object({", ".join(diferencias)})) AS cambios '
+        f'FROM entrada e JOIN {tabla} h ON h."iddomicilioto" = e."iddomicilioto" '
+        f'WHERE h."hash_contenido" IS DISTINCT FROM e.hash_contenido), '
+        f'fusion AS ('
+        f'INSERT INTO {tabla} ({", ".join(columnas)}, "hash_contenido", "created", "updated") '
+        f'SELECT e.* FROM entrada e WHERE NOT EXISTS ('
+        f'SELECT 1 FROM {tabla} h WHERE h."iddomicilioto" = e."iddomicilioto" '
+        f'AND h."hash_contenido" = e.hash_contenido) '
+        f'ON CONFLICT ("iddomicilioto") DO UPDATE SET '
+        + ', '.join(f'{c} = EXCLUDED.{c}' for c in actualizables)
+        + f' WHERE {tabla}."hash_contenido" IS DISTINCT FROM EXCLUDED."hash_contenido" '
+        f'RETURNING "id", (xmax = 0) AS creada), '
+        # Parte (registro de auditoría) de cada fila: FILAS_POR_AUDITORIA por acción
+        f'partes AS ('
+        f'SELECT id, creada, (row_number() OVER (PARTITION BY creada ORDER BY id) - 1) '
+        f'/ {FILAS_POR_AUDITORIA} AS parte FROM fusion), '
+        # Ids consecutivos agrupados en rangos [desde, hasta] (islas)
+        f'rangos AS ('
+        f'SELECT creada, parte, min(id) AS desde, max(id) AS hasta, count(*) AS filas FROM ('
+        f'SELECT id, creada, parte, id - row_number() OVER (PARTITION BY creada, parte ORDER BY id) AS isla '
+        f'FROM partes) AS p GROUP BY creada, parte, isla), '
+        f'auditoria AS ('
+        f'INSERT INTO {auditoria} ("user_id", "action", "model_name", "instance_id", "timestamp", "changes") '
+        f"SELECT %s::integer, CASE WHEN creada THEN 'CREATED' ELSE 'UPDATED' END, 'Huella', NULL, now(), "
+        f"jsonb_build_object('filas', sum(filas), "
+        f"'rangos', jsonb_agg(jsonb_build_array(desde, hasta) ORDER BY desde)) || %s::jsonb "
+        f"|| CASE WHEN creada THEN '{{}}'::jsonb ELSE jsonb_build_object('cambios', ("
+        f"SELECT coalesce(jsonb_object_agg(a.id, a.cambios), '{{}}'::jsonb) "
+        f'FROM anteriores a JOIN partes p ON p.id = a.id WHERE NOT p.creada AND p.parte = r.parte)) END '
+        f'FROM rangos r GROUP BY creada, parte) '
+        f'SELECT count(*) FILTER (WHERE creada), count(*) FILTER (WHERE NOT creada) FROM fusion'
+    )
+
+
+def params_auditoria(usuario_id=None, contexto=None):
+    """Últimos parámetros de sql_upsert: usuario y contexto del registro de auditoría."""
+    return [usuario_id, json.dumps(contexto or {})]
+
+
+class UpsertHuellas:
+    """
+    Acumula filas de huella y las escribe por lotes.
+
+    Cada lote se copia con COPY a una tabla temporal y se fusiona con un único
+    INSERT ... ON CONFLICT DO UPDATE que solo escribe las filas cuyo hash de
+    contenido ha cambiado, de modo que los contadores distinguen entre
+    creadas, actualizadas y sin cambios. COPY evita convertir en Python miles
+    de valores en parámetros de la sentencia.
+
+    `usuario_id` y `contexto_auditoria` (diccionario, p. ej. la importación)
+    se guardan en el AuditLog resumen de cada lote.
+
+    Si se indica `al_volcar`, se llama con el propio objeto dentro de la
+    transacción de cada lote, después de escribirlo: lo que guarde (por
+    ejemplo un punto de control) se confirma junto con el lote.
+
+    Uso:
+        upsert = UpsertHuellas(tamano_lote=5000)
+        for datos in filas:
+            upsert.agregar(datos)
+        resumen = upsert.cerrar()
+    """
+
+    CONTADORES = ('procesadas', 'creadas', 'actualizadas', 'sin_cambios', 'duplicadas', 'lotes')
+
+    def __init__(self, tamano_lote=TAMANO_LOTE, using='default', al_volcar=None,
+                 usuario_id=None, contexto_auditoria=None):
+        self.tamano_lote = max(1, tamano_lote)
+        self.using = using
+        self.al_volcar = al_volcar
+        self._auditoria = params_auditoria(usuario_id, contexto_auditoria)
+        self.pendientes = {}
+        self.procesadas = 0
+        self.creadas = 0
+        self.actualizadas = 0
+        self.sin_cambios = 0
+        self.duplicadas = 0
+        self.lotes = 0
+        self._inicio = time.monotonic()
+        self._sql = self._construir_sql()
+
+    def contadores(self):
+        return {nombre: getattr(self, nombre) for nombre in self.CONTADORES}
+
+    def restaurar(self, contadores):
+        """Continúa los contadores de una carga anterior (punto de control)."""
+        for nombre in self.CONTADORES:
+            setattr(self, nombre, contadores.get(nombre, 0))
+
+    def _construir_sql(self):
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        campos = [Huella._meta.get_field(nombre) for nombre in COLUMNAS_CABECERAS]
+        columnas = ', '.join(qn(campo.column) for campo in campos)
+        tipadas = ', '.join(f'{qn(campo.column)} {campo.db_type(connection)}' for campo in campos)
+        self._sql_tabla = f'CREATE TEMP TABLE IF NOT EXISTS {TABLA_LOTE} ({tipadas})'
+        self._sql_copy = f'COPY {TABLA_LOTE} ({columnas}) FROM STDIN'
+        return sql_upsert(f'SELECT {columnas} FROM {TABLA_LOTE} ORDER BY "iddomicilioto"', self.using)
+
+    def agregar(self, datos):
+        """Añade una fila al lote actual; si el lote se llena, lo escribe."""
+        self.procesadas += 1
+        clave = datos['iddomicilioto']
+        # ON CONFLICT no admite dos filas con la misma clave en una sentencia:
+        # dentro de un lote gana la última aparición.
+        if clave in self.pendientes:
+            self.duplicadas += 1
+        self.pendientes[clave] = datos
+        if len(self.pendientes) >= self.tamano_lote:
+            self.volcar()
+
+    def volcar(self):
+        """Escribe el lote pendiente en una única sentencia."""
+        if not self.pendientes:
+            return
+        # Orden fijo por clave: tramos que se escriben en paralelo bloquean
+        # las filas en el mismo orden y no pueden provocar deadlocks
+        filas = [self.pendientes[clave] for clave in sorted(self.pendientes)]
+        self.pendientes = {}
+
+        ahora = timezone.now()
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(self._sql_tabla)
+                cursor.execute(f'TRUNCATE {TABLA_LOTE}')
+                with cursor.copy(self._sql_copy) as copy:
+                    for fila in filas:
+                        copy.write_row([fila[campo] for campo in COLUMNAS_CABECERAS])
+                cursor.execute(self._sql, [ahora, ahora] + self._auditoria)
+                creadas, actualizadas = cursor.fetchone()
+
+            if creadas or actualizadas:
+                cache_respuestas.invalidar(self.using)
+            self.creadas += creadas
+            self.actualizadas += actualizadas
+            self.sin_cambios += len(filas) - creadas - actualizadas
+            self.lotes += 1
+            if self.al_volcar:
+                self.al_volcar(self)
+
+    def cerrar(self):
+        """Escribe lo pendiente y devuelve el resumen final."""
+        self.volcar()
+        return self.resumen()
+
+    @property
+    def filas_por_segundo(self):
+        transcurrido = time.monotonic() - self._inicio
+        return self.procesadas / transcurrido if transcurrido > 0 else 0.0
+
+    def resumen(self):
+        return {
+            'procesadas': self.procesadas,
+            'creadas': self.creadas,
+            'actualizadas': self.actualizadas,
+            'sin_cambios': self.sin_cambios,
+            'duplicadas': self.duplicadas,
+            'lotes': self.lotes,
+            'filas_por_segundo': round(self.filas_por_segundo, 1),
+        }
+
+
+# ==========================================
+# IMPORTACIÓN POR TRAMOS (SUB-TAREAS PARALELAS)
+# ==========================================
+
+def _contar_lineas(fichero, inicio, fin):
+    """Cuenta los saltos de línea entre dos posiciones de un fichero binario."""
+    fichero.seek(inicio)
+    pendiente = fin - inicio
+    lineas = 0
+    while pendiente > 0:
+        bloque = fichero.read(min(TAMANO_BLOQUE_LECTURA, pendiente))
+        if not bloque:
+            break
+        lineas += bloque.count(b'\n')
+        pendiente -= len(bloque)
+    return lineas
+
+
+def dividir_en_tramos(fichero, tamano_tramo):
+    """
+    Divide un fichero binario en rangos de bytes que empiezan y terminan en
+    límite de línea.
+
+    Devuelve una lista de tuplas (inicio, fin, primera_linea), donde
+    primera_linea es el número de línea (base 1) del primer registro del tramo.
+    """
+    fichero.seek(0, 2)
+    total = fichero.tell()
+    tramos = []
+    inicio = 0
+    primera_linea = 1
+    while inicio < total:
+        fin = min(inicio + max(1, tamano_tramo), total)
+        if fin < total:
+            # Avanzar hasta el final de la línea en curso
+            fichero.seek(fin - 1)
+            fichero.readline()
+            fin = fichero.tell()
+        tramos.append((inicio, fin, primera_linea))
+        primera_linea += _contar_lineas(fichero, inicio, fin)
+        inicio = fin
+    return tramos
+
+
+def leer_lineas(fichero, inicio, fin):
+    """Genera las líneas (bytes) de un fichero binario entre inicio y fin."""
+    fichero.seek(inicio)
+    posicion = inicio
+    while posicion < fin:
+        linea = fichero.readline()
+        if not linea:
+            break
+        posicion += len(linea)
+        yield linea
+
+
+def importar_rango(fichero, inicio, fin, primera_linea, delimiter=';', tamano_lote=TAMANO_LOTE,
+                   punto_control=None, al_confirmar=None, usuario_id=None, contexto_auditoria=None):
+    """
+    Valida e importa las líneas de un tramo de un fichero binario.
+
+    `al_confirmar(estado)` recibe el punto de control dentro de la transacción
+    de cada lote y una última vez al terminar el tramo (con completado=True).
+    El estado incluye la posición en bytes y el número de la siguiente línea,
+    los contadores y los primeros MAX_ERRORES_TRAMO errores como
+    (num_linea, linea, motivo). Si se pasa un `punto_control` guardado, la
+    lectura continúa desde su posición con sus contadores.
+
+    Devuelve el estado final.
+    """
+    estado = {
+        'posicion': inicio,
+        'linea': primera_linea,
+        'errores': 0,
+        'detalle_errores': [],
+        'completado': False,
+    }
+    if punto_control:
+        estado.update({clave: punto_control[clave] for clave in estado if clave in punto_control})
+        estado['detalle_errores'] = [list(error) for error in estado['detalle_errores']]
+
+    # Posición y línea tras la última fila leída; se confirman con cada lote
+    leido = {'posicion': estado['posicion'], 'linea': estado['linea']}
+
+    def confirmar(upsert):
+        estado.update(upsert.contadores())
+        estado.update(leido)
+        if al_confirmar:
+            al_confirmar(estado)
+
+    upsert = UpsertHuellas(tamano_lote=tamano_lote, al_volcar=confirmar, usuario_id=usuario_id,
+                           contexto_auditoria=contexto_auditoria)
+    if punto_control:
+        upsert.restaurar(punto_control)
+
+    lineas = leer_lineas(fichero, estado['posicion'], fin)
+    for num_linea, linea in enumerate(lineas, estado['linea']):
+        leido['posicion'] += len(linea)
+        leido['linea'] = num_linea + 1
+        try:
+            texto = linea.decode('utf-8').rstrip('\r\n')
+            datos = parsear_fila(next(csv.reader([texto], delimiter=delimiter), []))
+        except (FilaInvalida, UnicodeDecodeError, csv.Error) as e:
+            estado['errores'] += 1
+            if len(estado['detalle_errores']) < MAX_ERRORES_TRAMO:
+                estado['detalle_errores'].append(
+                    [num_linea, linea.decode('utf-8', 'replace').rstrip('\r\n'), str(e)]
+                )
+            continue
+        upsert.agregar(datos)
+
+    upsert.volcar()
+    estado.update(upsert.contadores())
+    estado.update(leido)
+    estado['completado'] = True
+    if al_confirmar:
+        al_confirmar(estado)
+    return estado
@@ -1,19 +1,24 @@
 # Programa: Weblla
-# Veersion: 1.0
+# Veersion: 1.1
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
+# Última Modificación: 17-10-2026
+# Cambio realizado: importación por lotes con INSERT ... ON CONFLICT DO UPDATE
+# y modo --copy (COPY a tabla de staging + fusión SQL).
 # Descripción:
 # Comando de gestión de Django para importar líneas de huella desde un archivo CSV.
-# El CSV debe tener el separador ; y 36 columnas en el orden definido por COLUMNAS_CABECERAS.
+# El CSV debe tener el separador ; y entre 27 y 36 columnas en el orden definido por COLUMNAS_CABECERAS.
 # El comando maneja errores, permite opciones de verbosidad y puede omitir filas con errores si se especifica.
 
 import csv
+import os
 from django.core.management.base import BaseCommand, CommandError
-from huella_app.models import Huella
+from huella_app.carga_copy import CargaRechazada, cargar_fichero_copy, formatear_resumen
+from huella_app.importador import FilaInvalida, TAMANO_LOTE, UpsertHuellas, parsear_fila
 
 
 class Command(BaseCommand):
-    help = 'Importa líneas de huella desde un archivo CSV. Espera separador ; y 36 columnas en orden COLUMNAS_CABECERAS'
+    help = 'Importa líneas de huella desde un archivo CSV. Espera separador ; y 27-36 columnas en orden COLUMNAS_CABECERAS'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -27,6 +32,17 @@ class Command(BaseCommand):
             default=';',
             help='Delimitador del CSV (default: ;)'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Filas por lote en cada INSERT ... ON CONFLICT (default: {TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Carga con COPY en una tabla de staging y fusiona con SQL (solo PostgreSQL)'
+        )
         parser.add_argument(
             '--skip-errors',
             action='store_true',
@@ -35,11 +51,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '--verbose',
             action='store_true',
-            help='Muestra información detallada de cada fila'
+            help='Muestra información detallada de cada lote'
         )
 
     def handle(self, *args, **options):
-        import os
         
         path = options['csv_path']
         delimiter = options['delimiter']
@@ -55,195 +70,87 @@ class Command(BaseCommand):
             path = path_alt
         
         self.stdout.write(self.style.SUCCESS(f'✓ Archivo encontrado: {path}'))
-        self.stdout.write(f'  Delimitador: "{delimiter}"\n')
+        self.stdout.write(f'  Delimitador: "{delimiter}"')
         
-        # Orden esperado de columnas del estándar CH
-        # NOTA: El CSV real tiene solo 27 campos, no 36
-        # Mapeo: pos CSV → campo modelo
-        COLUMNAS_CABECERAS = [
-            'iddomicilioto',                    # 1
-            'codigopostal',                     # 2
-            'provincia',                        # 3
-            'poblacion',                        # 4
-            'tipovia',                          # 5
-            'nombrevia',                        # 6
-            'idtecnicovia',                     # 7
-            'numero',                           # 8
-            'bisduplicado',                     # 9
-            'bloquedelafinca',                  # 10
-            'identificadorfincaportal',         # 11
-            'letrafinca',                       # 12
-            'escalera',                         # 13
-            'planta',                           # 14
-            'mano1',                            # 15
-            'mano2',                            # 16
-            'observaciones',                    # 17
-            'flagdummy',                        # 18
-            'codigoinevia',                     # 19
-            'codigocensal',                     # 20
-            'codigopai',                        # 21
-            'codigoolt',                        # 22
-            'codigocto',                        # 23
-            'tipocto',                          # 24
-            'direccioncto',                     # 25
-            'tipopermiso',                      # 26
-            'tipocajaderivacion',               # 27
-            'numviviendas',
-            'fechaalta',
-            'codigocajaderivacion',
-            'ubicacioncajaderivacion',
-            'coinv',
-            'area_comercial',
-            'lat',
-            'lng'
-        ]
+        if options['copy']:
+            return self._importar_copy(path, delimiter, skip_errors)
         
-        created = 0
-        updated = 0
+        self.stdout.write(f'  Tamaño de lote: {options["batch_size"]}\n')
+        
+        upsert = UpsertHuellas(
+            tamano_lote=options['batch_size'],
+            contexto_auditoria={'origen': 'import_huella_csv', 'fichero': os.path.basename(path)},
+        )
         errors = 0
         
         try:
             with open(path, newline='', encoding='utf-8') as csvfile:
                 reader = csv.reader(csvfile, delimiter=delimiter)
                 
-                # Leer primera fila para mostrar info
-                primera_fila_original = None
-                
                 for num_fila, row in enumerate(reader, 1):
                     if num_fila == 1:
-                        primera_fila_original = row
                         self.stdout.write(f'Primera fila: {len(row)} columnas')
                         if verbose:
                             self.stdout.write(f'  Contenido: {row[:3]}...\n')
                     
                     try:
-                        # Validar que tenga al menos 27 columnas (CSV real tiene 27, modelo tiene 36)
-                        # Las columnas faltantes se completarán con valores vacíos
-                        NUM_CAMPOS_ESPERADOS = 27  # CSV real tiene 27 campos
-                        
-                        if len(row) < NUM_CAMPOS_ESPERADOS:
-                            error_msg = f'Fila {num_fila}: esperadas al menos {NUM_CAMPOS_ESPERADOS} columnas, se encontraron {len(row)}'
-                            if verbose:
-                                error_msg += f'\nContenido: {row}'
-                            if skip_errors:
-                                self.stdout.write(self.style.WARNING(error_msg))
-                                errors += 1
-                                continue
-                            else:
-                                raise CommandError(error_msg)
-                        
-                        # Truncar a 27 campos si hay más (por compatibilidad)
-                        row = row[:NUM_CAMPOS_ESPERADOS]
-                        
-                        # Crear diccionario de datos
-                        datos = dict(zip(COLUMNAS_CABECERAS, row))
-                        
-                        # Campo obligatorio: iddomicilioto
-                        if not datos.get('iddomicilioto', '').strip():
-                            error_msg = f'Fila {num_fila}: iddomicilioto está vacío'
-                            if skip_errors:
-                                self.stdout.write(self.style.WARNING(error_msg))
-                                errors += 1
-                                continue
-                            else:
-                                raise CommandError(error_msg)
-                        
-                        # Campos obligatorios: codigopostal, provincia, poblacion
-                        campos_obligatorios = ['codigopostal', 'provincia', 'poblacion']
-                        for campo in campos_obligatorios:
-                            if not datos.get(campo, '').strip():
-                                error_msg = f'Fila {num_fila}: {campo} está vacío'
-                                if skip_errors:
-                                    self.stdout.write(self.style.WARNING(error_msg))
-                                    errors += 1
-                                    continue
-                                else:
-                                    raise CommandError(error_msg)
-                        
-                        # Convertir lat/lng a decimal si existen
-                        try:
-                            lat = float(datos.get('lat', '').strip()) if datos.get('lat', '').strip() else None
-                        except ValueError:
-                            lat = None
-                        
-                        try:
-                            lng = float(datos.get('lng', '').strip()) if datos.get('lng', '').strip() else None
-                        except ValueError:
-                            lng = None
-                        
-                        # Obtener o crear huella
-                        huella, es_nueva = Huella.objects.get_or_create(
-                            iddomicilioto=datos['iddomicilioto'],
-                            defaults={
-                                'codigopostal': datos['codigopostal'],
-                                'provincia': datos['provincia'],
-                                'poblacion': datos['poblacion'],
-                                'tipovia': datos['tipovia'],
-                                'nombrevia': datos['nombrevia'],
-                                'idtecnicovia': datos.get('idtecnicovia', ''),
-                                'numero': datos.get('numero', ''),
-                                'bisduplicado': datos.get('bisduplicado', ''),
-                                'bloquedelafinca': datos.get('bloquedelafinca', ''),
-                                'identificadorfincaportal': datos.get('identificadorfincaportal', ''),
-                                'letrafinca': datos.get('letrafinca', ''),
-                                'escalera': datos.get('escalera', ''),
-                                'planta': datos.get('planta', ''),
-                                'mano1': datos.get('mano1', ''),
-                                'mano2': datos.get('mano2', ''),
-                                'observaciones': datos.get('observaciones', ''),
-                                'flagdummy': datos.get('flagdummy', ''),
-                                'codigoinevia': datos.get('codigoinevia', ''),
-                                'codigocensal': datos.get('codigocensal', ''),
-                                'codigopai': datos.get('codigopai', ''),
-                                'codigoolt': datos.get('codigoolt', ''),
-                                'codigocto': datos.get('codigocto', ''),
-                                'tipocto': datos.get('tipocto', ''),
-                                'direccioncto': datos.get('direccioncto', ''),
-                                'tipopermiso': datos.get('tipopermiso', ''),
-                                'tipocajaderivacion': datos.get('tipocajaderivacion', ''),
-                                'numunidadesinmobiliarias': datos.get('numunidadesinmobiliarias', ''),
-                                'numviviendas': datos.get('numviviendas', ''),
-                                'fechaalta': datos.get('fechaalta', ''),
-                                'codigocajaderivacion': datos.get('codigocajaderivacion', ''),
-                                'ubicacioncajaderivacion': datos.get('ubicacioncajaderivacion', ''),
-                                'coinv': datos.get('coinv', ''),
-                                'area_comercial': datos.get('area_comercial', ''),
-                                'lat': lat,
-                                'lng': lng,
-                            }
-                        )
-                        
-                        if es_nueva:
-                            created += 1
-                            if verbose:
-                                self.stdout.write(self.style.SUCCESS(f'✓ Creada fila {num_fila}: {huella.iddomicilioto}'))
-                        else:
-                            updated += 1
-                            if verbose:
-                                self.stdout.write(self.style.WARNING(f'⊗ Actualizada fila {num_fila}: {huella.iddomicilioto}'))
-                    
-                    except Exception as e:
-                        error_msg = f'Fila {num_fila}: Error al procesar: {str(e)}'
+                        datos = parsear_fila(row)
+                    except FilaInvalida as e:
+                        error_msg = f'Fila {num_fila}: {e}'
                         if verbose:
-                            import traceback
-                            error_msg += f'\nTraceback: {traceback.format_exc()}'
-                        if skip_errors:
-                            self.stdout.write(self.style.ERROR(error_msg))
-                            errors += 1
-                        else:
+                            error_msg += f'\nContenido: {row}'
+                        if not skip_errors:
                             raise CommandError(error_msg)
+                        self.stdout.write(self.style.WARNING(error_msg))
+                        errors += 1
+                        continue
+                    
+                    lotes = upsert.lotes
+                    upsert.agregar(datos)
+                    if verbose and upsert.lotes != lotes:
+                        self.stdout.write(
+                            f'  Lote {upsert.lotes} escrito: {upsert.procesadas} filas '
+                            f'({upsert.filas_por_segundo:.0f} filas/s)'
+                        )
+                
+                resumen = upsert.cerrar()
         
+        except CommandError:
+            raise
         except FileNotFoundError:
             raise CommandError(f'Archivo no encontrado: {path}')
         except Exception as e:
-            raise CommandError(f'Error al leer archivo: {str(e)}')
+            raise CommandError(f'Error al importar archivo: {str(e)}')
         
         # Resumen final
         self.stdout.write(self.style.SUCCESS(f'\n╔════════════════════════════════════════════╗'))
         self.stdout.write(self.style.SUCCESS(f'║ Importación completada                    ║'))
         self.stdout.write(self.style.SUCCESS(f'╠════════════════════════════════════════════╣'))
-        self.stdout.write(self.style.SUCCESS(f'║ ✓ Creadas:      {created:>24} ║'))
-        self.stdout.write(self.style.SUCCESS(f'║ ⊗ Actualizadas: {updated:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ ✓ Creadas:      {resumen["creadas"]:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ ⊗ Actualizadas: {resumen["actualizadas"]:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ = Sin cambios:  {resumen["sin_cambios"]:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ ≡ Duplicadas:   {resumen["duplicadas"]:>24} ║'))
         self.stdout.write(self.style.SUCCESS(f'║ ✗ Errores:      {errors:>24} ║'))
-        self.stdout.write(self.style.SUCCESS(f'║ Total:          {created + updated:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ Total:          {resumen["procesadas"]:>24} ║'))
+        self.stdout.write(self.style.SUCCESS(f'║ Filas/segundo:  {resumen["filas_por_segundo"]:>24} ║'))
         self.stdout.write(self.style.SUCCESS(f'╚════════════════════════════════════════════╝'))
+
+    def _importar_copy(self, path, delimiter, skip_errors):
+        """Importa el fichero con COPY + fusión SQL y muestra el resumen."""
+        self.stdout.write('  Modo: COPY a tabla de staging\n')
+        try:
+            with open(path, newline='', encoding='utf-8') as csvfile:
+                resumen = cargar_fichero_copy(
+                    csvfile, delimiter=delimiter, permitir_rechazos=skip_errors,
+                    contexto_auditoria={'origen': 'import_huella_csv', 'fichero': os.path.basename(path)},
+                )
+        except CargaRechazada as e:
+            raise CommandError(
+                f'{e}. No se ha fusionado ninguna fila (use --skip-errors para cargar las válidas)\n'
+                + formatear_resumen(e.resumen)
+            )
+        except Exception as e:
+            raise CommandError(f'Error al importar archivo: {str(e)}')
+        
+        self.stdout.write(self.style.SUCCESS('\n✓ Importación con COPY completada'))
+        self.stdout.write(formatear_resumen(resumen))
@@ -19,6 +19,7 @@ python manage.py importar_ine ../datos/15codmun.csv ../datos/Provincia15.csv
 import csv
 from django.core.management.base import BaseCommand
 from huella_app.models import IneMunicipio, InePoblacion
+from huella_app.signals import auditoria_masiva
 
 
 class Command(BaseCommand):
@@ -42,6 +43,11 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        # Los AuditLog de cada municipio y población se escriben por lotes
+        with auditoria_masiva():
+            self._importar(**options)
+
+    def _importar(self, **options):
         fichero_municipios = options['fichero_municipios']
         fichero_poblacion = options['fichero_poblacion']
         limpiar = options.get('limpiar', False)
@@ -0,0 +1,273 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Agrupación de huellas para el mapa (clusters por celda). Para un área y un
+# nivel de zoom se devuelve, por cada celda de la rejilla de Huella.celda_geo
+# a la resolución adecuada, el número de huellas y su centroide.
+# Los niveles NIVEL_MINIMO a NIVEL_PRECALCULADO se leen de CeldaMapa. Los
+# triggers de la migración 0024 apuntan en CambioCeldaMapa lo que cambia cada
+# escritura en Huella y aplicar_cambios() lo sube a todos los niveles cada
+# pocos segundos; con filtros por OLT o CTO (muy selectivos) o a más zoom se
+# agrupan las huellas del área al vuelo, leyendo solo los rangos del índice
+# de celda_geo que cubren el área.
+
+import logging
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+
+from . import cache_respuestas
+from .filtros import filtro_direccion
+from .geoespacial import NIVEL_MAXIMO, indices_celda, numero_celda
+from .models import CambioCeldaMapa, CeldaMapa, Huella
+
+logger = logging.getLogger(__name__)
+
+# Niveles de la rejilla guardados en CeldaMapa (las migraciones 0021 y 0024 usan los mismos)
+NIVEL_MINIMO = 2
+NIVEL_PRECALCULADO = 16
+# Bloqueo consultivo de aplicar_cambios y reconciliar (ver
+# estadisticas.CLAVE_BLOQUEO_CAMBIOS, 4203)
+CLAVE_BLOQUEO_CAMBIOS = 4204
+# Nivel de rejilla = zoom del mapa web + DESPLAZAMIENTO_ZOOM: con teselas de
+# 256 px, las celdas quedan de unos 64 px de ancho en pantalla
+DESPLAZAMIENTO_ZOOM = 2
+ZOOM_MAXIMO = 22
+
+# Filtros admitidos por el endpoint mapa
+FILTROS_MAPA = ['provincia', 'codigoolt', 'codigocto']
+
+# Sube a todos los niveles guardados las filas (celda de NIVEL_PRECALCULADO,
+# provincia_normalizada, cantidad, suma_lat, suma_lng) de la consulta {base}
+SQL_SUBIR_NIVELES = f"""
+SELECT n.nivel, b.celda >> (2 * ({NIVEL_PRECALCULADO} - n.nivel)) AS celda, b.provincia_normalizada,
+       sum(b.cantidad) AS cantidad, sum(b.suma_lat) AS suma_lat, sum(b.suma_lng) AS suma_lng
+FROM ({{base}}) b CROSS JOIN generate_series({NIVEL_MINIMO}, {NIVEL_PRECALCULADO}) AS n(nivel)
+GROUP BY 1, 2, 3
+"""
+
+# Rejilla recalculada: se agrupa una vez al nivel más fino guardado y de ahí
+# se suben los niveles gruesos, sin volver a leer Huella por cada nivel
+SQL_RECALCULAR = SQL_SUBIR_NIVELES.format(base=f"""
+    SELECT celda_geo >> {2 * (NIVEL_MAXIMO - NIVEL_PRECALCULADO)} AS celda, provincia_normalizada,
+           count(*) AS cantidad, sum(lat) AS suma_lat, sum(lng) AS suma_lng
+    FROM {{huella}}
+    WHERE celda_geo IS NOT NULL
+    GROUP BY 1, 2
+""")
+
+# Cambios pendientes de CambioCeldaMapa ({cambios}) en todos los niveles
+SQL_CAMBIOS = SQL_SUBIR_NIVELES.format(
+    base='SELECT celda, provincia_normalizada, cantidad, suma_lat, suma_lng FROM {cambios}'
+)
+
+
+def nivel_para_zoom(zoom, area):
+    """
+    Nivel de la rejilla para el `zoom` del mapa. Si el área es tan grande que
+    saldrían más de HUELLA_MAPA_MAX_CELDAS celdas, se baja de nivel (hasta
+    NIVEL_MINIMO).
+    """
+    nivel = min(max(zoom + DESPLAZAMIENTO_ZOOM, NIVEL_MINIMO), NIVEL_MAXIMO)
+    sur, oeste, norte, este = area
+    while nivel > NIVEL_MINIMO:
+        x0, y0 = indices_celda(sur, oeste, nivel)
+        x1, y1 = indices_celda(norte, este, nivel)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= settings.HUELLA_MAPA_MAX_CELDAS:
+            break
+        nivel -= 1
+    return nivel
+
+
+def _rangos_nivel(area, nivel):
+    """
+    Rangos [desde, hasta] de números de celda de `nivel` que tocan el área
+    (celdas enteras), con las celdas consecutivas en orden Z unidas.
+    nivel_para_zoom ya limita su número a HUELLA_MAPA_MAX_CELDAS.
+    """
+    sur, oeste, norte, este = area
+    x0, y0 = indices_celda(sur, oeste, nivel)
+    x1, y1 = indices_celda(norte, este, nivel)
+    rangos = []
+    for numero in sorted(numero_celda(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)):
+        if rangos and rangos[-1][1] + 1 == numero:
+            rangos[-1][1] = numero
+        else:
+            rangos.append([numero, numero])
+    return rangos
+
+
+def _clusters_precalculados(area, nivel, provincia):
+    condicion = Q()
+    for desde, hasta in _rangos_nivel(area, nivel):
+        condicion |= Q(celda__range=(desde, hasta))
+    celdas = CeldaMapa.objects.filter(condicion, nivel=nivel)
+    if provincia:
+        celdas = celdas.filter(filtro_direccion('provincia', provincia, prefijo=True))
+    filas = celdas.values('celda').annotate(
+        total=Sum('cantidad'), total_lat=Sum('suma_lat'), total_lng=Sum('suma_lng')
+    ).filter(total__gt=0).order_by('celda')
+    return [
+        (fila['celda'], fila['total'], fila['total_lat'] / fila['total'], fila['total_lng'] / fila['total'])
+        for fila in filas
+    ]
+
+
+def _clusters_al_vuelo(area, nivel, filtros):
+    # Las mismas celdas enteras que en la rejilla precalculada
+    desplazamiento = 2 * (NIVEL_MAXIMO - nivel)
+    condicion = Q()
+    for desde, hasta in _rangos_nivel(area, nivel):
+        condicion |= Q(celda_geo__range=(desde << desplazamiento, ((hasta + 1) << desplazamiento) - 1))
+    huellas = Huella.objects.filter(condicion)
+    if filtros.get('provincia'):
+        huellas = huellas.filter(filtro_direccion('provincia', filtros['provincia'], prefijo=True))
+    if filtros.get('codigoolt'):
+        huellas = huellas.filter(codigoolt__icontains=filtros['codigoolt'])
+    if filtros.get('codigocto'):
+        huellas = huellas.filter(codigocto__icontains=filtros['codigocto'])
+    filas = huellas.annotate(
+        celda=F('celda_geo').bitrightshift(desplazamiento)
+    ).values('celda').annotate(
+        total=Count('id'), centro_lat=Avg('lat'), centro_lng=Avg('lng')
+    ).order_by('celda')
+    return [(fila['celda'], fila['total'], fila['centro_lat'], fila['centro_lng']) for fila in filas]
+
+
+def clusters(area, zoom, filtros):
+    """
+    Clusters del mapa para `area` (sur, oeste, norte, este) y `zoom`:
+    diccionario con el nivel de la rejilla, si se ha leído de la rejilla
+    precalculada, el total de huellas y una lista de celdas con `cantidad`
+    y centroide (`lat`, `lng`). Incluye las celdas que solo tocan el borde
+    del área, para que los clusters no cambien al mover el mapa.
+    """
+    nivel = nivel_para_zoom(zoom, area)
+    precalculado = (
+        nivel <= NIVEL_PRECALCULADO
+        and not filtros.get('codigoolt') and not filtros.get('codigocto')
+    )
+    if precalculado:
+        filas = _clusters_precalculados(area, nivel, filtros.get('provincia'))
+    else:
+        filas = _clusters_al_vuelo(area, nivel, filtros)
+    return {
+        'nivel': nivel,
+        'precalculado': precalculado,
+        'total': sum(cantidad for _, cantidad, _, _ in filas),
+        'clusters': [
+            {'celda': celda, 'cantidad': cantidad, 'lat': round(float(lat), 6), 'lng': round(float(lng), 6)}
+            for celda, cantidad, lat, lng in filas
+        ],
+    }
+
+
+def _sumar(cursor, tabla, origen):
+    """
+    Suma a CeldaMapa las filas de la tabla temporal `origen` (nivel, celda,
+    provincia_normalizada y diferencias), en orden fijo, y borra las celdas
+    que se quedan sin huellas.
+    """
+    cursor.execute(
+        f'INSERT INTO {tabla} AS m (nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng) '
+        f'SELECT nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng FROM {origen} '
+        f'ORDER BY nivel, celda, provincia_normalizada '
+        f'ON CONFLICT (nivel, celda, provincia_normalizada) DO UPDATE SET '
+        f'cantidad = m.cantidad + EXCLUDED.cantidad, '
+        f'suma_lat = m.suma_lat + EXCLUDED.suma_lat, '
+        f'suma_lng = m.suma_lng + EXCLUDED.suma_lng'
+    )
+    sumadas = cursor.rowcount
+    cursor.execute(
+        f'DELETE FROM {tabla} m USING {origen} o '
+        f'WHERE (m.nivel, m.celda, m.provincia_normalizada) = (o.nivel, o.celda, o.provincia_normalizada) '
+        f'AND m.cantidad = 0'
+    )
+    return sumadas
+
+
+def aplicar_cambios(using='default'):
+    """
+    Sube a todos los niveles de CeldaMapa las diferencias pendientes de
+    CambioCeldaMapa y las borra, en una transacción. Solo escribe en
+    CeldaMapa este proceso (si ya hay otro en curso o una reconciliación,
+    no hace nada), así que las importaciones no se bloquean entre sí por las
+    celdas gruesas. Devuelve el número de celdas modificadas.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    tabla = qn(CeldaMapa._meta.db_table)
+    cambios = qn(CambioCeldaMapa._meta.db_table)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s, 0)', [CLAVE_BLOQUEO_CAMBIOS])
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute(
+            f'CREATE TEMP TABLE mapa_cambios ON COMMIT DROP AS '
+            f'WITH movidos AS ('
+            f'DELETE FROM {cambios} RETURNING celda, provincia_normalizada, cantidad, suma_lat, suma_lng) '
+            + SQL_CAMBIOS.format(cambios='movidos')
+            + ' HAVING sum(b.cantidad) <> 0 OR sum(b.suma_lat) <> 0 OR sum(b.suma_lng) <> 0'
+        )
+        aplicadas = _sumar(cursor, tabla, 'mapa_cambios')
+        if aplicadas:
+            cache_respuestas.invalidar(using)
+    return aplicadas
+
+
+def reconciliar(using='default'):
+    """
+    Recalcula CeldaMapa desde Huella y corrige las celdas que estén mal, sin
+    bloquear Huella. Mientras dura no se aplican cambios (bloqueo de
+    aplicar_cambios), así que CeldaMapa no se mueve; con REPEATABLE READ,
+    Huella, CeldaMapa y los cambios pendientes se leen de la misma foto, y en
+    esa foto la rejilla más los cambios pendientes deben dar lo que hay en
+    Huella. La corrección se escribe directamente en cada nivel (puede haber
+    celdas gruesas mal sin que lo estén las finas). Debe llamarse fuera de
+    cualquier transacción. Devuelve el número de celdas que estaban mal.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    huella = qn(Huella._meta.db_table)
+    tabla = qn(CeldaMapa._meta.db_table)
+    cambios = qn(CambioCeldaMapa._meta.db_table)
+    diferencia = 'coalesce(r.{c}, 0) - coalesce(m.{c}, 0) - coalesce(p.{c}, 0)'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s, 0)', [CLAVE_BLOQUEO_CAMBIOS])
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute(
+                'CREATE TEMP TABLE mapa_recalculado ON COMMIT DROP AS '
+                + SQL_RECALCULAR.format(huella=huella)
+            )
+            cursor.execute(
+                'CREATE TEMP TABLE mapa_pendiente ON COMMIT DROP AS '
+                + SQL_CAMBIOS.format(cambios=cambios)
+            )
+            cursor.execute(
+                f'CREATE TEMP TABLE mapa_correcciones ON COMMIT DROP AS '
+                f'SELECT nivel, celda, provincia_normalizada, '
+                f'{diferencia.format(c="cantidad")} AS cantidad, '
+                f'{diferencia.format(c="suma_lat")} AS suma_lat, '
+                f'{diferencia.format(c="suma_lng")} AS suma_lng '
+                f'FROM mapa_recalculado r '
+                f'FULL JOIN {tabla} m USING (nivel, celda, provincia_normalizada) '
+                f'FULL JOIN mapa_pendiente p USING (nivel, celda, provincia_normalizada) '
+                f'WHERE {diferencia.format(c="cantidad")} <> 0 '
+                f'OR {diferencia.format(c="suma_lat")} <> 0 '
+                f'OR {diferencia.format(c="suma_lng")} <> 0'
+            )
+            corregidas = cursor.rowcount
+            if corregidas:
+                _sumar(cursor, tabla, 'mapa_correcciones')
+                cache_respuestas.invalidar(using)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, 0)', [CLAVE_BLOQUEO_CAMBIOS])
+    if corregidas:
+        logger.warning('[MAPA] Reconciliación: %s celdas corregidas', corregidas)
+    return corregidas
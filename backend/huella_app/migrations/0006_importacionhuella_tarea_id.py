@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0005_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='tarea_id',
+            field=models.CharField(blank=True, help_text='ID de la tarea Celery que procesa el fichero', max_length=255),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0006_importacionhuella_tarea_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_actualizadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_creadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_error',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_procesadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_sin_cambios',
+            field=models.IntegerField(default=0),
+        ),
+    ]
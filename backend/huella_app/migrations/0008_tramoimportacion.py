@@ -0,0 +1,46 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0007_importacionhuella_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='lineas_incidencias',
+            field=models.IntegerField(default=0, help_text='Líneas rechazadas en la normalización'),
+        ),
+        migrations.CreateModel(
+            name='TramoImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.BigIntegerField(help_text='Byte inicial del tramo')),
+                ('fin', models.BigIntegerField(help_text='Byte final del tramo (excluido)')),
+                ('primera_linea', models.IntegerField(help_text='Número de línea del primer registro del tramo')),
+                ('posicion', models.BigIntegerField(help_text='Byte siguiente al último lote confirmado')),
+                ('linea', models.IntegerField(help_text='Número de la siguiente línea a procesar')),
+                ('procesadas', models.IntegerField(default=0)),
+                ('creadas', models.IntegerField(default=0)),
+                ('actualizadas', models.IntegerField(default=0)),
+                ('sin_cambios', models.IntegerField(default=0)),
+                ('duplicadas', models.IntegerField(default=0)),
+                ('lotes', models.IntegerField(default=0)),
+                ('errores', models.IntegerField(default=0)),
+                ('detalle_errores', models.JSONField(blank=True, default=list)),
+                ('completado', models.BooleanField(default=False)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('importacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tramos', to='huella_app.importacionhuella')),
+            ],
+            options={
+                'verbose_name': 'Tramo de Importación',
+                'verbose_name_plural': 'Tramos de Importación',
+                'ordering': ['importacion', 'inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:51
+
+from django.db import migrations, models
+
+from ._rellenos import rellenar_por_lotes
+
+# Hash de las filas existentes; misma expresión que importador.sql_hash_contenido
+CAMPOS = [
+    'iddomicilioto', 'codigopostal', 'provincia', 'poblacion', 'tipovia', 'nombrevia',
+    'idtecnicovia', 'numero', 'bisduplicado', 'bloquedelafinca', 'identificadorfincaportal',
+    'letrafinca', 'escalera', 'planta', 'mano1', 'mano2', 'observaciones', 'flagdummy',
+    'codigoinevia', 'codigocensal', 'codigopai', 'codigoolt', 'codigocto', 'tipocto',
+    'direccioncto', 'tipopermiso', 'tipocajaderivacion', 'numunidadesinmobiliarias',
+    'numviviendas', 'fechaalta', 'codigocajaderivacion', 'ubicacioncajaderivacion', 'coinv',
+    'area_comercial',
+]
+RELLENAR_HASH = (
+    'UPDATE huella_app_huella SET hash_contenido = md5(concat_ws(chr(31), '
+    + ', '.join(f'"{campo}"' for campo in CAMPOS)
+    + ", coalesce(lat::numeric(10, 8)::text, ''), coalesce(lng::numeric(10, 8)::text, '')))::uuid"
+)
+
+
+def rellenar_hash(apps, schema_editor):
+    rellenar_por_lotes(schema_editor, RELLENAR_HASH)
+
+
+class Migration(migrations.Migration):
+    # El relleno se confirma por lotes (ver _rellenos.py)
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0008_tramoimportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='huella',
+            name='hash_contenido',
+            field=models.UUIDField(blank=True, editable=False, help_text='Hash de los campos de negocio (lo calcula la importación)', null=True),
+        ),
+        migrations.RunPython(rellenar_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Convierte huella_app_auditlog en una tabla particionada por meses sobre
+# "timestamp". La clave primaria pasa a ser (id, timestamp), como exige
+# PostgreSQL; Django sigue usando id como clave.
+# Las particiones futuras las crea y purga la tarea limpiar_logs.
+
+from django.db import migrations
+
+
+PARTICIONAR = """
+ALTER TABLE huella_app_auditlog RENAME TO huella_app_auditlog_antigua;
+
+CREATE TABLE huella_app_auditlog (
+    "id" bigint GENERATED BY DEFAULT AS IDENTITY,
+    "action" varchar(10) NOT NULL,
+    "model_name" varchar(100) NOT NULL,
+    "instance_id" integer NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    "changes" jsonb NULL,
+    "user_id" integer NULL REFERENCES "auth_user" ("id") DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY ("id", "timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+CREATE INDEX huella_app_auditlog_user_id_particionado ON huella_app_auditlog ("user_id");
+CREATE INDEX huella_app_auditlog_timestamp_particionado ON huella_app_auditlog ("timestamp");
+
+-- Red de seguridad: recibe las filas de meses sin partición
+CREATE TABLE huella_app_auditlog_default PARTITION OF huella_app_auditlog DEFAULT;
+
+-- Una partición por mes desde el registro más antiguo hasta tres meses vista
+DO $$
+DECLARE
+    mes date := date_trunc('month', coalesce(
+        (SELECT min("timestamp") FROM huella_app_auditlog_antigua), now()
+    ));
+BEGIN
+    WHILE mes <= date_trunc('month', now()) + interval '3 months' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF huella_app_auditlog FOR VALUES FROM (%L) TO (%L)',
+            'huella_app_auditlog_p' || to_char(mes, 'YYYY_MM'),
+            mes, mes + interval '1 month'
+        );
+        mes := mes + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO huella_app_auditlog ("id", "action", "model_name", "instance_id", "timestamp", "changes", "user_id")
+SELECT "id", "action", "model_name", "instance_id", "timestamp", "changes", "user_id"
+FROM huella_app_auditlog_antigua;
+
+SELECT setval(
+    pg_get_serial_sequence('huella_app_auditlog', 'id'),
+    coalesce((SELECT max("id") FROM huella_app_auditlog), 0) + 1,
+    false
+);
+
+DROP TABLE huella_app_auditlog_antigua;
+"""
+
+DESPARTICIONAR = """
+ALTER TABLE huella_app_auditlog RENAME TO huella_app_auditlog_particionada;
+
+CREATE TABLE huella_app_auditlog (
+    "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    "action" varchar(10) NOT NULL,
+    "model_name" varchar(100) NOT NULL,
+    "instance_id" integer NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    "changes" jsonb NULL,
+    "user_id" integer NULL REFERENCES "auth_user" ("id") DEFERRABLE INITIALLY DEFERRED
+);
+CREATE INDEX huella_app_auditlog_user_id ON huella_app_auditlog ("user_id");
+
+INSERT INTO huella_app_auditlog ("id", "action", "model_name", "instance_id", "timestamp", "changes", "user_id")
+SELECT "id", "action", "model_name", "instance_id", "timestamp", "changes", "user_id"
+FROM huella_app_auditlog_particionada;
+
+SELECT setval(
+    pg_get_serial_sequence('huella_app_auditlog', 'id'),
+    coalesce((SELECT max("id") FROM huella_app_auditlog), 0) + 1,
+    false
+);
+
+DROP TABLE huella_app_auditlog_particionada CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0010_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTICIONAR, DESPARTICIONAR),
+    ]
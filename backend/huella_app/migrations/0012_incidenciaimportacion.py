@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0011_auditlog_particionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncidenciaImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_linea', models.IntegerField(help_text='Número de línea en el fichero original')),
+                ('campo', models.CharField(help_text="Campo con el error ('linea' si es de formato)", max_length=50)),
+                ('valor', models.TextField(blank=True, help_text='Valor que produjo la incidencia')),
+                ('motivo', models.TextField()),
+                ('sugerencias', models.JSONField(blank=True, default=list)),
+                ('linea', models.TextField(help_text='Línea original completa')),
+                ('importacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incidencias', to='huella_app.importacionhuella')),
+            ],
+            options={
+                'verbose_name': 'Incidencia de Importación',
+                'verbose_name_plural': 'Incidencias de Importación',
+                'ordering': ['importacion', 'num_linea'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='incidenciaimportacion',
+            constraint=models.UniqueConstraint(fields=('importacion', 'num_linea'), name='incidencia_importacion_linea_unica'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:14
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # El índice se crea sin bloquear las escrituras en Huella
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0012_incidenciaimportacion'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['created', 'id'], name='huella_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:15
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # Los índices se crean sin bloquear las escrituras en Huella
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0013_huella_created_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('iddomicilioto'), name='gin_trgm_ops'), name='huella_iddomicilioto_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('codigopostal'), name='gin_trgm_ops'), name='huella_codigopostal_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('provincia'), name='gin_trgm_ops'), name='huella_provincia_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('poblacion'), name='gin_trgm_ops'), name='huella_poblacion_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('nombrevia'), name='gin_trgm_ops'), name='huella_nombrevia_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('codigoolt'), name='gin_trgm_ops'), name='huella_codigoolt_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('codigocto'), name='gin_trgm_ops'), name='huella_codigocto_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('observaciones'), name='gin_trgm_ops'), name='huella_observaciones_trgm'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:17
+#
+# Columna tsvector "busqueda" para ?search=, mantenida por un trigger para que
+# la rellenen igual el ORM, el admin y las importaciones masivas (COPY +
+# INSERT ... ON CONFLICT). Se usa el diccionario 'simple': son códigos y
+# nombres propios, no texto a lematizar.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+from ._rellenos import rellenar_por_lotes
+
+# Códigos (peso A), dirección (peso B) y observaciones (peso D)
+VECTOR = (
+    "setweight(to_tsvector('simple', concat_ws(' ', {p}iddomicilioto, {p}codigopostal, {p}codigoolt, {p}codigocto)), 'A')"
+    " || setweight(to_tsvector('simple', concat_ws(' ', {p}nombrevia, {p}poblacion, {p}provincia)), 'B')"
+    " || setweight(to_tsvector('simple', coalesce({p}observaciones, '')), 'D')"
+)
+
+CAMPOS = 'iddomicilioto, codigopostal, codigoolt, codigocto, nombrevia, poblacion, provincia, observaciones'
+
+CREAR_TRIGGER = f"""
+CREATE FUNCTION huella_actualizar_busqueda() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda := {VECTOR.format(p='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER huella_busqueda
+    BEFORE INSERT OR UPDATE OF {CAMPOS} ON huella_app_huella
+    FOR EACH ROW EXECUTE FUNCTION huella_actualizar_busqueda();
+"""
+
+BORRAR_TRIGGER = """
+DROP TRIGGER IF EXISTS huella_busqueda ON huella_app_huella;
+DROP FUNCTION IF EXISTS huella_actualizar_busqueda();
+"""
+
+RELLENAR = f"UPDATE huella_app_huella SET busqueda = {VECTOR.format(p='')}"
+
+
+def rellenar(apps, schema_editor):
+    rellenar_por_lotes(schema_editor, RELLENAR)
+
+
+class Migration(migrations.Migration):
+    # El índice se crea sin bloquear las escrituras en Huella y el relleno se
+    # confirma por lotes
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0014_huella_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='huella',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Vector de búsqueda (lo calcula la base de datos)', null=True),
+        ),
+        migrations.RunSQL(CREAR_TRIGGER, BORRAR_TRIGGER),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='huella_busqueda_gin'),
+        ),
+    ]
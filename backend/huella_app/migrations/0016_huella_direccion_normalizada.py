@@ -0,0 +1,100 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:19
+#
+# Columnas normalizadas de provincia, población y nombre de vía. Las rellena
+# un trigger con huella_normalizar_texto(), versión SQL de
+# normalization.normalizar_texto: mayúsculas, letras latinas sin tildes
+# (Latin-1 y Latin Extended-A) y cualquier otro signo como un espacio.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from ._rellenos import rellenar_por_lotes
+
+# Letras con tilde/diacrítico y su letra base (mayúsculas y minúsculas: la
+# collation de la base puede ser C, donde upper() solo cambia el ASCII)
+CON_TILDE = (
+    'ÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝàáâãäåçèéêëìíîïñòóôõöùúûüýÿĀāĂăĄąĆćĈĉĊċČčĎďĒēĔĕĖėĘęĚěĜĝĞğĠġĢģĤĥĨĩĪīĬĭĮįİıĴĵĶķ'
+    'ĹĺĻļĽľŃńŅņŇňŌōŎŏŐőŔŕŖŗŘřŚśŜŝŞşŠšŢţŤťŨũŪūŬŭŮůŰűŲųŴŵŶŷŸŹźŻżŽžſ'
+)
+SIN_TILDE = (
+    'AAAAAACEEEEIIIINOOOOOUUUUYAAAAAACEEEEIIIINOOOOOUUUUYYAAAAAACCCCCCCCDDEEEEEEEEEEGGGGGGGGHHIIIIIIIIIIJJKK'
+    'LLLLLLNNNNNNOOOOOORRRRRRSSSSSSSSTTTTUUUUUUUUUUUUWWYYYZZZZZZS'
+)
+
+CREAR_TRIGGER = f"""
+CREATE FUNCTION huella_normalizar_texto(texto text) RETURNS text AS $$
+    SELECT btrim(regexp_replace(upper(translate(texto, '{CON_TILDE}', '{SIN_TILDE}')), '[^A-Z0-9]+', ' ', 'g'))
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE FUNCTION huella_actualizar_direccion_normalizada() RETURNS trigger AS $$
+BEGIN
+    NEW.provincia_normalizada := coalesce(huella_normalizar_texto(NEW.provincia), '');
+    NEW.poblacion_normalizada := coalesce(huella_normalizar_texto(NEW.poblacion), '');
+    NEW.nombrevia_normalizada := coalesce(huella_normalizar_texto(NEW.nombrevia), '');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER huella_direccion_normalizada
+    BEFORE INSERT OR UPDATE OF provincia, poblacion, nombrevia ON huella_app_huella
+    FOR EACH ROW EXECUTE FUNCTION huella_actualizar_direccion_normalizada();
+"""
+
+BORRAR_TRIGGER = """
+DROP TRIGGER IF EXISTS huella_direccion_normalizada ON huella_app_huella;
+DROP FUNCTION IF EXISTS huella_actualizar_direccion_normalizada();
+DROP FUNCTION IF EXISTS huella_normalizar_texto(text);
+"""
+
+RELLENAR = (
+    'UPDATE huella_app_huella SET '
+    'provincia_normalizada = huella_normalizar_texto(provincia), '
+    'poblacion_normalizada = huella_normalizar_texto(poblacion), '
+    'nombrevia_normalizada = huella_normalizar_texto(nombrevia)'
+)
+
+
+def rellenar(apps, schema_editor):
+    rellenar_por_lotes(schema_editor, RELLENAR)
+
+
+class Migration(migrations.Migration):
+    # Los índices se crean sin bloquear las escrituras en Huella y el relleno
+    # se confirma por lotes
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0015_huella_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='huella',
+            name='nombrevia_normalizada',
+            field=models.CharField(default='', editable=False, help_text='Nombre de vía normalizado (lo calcula la base de datos)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='huella',
+            name='poblacion_normalizada',
+            field=models.CharField(default='', editable=False, help_text='Población normalizada (la calcula la base de datos)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='huella',
+            name='provincia_normalizada',
+            field=models.CharField(default='', editable=False, help_text='Provincia normalizada (la calcula la base de datos)', max_length=22),
+        ),
+        migrations.RunSQL(CREAR_TRIGGER, BORRAR_TRIGGER),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['provincia_normalizada'], name='huella_provincia_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['poblacion_normalizada'], name='huella_poblacion_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['nombrevia_normalizada'], name='huella_nombrevia_norm_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:21
+#
+# Contadores de EstadisticaHuella mantenidos por triggers de sentencia sobre
+# Huella. Cada INSERT/UPDATE/DELETE (una fila del CRUD o un lote entero de la
+# importación) suma sus diferencias agregadas usando las tablas de transición,
+# así que se actualiza una fila de contador por valor afectado, no por fila.
+
+from django.db import migrations, models
+
+ESTADISTICAS = 'huella_app_estadisticahuella'
+
+# Filas (dimensión, valor, +1/-1) que aporta cada fila de la tabla de transición
+APORTACIONES = (
+    "SELECT 'total' AS dimension, ''::varchar AS valor, {signo} AS delta FROM {tabla} "
+    "UNION ALL SELECT 'provincia', provincia, {signo} FROM {tabla} "
+    "UNION ALL SELECT 'poblacion', poblacion, {signo} FROM {tabla} "
+    "UNION ALL SELECT 'codigopostal', codigopostal, {signo} FROM {tabla}"
+)
+
+# Aplica las diferencias en orden fijo (sin deadlocks entre lotes paralelos)
+# y ajusta el número de valores distintos de las dimensiones que pasan de 0 a
+# más huellas o al revés. Los contadores que quedan a 0 los borra la
+# reconciliación.
+APLICAR = f"""
+    WITH cambios AS (
+        SELECT dimension, valor, sum(delta)::bigint AS delta
+        FROM ({{aportaciones}}) AS a
+        GROUP BY dimension, valor
+        HAVING sum(delta) <> 0
+    ),
+    aplicados AS (
+        INSERT INTO {ESTADISTICAS} AS e (dimension, valor, cantidad)
+        SELECT dimension, valor, delta FROM cambios ORDER BY dimension, valor
+        ON CONFLICT (dimension, valor) DO UPDATE SET cantidad = e.cantidad + EXCLUDED.cantidad
+        RETURNING dimension, valor, cantidad
+    ),
+    distintos AS (
+        SELECT a.dimension, sum(CASE
+            WHEN a.cantidad - c.delta <= 0 AND a.cantidad > 0 THEN 1
+            WHEN a.cantidad - c.delta > 0 AND a.cantidad <= 0 THEN -1
+            ELSE 0 END) AS delta
+        FROM aplicados a JOIN cambios c USING (dimension, valor)
+        WHERE a.dimension <> 'total'
+        GROUP BY a.dimension
+    )
+    INSERT INTO {ESTADISTICAS} AS e (dimension, valor, cantidad)
+    SELECT 'distintos', dimension, delta FROM distintos WHERE delta <> 0 ORDER BY dimension
+    ON CONFLICT (dimension, valor) DO UPDATE SET cantidad = e.cantidad + EXCLUDED.cantidad;
+"""
+
+FUENTES = {
+    'INSERT': [('nuevas', '1')],
+    'UPDATE': [('nuevas', '1'), ('antiguas', '-1')],
+    'DELETE': [('antiguas', '-1')],
+}
+TRANSICIONES = {
+    'INSERT': 'NEW TABLE AS nuevas',
+    'UPDATE': 'OLD TABLE AS antiguas NEW TABLE AS nuevas',
+    'DELETE': 'OLD TABLE AS antiguas',
+}
+
+
+def _crear_trigger(operacion):
+    aportaciones = ' UNION ALL '.join(
+        APORTACIONES.format(tabla=tabla, signo=signo) for tabla, signo in FUENTES[operacion]
+    )
+    nombre = f'huella_estadisticas_{operacion.lower()}'
+    return f"""
+CREATE FUNCTION {nombre}() RETURNS trigger AS $$
+BEGIN
+    {APLICAR.format(aportaciones=aportaciones)}
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {nombre}
+    AFTER {operacion} ON huella_app_huella
+    REFERENCING {TRANSICIONES[operacion]}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+"""
+
+
+def _borrar_trigger(operacion):
+    nombre = f'huella_estadisticas_{operacion.lower()}'
+    return f"""
+DROP TRIGGER IF EXISTS {nombre} ON huella_app_huella;
+DROP FUNCTION IF EXISTS {nombre}();
+"""
+
+
+# Carga inicial (misma consulta que estadisticas.SQL_RECALCULAR)
+RELLENAR = f"""
+INSERT INTO {ESTADISTICAS} (dimension, valor, cantidad)
+WITH grupos AS (
+    SELECT CASE
+               WHEN GROUPING(provincia) = 0 THEN 'provincia'
+               WHEN GROUPING(poblacion) = 0 THEN 'poblacion'
+               WHEN GROUPING(codigopostal) = 0 THEN 'codigopostal'
+               ELSE 'total'
+           END AS dimension,
+           coalesce(provincia, poblacion, codigopostal, '') AS valor,
+           count(*) AS cantidad
+    FROM huella_app_huella
+    GROUP BY GROUPING SETS ((provincia), (poblacion), (codigopostal), ())
+)
+SELECT dimension, valor, cantidad FROM grupos
+UNION ALL
+SELECT 'distintos', dimension, count(*) FROM grupos WHERE dimension <> 'total' GROUP BY dimension;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0016_huella_direccion_normalizada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaHuella',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('valor', models.CharField(blank=True, max_length=255)),
+                ('cantidad', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estadística de Huella',
+                'verbose_name_plural': 'Estadísticas de Huella',
+                'indexes': [models.Index(fields=['dimension', '-cantidad'], name='estadistica_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticahuella',
+            constraint=models.UniqueConstraint(fields=('dimension', 'valor'), name='estadistica_dimension_valor_uniq'),
+        ),
+        migrations.RunSQL(
+            'LOCK TABLE huella_app_huella IN SHARE MODE;' + RELLENAR
+            + ''.join(_crear_trigger(operacion) for operacion in FUENTES),
+            ''.join(_borrar_trigger(operacion) for operacion in FUENTES),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('huella_app', '0017_estadisticahuella'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportacionHuella',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON (un objeto JSON por línea)')], default='csv', max_length=10)),
+                ('filtros', models.JSONField(blank=True, default=dict, help_text='Filtros normalizados de la exportación')),
+                ('firma', models.CharField(db_index=True, help_text='Hash de formato y filtros', max_length=32)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error en validación')], default='PENDIENTE', max_length=20)),
+                ('tarea_id', models.CharField(blank=True, help_text='ID de la tarea Celery que genera el fichero', max_length=255)),
+                ('fichero', models.FileField(blank=True, null=True, upload_to='exportaciones/')),
+                ('filas', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exportaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exportación de Huella',
+                'verbose_name_plural': 'Exportaciones de Huella',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
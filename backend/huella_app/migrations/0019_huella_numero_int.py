@@ -0,0 +1,59 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:28
+#
+# Número de la vía como entero. Lo rellena un trigger con los dígitos
+# iniciales de `numero` ("00005" → 5, "12B" → 12, "S/N" → NULL), también en
+# las importaciones masivas. El índice (poblacion, nombrevia, numero_int)
+# permite buscar los vecinos de un portal con un único rango del índice.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from ._rellenos import rellenar_por_lotes
+
+CREAR_TRIGGER = r"""
+CREATE FUNCTION huella_actualizar_numero_entero() RETURNS trigger AS $$
+BEGIN
+    NEW.numero_int := substring(NEW.numero FROM '^\s*([0-9]+)')::integer;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER huella_numero_entero
+    BEFORE INSERT OR UPDATE OF numero ON huella_app_huella
+    FOR EACH ROW EXECUTE FUNCTION huella_actualizar_numero_entero();
+"""
+
+BORRAR_TRIGGER = """
+DROP TRIGGER IF EXISTS huella_numero_entero ON huella_app_huella;
+DROP FUNCTION IF EXISTS huella_actualizar_numero_entero();
+"""
+
+RELLENAR = r"UPDATE huella_app_huella SET numero_int = substring(numero FROM '^\s*([0-9]+)')::integer"
+
+
+def rellenar(apps, schema_editor):
+    rellenar_por_lotes(schema_editor, RELLENAR, r"numero ~ '^\s*[0-9]'")
+
+
+class Migration(migrations.Migration):
+    # El índice se crea sin bloquear las escrituras en Huella y el relleno se
+    # confirma por lotes
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0018_exportacionhuella'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='huella',
+            name='numero_int',
+            field=models.IntegerField(blank=True, editable=False, help_text='Número de la vía como entero (lo calcula la base de datos)', null=True),
+        ),
+        migrations.RunSQL(CREAR_TRIGGER, BORRAR_TRIGGER),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['poblacion', 'nombrevia', 'numero_int'], name='huella_via_numero_idx'),
+        ),
+    ]
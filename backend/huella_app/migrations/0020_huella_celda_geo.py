@@ -0,0 +1,78 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:35
+#
+# Celda espacial de cada huella para las consultas por radio y por área sin
+# PostGIS. huella_celda_geo() numera las celdas de una rejilla de 2^26 x 2^26
+# sobre longitud y latitud en orden Z (bits de x e y intercalados), igual que
+# geoespacial.celda(); un trigger la calcula al escribir lat/lng, también en
+# las importaciones masivas.
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from ._rellenos import rellenar_por_lotes
+
+CREAR_TRIGGER = """
+CREATE FUNCTION huella_expandir_bits(v bigint) RETURNS bigint AS $$
+BEGIN
+    v := (v | (v << 16)) & 281470681808895;     -- 0x0000FFFF0000FFFF
+    v := (v | (v << 8)) & 71777214294589695;    -- 0x00FF00FF00FF00FF
+    v := (v | (v << 4)) & 1085102592571150095;  -- 0x0F0F0F0F0F0F0F0F
+    v := (v | (v << 2)) & 3689348814741910323;  -- 0x3333333333333333
+    v := (v | (v << 1)) & 6148914691236517205;  -- 0x5555555555555555
+    RETURN v;
+END
+$$ LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE FUNCTION huella_celda_geo(lat numeric, lng numeric) RETURNS bigint AS $$
+    SELECT huella_expandir_bits(least(greatest(floor((lng + 180) / 360 * 67108864), 0), 67108863)::bigint)
+         | (huella_expandir_bits(least(greatest(floor((lat + 90) / 180 * 67108864), 0), 67108863)::bigint) << 1)
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE FUNCTION huella_actualizar_celda_geo() RETURNS trigger AS $$
+BEGIN
+    NEW.celda_geo := huella_celda_geo(NEW.lat, NEW.lng);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER huella_celda_geo
+    BEFORE INSERT OR UPDATE OF lat, lng ON huella_app_huella
+    FOR EACH ROW EXECUTE FUNCTION huella_actualizar_celda_geo();
+"""
+
+BORRAR_TRIGGER = """
+DROP TRIGGER IF EXISTS huella_celda_geo ON huella_app_huella;
+DROP FUNCTION IF EXISTS huella_actualizar_celda_geo();
+DROP FUNCTION IF EXISTS huella_celda_geo(numeric, numeric);
+DROP FUNCTION IF EXISTS huella_expandir_bits(bigint);
+"""
+
+RELLENAR = 'UPDATE huella_app_huella SET celda_geo = huella_celda_geo(lat, lng)'
+
+
+def rellenar(apps, schema_editor):
+    rellenar_por_lotes(schema_editor, RELLENAR, 'lat IS NOT NULL AND lng IS NOT NULL')
+
+
+class Migration(migrations.Migration):
+    # El índice se crea sin bloquear las escrituras en Huella y el relleno se
+    # confirma por lotes
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0019_huella_numero_int'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='huella',
+            name='celda_geo',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Celda espacial de lat/lng (la calcula la base de datos)', null=True),
+        ),
+        migrations.RunSQL(CREAR_TRIGGER, BORRAR_TRIGGER),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='huella',
+            index=models.Index(fields=['celda_geo'], name='huella_celda_geo_idx'),
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:34
+#
+# Rejilla precalculada del mapa (CeldaMapa), niveles 2 a 16, mantenida por
+# triggers de sentencia sobre Huella como los contadores de la migración
+# 0017. Cada sentencia agrupa sus filas por celda de nivel 16 y provincia, y
+# de ahí sube a los niveles gruesos; en un UPDATE solo cuentan las filas a
+# las que les cambian las coordenadas o la provincia.
+
+from django.db import migrations, models
+
+MAPA = 'huella_app_celdamapa'
+NIVEL_MINIMO = 2
+NIVEL_PRECALCULADO = 16
+# Celda de nivel 16 a partir de celda_geo (nivel 26)
+DESPLAZAMIENTO_BASE = 2 * (26 - NIVEL_PRECALCULADO)
+
+# Filas (celda de nivel 16, provincia, +-1, +-lat, +-lng) de una tabla de transición
+APORTACIONES = (
+    "SELECT t.celda_geo >> {desplazamiento} AS celda, t.provincia_normalizada, "
+    "{signo} AS cantidad, {signo} * t.lat AS suma_lat, {signo} * t.lng AS suma_lng "
+    "FROM {origen} WHERE t.celda_geo IS NOT NULL"
+)
+# En un UPDATE, solo las filas que cambian de sitio o de provincia
+CAMBIADAS = (
+    " AND (t.celda_geo, t.lat, t.lng, t.provincia_normalizada)"
+    " IS DISTINCT FROM (o.celda_geo, o.lat, o.lng, o.provincia_normalizada)"
+)
+
+# Suma las diferencias en orden fijo (sin deadlocks entre lotes paralelos).
+# Las celdas que quedan a 0 las borra la reconciliación.
+APLICAR = f"""
+    WITH base AS (
+        SELECT celda, provincia_normalizada, sum(cantidad) AS cantidad,
+               sum(suma_lat) AS suma_lat, sum(suma_lng) AS suma_lng
+        FROM ({{aportaciones}}) AS a
+        GROUP BY celda, provincia_normalizada
+    ),
+    cambios AS (
+        SELECT n.nivel, b.celda >> (2 * ({NIVEL_PRECALCULADO} - n.nivel)) AS celda, b.provincia_normalizada,
+               sum(b.cantidad) AS cantidad, sum(b.suma_lat) AS suma_lat, sum(b.suma_lng) AS suma_lng
+        FROM base b CROSS JOIN generate_series({NIVEL_MINIMO}, {NIVEL_PRECALCULADO}) AS n(nivel)
+        GROUP BY 1, 2, 3
+        HAVING sum(b.cantidad) <> 0 OR sum(b.suma_lat) <> 0 OR sum(b.suma_lng) <> 0
+    )
+    INSERT INTO {MAPA} AS m (nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng)
+    SELECT nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng
+    FROM cambios ORDER BY nivel, celda, provincia_normalizada
+    ON CONFLICT (nivel, celda, provincia_normalizada) DO UPDATE SET
+        cantidad = m.cantidad + EXCLUDED.cantidad,
+        suma_lat = m.suma_lat + EXCLUDED.suma_lat,
+        suma_lng = m.suma_lng + EXCLUDED.suma_lng;
+"""
+
+FUENTES = {
+    'INSERT': [('nuevas t', '1', '')],
+    'UPDATE': [
+        ('nuevas t JOIN antiguas o ON o.id = t.id', '1', CAMBIADAS),
+        ('antiguas t JOIN nuevas o ON o.id = t.id', '-1', CAMBIADAS),
+    ],
+    'DELETE': [('antiguas t', '-1', '')],
+}
+TRANSICIONES = {
+    'INSERT': 'NEW TABLE AS nuevas',
+    'UPDATE': 'OLD TABLE AS antiguas NEW TABLE AS nuevas',
+    'DELETE': 'OLD TABLE AS antiguas',
+}
+
+
+def _crear_trigger(operacion):
+    aportaciones = ' UNION ALL '.join(
+        APORTACIONES.format(desplazamiento=DESPLAZAMIENTO_BASE, signo=signo, origen=origen) + condicion
+        for origen, signo, condicion in FUENTES[operacion]
+    )
+    nombre = f'huella_mapa_{operacion.lower()}'
+    return f"""
+CREATE FUNCTION {nombre}() RETURNS trigger AS $$
+BEGIN
+    {APLICAR.format(aportaciones=aportaciones)}
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {nombre}
+    AFTER {operacion} ON huella_app_huella
+    REFERENCING {TRANSICIONES[operacion]}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+"""
+
+
+def _borrar_trigger(operacion):
+    nombre = f'huella_mapa_{operacion.lower()}'
+    return f"""
+DROP TRIGGER IF EXISTS {nombre} ON huella_app_huella;
+DROP FUNCTION IF EXISTS {nombre}();
+"""
+
+
+# Carga inicial (misma consulta que mapa.SQL_RECALCULAR)
+RELLENAR = f"""
+INSERT INTO {MAPA} (nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng)
+WITH base AS (
+    SELECT celda_geo >> {DESPLAZAMIENTO_BASE} AS celda, provincia_normalizada,
+           count(*) AS cantidad, sum(lat) AS suma_lat, sum(lng) AS suma_lng
+    FROM huella_app_huella
+    WHERE celda_geo IS NOT NULL
+    GROUP BY 1, 2
+)
+SELECT n.nivel, b.celda >> (2 * ({NIVEL_PRECALCULADO} - n.nivel)) AS celda, b.provincia_normalizada,
+       sum(b.cantidad) AS cantidad, sum(b.suma_lat) AS suma_lat, sum(b.suma_lng) AS suma_lng
+FROM base b CROSS JOIN generate_series({NIVEL_MINIMO}, {NIVEL_PRECALCULADO}) AS n(nivel)
+GROUP BY 1, 2, 3;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0020_huella_celda_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldaMapa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel', models.SmallIntegerField()),
+                ('celda', models.BigIntegerField()),
+                ('provincia_normalizada', models.CharField(blank=True, max_length=22)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('suma_lat', models.DecimalField(decimal_places=8, default=0, max_digits=24)),
+                ('suma_lng', models.DecimalField(decimal_places=8, default=0, max_digits=24)),
+            ],
+            options={
+                'verbose_name': 'Celda del Mapa',
+                'verbose_name_plural': 'Celdas del Mapa',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='celdamapa',
+            constraint=models.UniqueConstraint(fields=('nivel', 'celda', 'provincia_normalizada'), name='celda_mapa_uniq'),
+        ),
+        migrations.RunSQL(
+            'LOCK TABLE huella_app_huella IN SHARE MODE;' + RELLENAR
+            + ''.join(_crear_trigger(operacion) for operacion in FUENTES),
+            ''.join(_borrar_trigger(operacion) for operacion in FUENTES),
+        ),
+    ]
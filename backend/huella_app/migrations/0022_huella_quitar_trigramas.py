@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-17 10:05
+#
+# Quita los índices de trigramas que ya no usa ninguna consulta: ?search=
+# va por Huella.busqueda (0015) y los filtros de dirección por las columnas
+# *_normalizada (0016). Se mantienen los de codigoolt y codigocto, que se
+# siguen buscando con icontains. Cada índice GIN ralentizaba las cargas.
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Los índices se borran sin bloquear las escrituras en Huella
+    atomic = False
+
+    dependencies = [
+        ('huella_app', '0021_celdamapa'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_iddomicilioto_trgm',
+        ),
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_codigopostal_trgm',
+        ),
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_provincia_trgm',
+        ),
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_poblacion_trgm',
+        ),
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_nombrevia_trgm',
+        ),
+        RemoveIndexConcurrently(
+            model_name='huella',
+            name='huella_observaciones_trgm',
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.27 on 2026-10-17 10:40
+#
+# Los triggers de estadísticas de la 0017 sumaban sus diferencias en
+# EstadisticaHuella dentro de cada escritura: todas las sentencias sobre
+# Huella actualizaban la fila 'total' y las de 'distintos', y el INSERT y el
+# UPDATE de un mismo upsert las bloqueaban en órdenes distintos, así que los
+# tramos en paralelo se esperaban entre sí o acababan en deadlock. Ahora cada
+# sentencia solo inserta sus diferencias agregadas en CambioEstadistica y
+# estadisticas.aplicar_cambios las suma en un único proceso. El número de
+# valores distintos ya no se guarda: se cuenta al leer.
+
+import importlib
+
+from django.db import migrations, models
+
+ESTADISTICAS = 'huella_app_estadisticahuella'
+CAMBIOS = 'huella_app_cambioestadistica'
+
+# Filas (dimensión, valor, +1/-1) que aporta cada fila de la tabla de transición
+APORTACIONES = (
+    "SELECT 'total' AS dimension, ''::varchar AS valor, {signo} AS delta FROM {tabla} "
+    "UNION ALL SELECT 'provincia', provincia, {signo} FROM {tabla} "
+    "UNION ALL SELECT 'poblacion', poblacion, {signo} FROM {tabla} "
+    "UNION ALL SELECT 'codigopostal', codigopostal, {signo} FROM {tabla}"
+)
+
+# Solo inserta: no toca ninguna fila que otra escritura pueda estar usando
+REGISTRAR = f"""
+    INSERT INTO {CAMBIOS} (dimension, valor, delta)
+    SELECT dimension, valor, sum(delta)
+    FROM ({{aportaciones}}) AS a
+    GROUP BY dimension, valor
+    HAVING sum(delta) <> 0;
+"""
+
+FUENTES = {
+    'INSERT': [('nuevas', '1')],
+    'UPDATE': [('nuevas', '1'), ('antiguas', '-1')],
+    'DELETE': [('antiguas', '-1')],
+}
+
+
+def _funcion(operacion, cuerpo):
+    """Sustituye el cuerpo de la función del trigger (el trigger no cambia)."""
+    return f"""
+CREATE OR REPLACE FUNCTION huella_estadisticas_{operacion.lower()}() RETURNS trigger AS $$
+BEGIN
+    {cuerpo}
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _aportaciones(operacion):
+    return ' UNION ALL '.join(
+        APORTACIONES.format(tabla=tabla, signo=signo) for tabla, signo in FUENTES[operacion]
+    )
+
+
+def _funciones_anteriores():
+    """Funciones de la migración 0017, para deshacer esta."""
+    anterior = importlib.import_module('huella_app.migrations.0017_estadisticahuella')
+    return ''.join(
+        _funcion(operacion, anterior.APLICAR.format(aportaciones=_aportaciones(operacion)))
+        for operacion in FUENTES
+    )
+
+
+FUNCIONES = ''.join(
+    _funcion(operacion, REGISTRAR.format(aportaciones=_aportaciones(operacion)))
+    for operacion in FUENTES
+)
+
+# Al deshacer: se suman los cambios pendientes y se vuelven a guardar los distintos
+DESHACER = f"""
+INSERT INTO {ESTADISTICAS} AS e (dimension, valor, cantidad)
+SELECT dimension, valor, sum(delta) FROM {CAMBIOS} GROUP BY dimension, valor ORDER BY dimension, valor
+ON CONFLICT (dimension, valor) DO UPDATE SET cantidad = e.cantidad + EXCLUDED.cantidad;
+DELETE FROM {CAMBIOS};
+INSERT INTO {ESTADISTICAS} (dimension, valor, cantidad)
+SELECT 'distintos', dimension, count(*) FROM {ESTADISTICAS}
+WHERE dimension <> 'total' AND cantidad > 0 GROUP BY dimension;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0022_huella_quitar_trigramas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioEstadistica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('valor', models.CharField(blank=True, max_length=255)),
+                ('delta', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Cambio de Estadística',
+                'verbose_name_plural': 'Cambios de Estadísticas',
+            },
+        ),
+        migrations.RunSQL(
+            FUNCIONES + f"DELETE FROM {ESTADISTICAS} WHERE dimension = 'distintos';",
+            _funciones_anteriores() + DESHACER,
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 4.2.27 on 2026-10-17 11:20
+#
+# Los triggers de la rejilla del mapa de la 0021 sumaban cada sentencia en
+# CeldaMapa, en sus 15 niveles: las celdas gruesas (una provincia entera en
+# una fila) las tocaban todas las escrituras, que se esperaban entre sí, y
+# en un orden distinto al de los contadores de estadísticas. Ahora cada
+# sentencia solo inserta sus diferencias del nivel 16 en CambioCeldaMapa y
+# mapa.aplicar_cambios las sube a todos los niveles en un único proceso.
+
+import importlib
+
+from django.db import migrations, models
+
+MAPA = 'huella_app_celdamapa'
+CAMBIOS = 'huella_app_cambioceldamapa'
+NIVEL_MINIMO = 2
+NIVEL_PRECALCULADO = 16
+# Celda de nivel 16 a partir de celda_geo (nivel 26)
+DESPLAZAMIENTO_BASE = 2 * (26 - NIVEL_PRECALCULADO)
+
+# Filas (celda de nivel 16, provincia, +-1, +-lat, +-lng) de una tabla de transición
+APORTACIONES = (
+    "SELECT t.celda_geo >> {desplazamiento} AS celda, t.provincia_normalizada, "
+    "{signo} AS cantidad, {signo} * t.lat AS suma_lat, {signo} * t.lng AS suma_lng "
+    "FROM {origen} WHERE t.celda_geo IS NOT NULL"
+)
+# Solo inserta: no toca ninguna fila que otra escritura pueda estar usando.
+# En un UPDATE, las filas que no cambian de sitio ni de provincia suman y
+# restan lo mismo y el GROUP BY las descarta; la 0021 las filtraba uniendo
+# las dos tablas de transición por id, y esa unión (sin índices ni
+# estadísticas) tardaba segundos en cada lote
+REGISTRAR = f"""
+    INSERT INTO {CAMBIOS} (celda, provincia_normalizada, cantidad, suma_lat, suma_lng)
+    SELECT celda, provincia_normalizada, sum(cantidad), sum(suma_lat), sum(suma_lng)
+    FROM ({{aportaciones}}) AS a
+    GROUP BY celda, provincia_normalizada
+    HAVING sum(cantidad) <> 0 OR sum(suma_lat) <> 0 OR sum(suma_lng) <> 0;
+"""
+
+FUENTES = {
+    'INSERT': [('nuevas t', '1')],
+    'UPDATE': [('nuevas t', '1'), ('antiguas t', '-1')],
+    'DELETE': [('antiguas t', '-1')],
+}
+
+
+def _funcion(operacion, cuerpo):
+    """Sustituye el cuerpo de la función del trigger (el trigger no cambia)."""
+    return f"""
+CREATE OR REPLACE FUNCTION huella_mapa_{operacion.lower()}() RETURNS trigger AS $$
+BEGIN
+    {cuerpo}
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _aportaciones(operacion):
+    return ' UNION ALL '.join(
+        APORTACIONES.format(desplazamiento=DESPLAZAMIENTO_BASE, signo=signo, origen=origen)
+        for origen, signo in FUENTES[operacion]
+    )
+
+
+def _funciones_anteriores():
+    """Funciones de la migración 0021, para deshacer esta."""
+    anterior = importlib.import_module('huella_app.migrations.0021_celdamapa')
+    return ''.join(
+        _funcion(operacion, anterior.APLICAR.format(aportaciones=' UNION ALL '.join(
+            anterior.APORTACIONES.format(desplazamiento=DESPLAZAMIENTO_BASE, signo=signo, origen=origen) + condicion
+            for origen, signo, condicion in anterior.FUENTES[operacion]
+        )))
+        for operacion in FUENTES
+    )
+
+
+FUNCIONES = ''.join(
+    _funcion(operacion, REGISTRAR.format(aportaciones=_aportaciones(operacion)))
+    for operacion in FUENTES
+)
+
+# Los triggers de la 0021 dejaban en CeldaMapa las celdas que se quedaban a 0;
+# ahora mapa.aplicar_cambios las borra al sumar
+BORRAR_VACIAS = f"DELETE FROM {MAPA} WHERE cantidad = 0;"
+
+# Al deshacer: se suben a todos los niveles los cambios pendientes
+DESHACER = f"""
+INSERT INTO {MAPA} AS m (nivel, celda, provincia_normalizada, cantidad, suma_lat, suma_lng)
+SELECT n.nivel, c.celda >> (2 * ({NIVEL_PRECALCULADO} - n.nivel)), c.provincia_normalizada,
+       sum(c.cantidad), sum(c.suma_lat), sum(c.suma_lng)
+FROM {CAMBIOS} c CROSS JOIN generate_series({NIVEL_MINIMO}, {NIVEL_PRECALCULADO}) AS n(nivel)
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+ON CONFLICT (nivel, celda, provincia_normalizada) DO UPDATE SET
+    cantidad = m.cantidad + EXCLUDED.cantidad,
+    suma_lat = m.suma_lat + EXCLUDED.suma_lat,
+    suma_lng = m.suma_lng + EXCLUDED.suma_lng;
+DELETE FROM {CAMBIOS};
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0023_cambioestadistica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioCeldaMapa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celda', models.BigIntegerField()),
+                ('provincia_normalizada', models.CharField(blank=True, max_length=22)),
+                ('cantidad', models.BigIntegerField()),
+                ('suma_lat', models.DecimalField(decimal_places=8, max_digits=24)),
+                ('suma_lng', models.DecimalField(decimal_places=8, max_digits=24)),
+            ],
+            options={
+                'verbose_name': 'Cambio de Celda del Mapa',
+                'verbose_name_plural': 'Cambios de Celdas del Mapa',
+            },
+        ),
+        migrations.RunSQL(FUNCIONES + BORRAR_VACIAS, _funciones_anteriores() + DESHACER),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-17 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huella_app', '0024_cambioceldamapa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacionhuella',
+            name='fichero_correcciones',
+            field=models.FileField(blank=True, help_text='Correcciones (numLinea|valor) pendientes de cargar por la tarea que las aplica', null=True, upload_to='cargas/correcciones/'),
+        ),
+        migrations.AddField(
+            model_name='incidenciaimportacion',
+            name='correccion',
+            field=models.TextField(blank=True, help_text='Corrección recibida pendiente de validar', null=True),
+        ),
+    ]
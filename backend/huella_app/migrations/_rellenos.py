@@ -0,0 +1,38 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Relleno por lotes de columnas nuevas de Huella en las migraciones. Un único
+# UPDATE sobre toda la tabla genera de golpe el WAL de todas las filas y las
+# deja bloqueadas hasta el final; por tramos de id, cada lote es una
+# transacción corta. Las migraciones que lo usan son atomic = False para que
+# cada lote se confirme por separado. (El cargador de migraciones no lee los
+# módulos que empiezan por "_".)
+
+TAMANO_LOTE = 10000
+
+
+def rellenar_por_lotes(schema_editor, actualizar, condicion=None, tamano=TAMANO_LOTE):
+    """
+    Ejecuta `actualizar` ("UPDATE huella_app_huella SET ...", sin WHERE) por
+    lotes de `tamano` ids consecutivos, añadiendo `condicion` al WHERE de
+    cada lote.
+    """
+    filtro = f' AND ({condicion})' if condicion else ''
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(id) FROM huella_app_huella')
+        (desde,) = cursor.fetchone()
+        while desde is not None:
+            # Primer id del lote siguiente (los huecos de ids no dejan lotes vacíos)
+            cursor.execute(
+                'SELECT id FROM huella_app_huella WHERE id >= %s ORDER BY id OFFSET %s LIMIT 1',
+                [desde, tamano],
+            )
+            fila = cursor.fetchone()
+            hasta = fila[0] if fila else None
+            if hasta is None:
+                cursor.execute(f'{actualizar} WHERE id >= %s{filtro}', [desde])
+            else:
+                cursor.execute(f'{actualizar} WHERE id >= %s AND id < %s{filtro}', [desde, hasta])
+            desde = hasta
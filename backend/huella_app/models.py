@@ -2,15 +2,40 @@
 # Veersion: 1.1
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
-# Última Modificación: 02-02-2026
-# Cambio realizado: añadido modelo para gestión de usuarios.
+# Última Modificación: 17-10-2026
+# Cambio realizado: correcciones de importación aplicadas por una tarea Celery.
 # Descripción:
 # Modelos de datos para la aplicación de gestión de huellas de domicilios.
 
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 
-class Huella(models.Model):
+# Columnas de Huella que se buscan por subcadena (__icontains en por_olt,
+# por_cto, mapa y exportaciones, y trozos de código en ?search=). Django
+# traduce icontains a UPPER(columna) LIKE UPPER('%...%'), así que los índices
+# de trigramas se crean sobre UPPER(columna) para que el planificador los use
+# tal cual. El resto de columnas se buscan por Huella.busqueda o por las
+# columnas *_normalizada (migración 0022).
+CAMPOS_BUSQUEDA_SUBCADENA = ['codigoolt', 'codigocto']
+
+class ValoresCargadosMixin:
+    """
+    Guarda los valores leídos de la base de datos al cargar la instancia.
+    La auditoría (signals.log_model_save) los compara con los actuales al
+    guardar para registrar qué campos cambian sin repetir la consulta.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
+
+class Huella(ValoresCargadosMixin, models.Model):
     """
     Modelo para gestionar líneas de huella de domicilios.
     Campos basados en el estándar de ficheros CH (COLUMNAS_CABECERAS).
@@ -273,6 +298,66 @@ class Huella(models.Model):
         help_text='Coordenada de longitud'
     )
     
+    # Huella del contenido (md5 de los 36 campos) que calcula la importación
+    # para no reescribir las filas que no han cambiado
+    hash_contenido = models.UUIDField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Hash de los campos de negocio (lo calcula la importación)'
+    )
+    
+    # Provincia, población y vía en mayúsculas, sin tildes ni signos de
+    # puntuación (como normalization.normalizar_texto). Las rellena un trigger
+    # de PostgreSQL (migración 0016) y las usan los filtros por dirección
+    provincia_normalizada = models.CharField(
+        max_length=22,
+        default='',
+        editable=False,
+        help_text='Provincia normalizada (la calcula la base de datos)'
+    )
+    poblacion_normalizada = models.CharField(
+        max_length=255,
+        default='',
+        editable=False,
+        help_text='Población normalizada (la calcula la base de datos)'
+    )
+    nombrevia_normalizada = models.CharField(
+        max_length=255,
+        default='',
+        editable=False,
+        help_text='Nombre de vía normalizado (lo calcula la base de datos)'
+    )
+    
+    # Número de la vía como entero ("00005" → 5, "12B" → 12; sin dígitos
+    # iniciales, NULL). Lo rellena un trigger de PostgreSQL (migración 0019)
+    # y lo usa la acción vecinos para buscar por rango de números
+    numero_int = models.IntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Número de la vía como entero (lo calcula la base de datos)'
+    )
+    
+    # Celda de la rejilla espacial (orden Z, nivel 26) que contiene lat/lng.
+    # La calcula un trigger de PostgreSQL (migración 0020); las consultas por
+    # radio y por área la leen por rangos de su índice (ver geoespacial.py)
+    celda_geo = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Celda espacial de lat/lng (la calcula la base de datos)'
+    )
+    
+    # Vector de búsqueda de texto completo (?search=). Lo mantiene un trigger
+    # de PostgreSQL (migración 0015) en cualquier INSERT/UPDATE, también en
+    # las importaciones masivas
+    busqueda = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text='Vector de búsqueda (lo calcula la base de datos)'
+    )
+    
     # Campos de auditoría
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -286,11 +371,141 @@ class Huella(models.Model):
             models.Index(fields=['codigopostal', 'provincia']),
             models.Index(fields=['codigoolt']),
             models.Index(fields=['codigocto']),
+            # Clave de la paginación por cursor (orden estable -created, -id)
+            models.Index(fields=['created', 'id'], name='huella_created_id_idx'),
+        ] + [
+            GinIndex(OpClass(Upper(campo), name='gin_trgm_ops'), name=f'huella_{campo}_trgm')
+            for campo in CAMPOS_BUSQUEDA_SUBCADENA
+        ] + [
+            GinIndex(fields=['busqueda'], name='huella_busqueda_gin'),
+        ] + [
+            # pattern_ops: sirven para = y para LIKE 'prefijo%' con cualquier collation
+            models.Index(fields=[f'{campo}_normalizada'], name=f'huella_{campo}_norm_idx',
+                         opclasses=['varchar_pattern_ops'])
+            for campo in ('provincia', 'poblacion', 'nombrevia')
+        ] + [
+            # Portales de una misma vía por rango de número (acción vecinos)
+            models.Index(fields=['poblacion', 'nombrevia', 'numero_int'], name='huella_via_numero_idx'),
+            # Consultas por radio y por área (rangos de celdas)
+            models.Index(fields=['celda_geo'], name='huella_celda_geo_idx'),
         ]
     
     def __str__(self):
         return f"{self.nombrevia} {self.numero}, {self.poblacion} ({self.iddomicilioto})"
 
+    def save(self, *args, **kwargs):
+        # Una edición manual invalida el hash: la siguiente importación
+        # vuelve a comparar la fila con el fichero y la reescribe si difiere
+        self.hash_contenido = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'hash_contenido'}
+        super().save(*args, **kwargs)
+
+
+class EstadisticaHuella(models.Model):
+    """
+    Contadores de Huella para el endpoint de estadísticas.
+
+    Una fila por valor de cada dimensión (provincia, población, código
+    postal) con su número de huellas, más el total ('total', ''). Unos
+    triggers de PostgreSQL sobre Huella (migración 0023) apuntan las
+    diferencias en CambioEstadistica, así que valen igual para importaciones
+    masivas que para el CRUD; la tarea aplicar_agregados las suma aquí cada
+    pocos segundos y reconciliar_estadisticas los recalcula.
+    """
+    TOTAL = 'total'
+    DIMENSIONES = ('provincia', 'poblacion', 'codigopostal')
+
+    dimension = models.CharField(max_length=20)
+    valor = models.CharField(max_length=255, blank=True)
+    cantidad = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Estadística de Huella'
+        verbose_name_plural = 'Estadísticas de Huella'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'valor'], name='estadistica_dimension_valor_uniq'),
+        ]
+        indexes = [
+            # Top N de cada dimensión sin ordenar la tabla
+            models.Index(fields=['dimension', '-cantidad'], name='estadistica_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.valor}: {self.cantidad}"
+
+
+class CambioEstadistica(models.Model):
+    """
+    Diferencias de los contadores de EstadisticaHuella pendientes de sumar.
+    Los triggers de Huella solo insertan filas aquí, sin actualizar ninguna:
+    las escrituras en paralelo no compiten por las filas de los contadores
+    (el total, las provincias con más huellas). estadisticas.aplicar_cambios
+    las suma y las borra.
+    """
+    dimension = models.CharField(max_length=20)
+    valor = models.CharField(max_length=255, blank=True)
+    delta = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = 'Cambio de Estadística'
+        verbose_name_plural = 'Cambios de Estadísticas'
+
+    def __str__(self):
+        return f"{self.dimension}={self.valor}: {self.delta:+d}"
+
+
+class CeldaMapa(models.Model):
+    """
+    Rejilla precalculada del mapa de huellas: número de huellas y suma de sus
+    coordenadas por celda (numeración de Huella.celda_geo en un nivel más
+    grueso) y provincia, para los niveles de mapa.NIVEL_MINIMO a
+    mapa.NIVEL_PRECALCULADO. Con las sumas el centroide de varias filas es
+    suma / cantidad. Unos triggers de PostgreSQL sobre Huella (migración
+    0024) apuntan las diferencias en CambioCeldaMapa, la tarea
+    aplicar_agregados las suma aquí y reconciliar_mapa la recalcula.
+    """
+    nivel = models.SmallIntegerField()
+    celda = models.BigIntegerField()
+    # Mismo nombre que en Huella para filtrar con filtros.filtro_direccion
+    provincia_normalizada = models.CharField(max_length=22, blank=True)
+    cantidad = models.BigIntegerField(default=0)
+    suma_lat = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+    suma_lng = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+
+    class Meta:
+        verbose_name = 'Celda del Mapa'
+        verbose_name_plural = 'Celdas del Mapa'
+        constraints = [
+            models.UniqueConstraint(fields=['nivel', 'celda', 'provincia_normalizada'], name='celda_mapa_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Nivel {self.nivel}, celda {self.celda} ({self.provincia_normalizada}): {self.cantidad}"
+
+
+class CambioCeldaMapa(models.Model):
+    """
+    Diferencias de CeldaMapa pendientes de sumar, por celda del nivel más
+    fino guardado (mapa.NIVEL_PRECALCULADO) y provincia. Los triggers de
+    Huella solo insertan filas aquí: las escrituras en paralelo no compiten
+    por las celdas de los niveles gruesos, que reúnen miles de huellas.
+    mapa.aplicar_cambios las sube a todos los niveles y las borra.
+    """
+    celda = models.BigIntegerField()
+    provincia_normalizada = models.CharField(max_length=22, blank=True)
+    cantidad = models.BigIntegerField()
+    suma_lat = models.DecimalField(max_digits=24, decimal_places=8)
+    suma_lng = models.DecimalField(max_digits=24, decimal_places=8)
+
+    class Meta:
+        verbose_name = 'Cambio de Celda del Mapa'
+        verbose_name_plural = 'Cambios de Celdas del Mapa'
+
+    def __str__(self):
+        return f"Celda {self.celda} ({self.provincia_normalizada}): {self.cantidad:+d}"
+
 
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -299,7 +514,7 @@ from django.utils import timezone
 # GESTIÓN DE IMPORTACIONES DE FICHEROS
 # ==========================================
 
-class ImportacionHuella(models.Model):
+class ImportacionHuella(ValoresCargadosMixin, models.Model):
     ESTADOS = (
         ('PENDIENTE', 'Pendiente'),
         ('PROCESANDO', 'Procesando'),
@@ -311,7 +526,21 @@ class ImportacionHuella(models.Model):
     fichero_original = models.FileField(upload_to='cargas/originales/')
     fichero_errores = models.FileField(upload_to='cargas/errores/', null=True, blank=True)
     fichero_normalizado = models.FileField(upload_to='cargas/normalizados/', null=True, blank=True)
+    fichero_correcciones = models.FileField(
+        upload_to='cargas/correcciones/', null=True, blank=True,
+        help_text="Correcciones (numLinea|valor) pendientes de cargar por la tarea que las aplica"
+    )
     estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    tarea_id = models.CharField(max_length=255, blank=True, help_text="ID de la tarea Celery que procesa el fichero")
+
+    # Contadores del resultado de la carga
+    lineas_procesadas = models.IntegerField(default=0)
+    lineas_creadas = models.IntegerField(default=0)
+    lineas_actualizadas = models.IntegerField(default=0)
+    lineas_sin_cambios = models.IntegerField(default=0)
+    lineas_error = models.IntegerField(default=0)
+    lineas_incidencias = models.IntegerField(default=0, help_text="Líneas rechazadas en la normalización")
+
     log_proceso = models.TextField(blank=True, help_text="Log detallado del proceso")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
@@ -320,15 +549,126 @@ class ImportacionHuella(models.Model):
         verbose_name_plural = 'Importaciones de Huella'
         ordering = ['-fecha_creacion']
 
+    @property
+    def fichero_a_cargar(self):
+        """Fichero que se carga en Huella: el normalizado si existe, si no el original."""
+        return self.fichero_normalizado or self.fichero_original
+
     def __str__(self):
         return f"Importación {self.id} - {self.estado} ({self.fecha_creacion.strftime('%Y-%m-%d %H:%M')})"
 
 
+class TramoImportacion(models.Model):
+    """
+    Rango de bytes del fichero de una importación que procesa una sub-tarea.
+    Guarda el punto de control del último lote confirmado para que una tarea
+    reiniciada continúe desde ahí.
+    """
+    importacion = models.ForeignKey(ImportacionHuella, on_delete=models.CASCADE, related_name='tramos')
+    inicio = models.BigIntegerField(help_text="Byte inicial del tramo")
+    fin = models.BigIntegerField(help_text="Byte final del tramo (excluido)")
+    primera_linea = models.IntegerField(help_text="Número de línea del primer registro del tramo")
+
+    # Punto de control: se actualiza en la misma transacción que cada lote
+    posicion = models.BigIntegerField(help_text="Byte siguiente al último lote confirmado")
+    linea = models.IntegerField(help_text="Número de la siguiente línea a procesar")
+    procesadas = models.IntegerField(default=0)
+    creadas = models.IntegerField(default=0)
+    actualizadas = models.IntegerField(default=0)
+    sin_cambios = models.IntegerField(default=0)
+    duplicadas = models.IntegerField(default=0)
+    lotes = models.IntegerField(default=0)
+    errores = models.IntegerField(default=0)
+    detalle_errores = models.JSONField(default=list, blank=True)
+    completado = models.BooleanField(default=False)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['importacion', 'inicio']
+        verbose_name = 'Tramo de Importación'
+        verbose_name_plural = 'Tramos de Importación'
+
+    def __str__(self):
+        return f"Tramo {self.inicio}-{self.fin} de la importación {self.importacion_id}"
+
+    def punto_control(self):
+        """Estado guardado en el formato que espera importador.importar_rango."""
+        campos = ['posicion', 'linea', 'procesadas', 'creadas', 'actualizadas', 'sin_cambios',
+                  'duplicadas', 'lotes', 'errores', 'detalle_errores', 'completado']
+        return {campo: getattr(self, campo) for campo in campos}
+
+
+class IncidenciaImportacion(models.Model):
+    """
+    Línea del fichero original que la normalización no pudo cargar.
+    Guarda la línea completa para poder aplicarle después la corrección
+    (aplicar_correcciones) sin volver a leer el fichero.
+    """
+    importacion = models.ForeignKey(ImportacionHuella, on_delete=models.CASCADE, related_name='incidencias')
+    num_linea = models.IntegerField(help_text="Número de línea en el fichero original")
+    campo = models.CharField(max_length=50, help_text="Campo con el error ('linea' si es de formato)")
+    valor = models.TextField(blank=True, help_text="Valor que produjo la incidencia")
+    motivo = models.TextField()
+    sugerencias = models.JSONField(default=list, blank=True)
+    linea = models.TextField(help_text="Línea original completa")
+    correccion = models.TextField(null=True, blank=True, help_text="Corrección recibida pendiente de validar")
+
+    class Meta:
+        ordering = ['importacion', 'num_linea']
+        verbose_name = 'Incidencia de Importación'
+        verbose_name_plural = 'Incidencias de Importación'
+        constraints = [
+            models.UniqueConstraint(fields=['importacion', 'num_linea'], name='incidencia_importacion_linea_unica'),
+        ]
+
+    def __str__(self):
+        return f"Línea {self.num_linea} de la importación {self.importacion_id}: {self.motivo}"
+
+
+# ==========================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ==========================================
+
+class ExportacionHuella(models.Model):
+    """
+    Exportación de huellas que genera un worker de Celery (tarea
+    generar_exportacion) en un fichero comprimido con gzip. La `firma`
+    identifica el formato, los filtros normalizados y la versión de la
+    huella: una petición del mismo usuario con la misma firma dentro de
+    HUELLA_EXPORTACION_TTL reutiliza esta exportación.
+    """
+    ESTADOS = ImportacionHuella.ESTADOS
+    FORMATOS = (
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON (un objeto JSON por línea)'),
+    )
+
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='exportaciones')
+    formato = models.CharField(max_length=10, choices=FORMATOS, default='csv')
+    filtros = models.JSONField(default=dict, blank=True, help_text="Filtros normalizados de la exportación")
+    firma = models.CharField(max_length=32, db_index=True, help_text="Hash de formato y filtros")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    tarea_id = models.CharField(max_length=255, blank=True, help_text="ID de la tarea Celery que genera el fichero")
+    fichero = models.FileField(upload_to='exportaciones/', null=True, blank=True)
+    filas = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Exportación de Huella'
+        verbose_name_plural = 'Exportaciones de Huella'
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Exportación {self.id} ({self.formato}) - {self.estado}"
+
+
 # ==========================================
 # NORMALIZACIÓN: TABLAS MAESTRAS (INE)
 # ==========================================
 
-class IneMunicipio(models.Model):
+class IneMunicipio(ValoresCargadosMixin, models.Model):
     """
     Corresponde al fichero YYcodmunXX.csv
     Estructura: CPRO, CMUN, DC, NOMBRE
@@ -348,7 +688,7 @@ class IneMunicipio(models.Model):
         return f"{self.nombre_oficial} ({self.cod_provincia}-{self.cod_municipio})"
 
 
-class InePoblacion(models.Model):
+class InePoblacion(ValoresCargadosMixin, models.Model):
     """
     Corresponde al fichero ProvinciaXX.csv
     Estructura: Provincia, Municipio, Unidad Poblacional, Nombre...
@@ -371,7 +711,7 @@ class InePoblacion(models.Model):
         return f"{self.nombre} ({self.unidad_poblacional})"
 
 
-class MenuConfig(models.Model):
+class MenuConfig(ValoresCargadosMixin, models.Model):
     """
     Configuración de menú según roles/grupos de usuarios.
     Define qué opciones del menú se muestran según el rol del usuario.
@@ -407,7 +747,8 @@ class AuditLog(models.Model):
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     model_name = models.CharField(max_length=100)
     instance_id = models.IntegerField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default en lugar de auto_now_add: la escritura diferida conserva la hora del cambio
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     changes = models.JSONField(null=True, blank=True, help_text="JSON con los cambios realizados")
 
     class Meta:
@@ -1,35 +1,477 @@
 # Programa: Weblla
-# Veersion: 1.0
+# Veersion: 2.0
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
+# Última Modificación: 17-10-2026
+# Cambio realizado: incidencias guardadas en IncidenciaImportacion y
+# aplicación masiva de correcciones desde una tarea Celery.
 # Descripción:
 # Módulo de normalización de archivos de huella de comunicaciones.
+# Lee fichero_original fila a fila, comprueba provincia y población contra
+# IneMunicipio / InePoblacion (cargadas una sola vez en memoria) y escribe
+# fichero_normalizado y fichero_errores de forma incremental.
+# Las líneas con incidencias se guardan en IncidenciaImportacion para poder
+# aplicarles las correcciones del usuario (aplicar_correcciones).
 
-from .models import ImportacionHuella
+import csv
+import io
+import os
+import re
+import tempfile
+import unicodedata
+from functools import lru_cache
 
-def normalizar_archivo(importacion_id):
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import F
+
+from .importador import COLUMNAS_CABECERAS, FilaInvalida, UpsertHuellas, parsear_fila
+from .models import ImportacionHuella, IncidenciaImportacion, IneMunicipio, InePoblacion
+from .sugerencias import IndiceTrigramas
+
+# Incidencias que se escriben / consultan en cada sentencia
+TAMANO_LOTE_INCIDENCIAS = 1000
+# Tabla temporal (de cada conexión) a la que se copian las correcciones recibidas
+TABLA_CORRECCIONES = 'huella_correcciones_importacion'
+
+# Provincias por código INE (dos primeras cifras del código postal).
+# El primer nombre es la forma canónica; el resto son variantes aceptadas.
+PROVINCIAS = {
+    '01': ['ARABA/ÁLAVA', 'ÁLAVA', 'ARABA'],
+    '02': ['ALBACETE'],
+    '03': ['ALICANTE', 'ALACANT', 'ALICANTE/ALACANT'],
+    '04': ['ALMERÍA'],
+    '05': ['ÁVILA'],
+    '06': ['BADAJOZ'],
+    '07': ['ILLES BALEARS', 'BALEARES', 'ISLAS BALEARES'],
+    '08': ['BARCELONA'],
+    '09': ['BURGOS'],
+    '10': ['CÁCERES'],
+    '11': ['CÁDIZ'],
+    '12': ['CASTELLÓN', 'CASTELLÓ', 'CASTELLÓN/CASTELLÓ'],
+    '13': ['CIUDAD REAL'],
+    '14': ['CÓRDOBA'],
+    '15': ['A CORUÑA', 'LA CORUÑA', 'CORUÑA'],
+    '16': ['CUENCA'],
+    '17': ['GIRONA', 'GERONA'],
+    '18': ['GRANADA'],
+    '19': ['GUADALAJARA'],
+    '20': ['GIPUZKOA', 'GUIPÚZCOA'],
+    '21': ['HUELVA'],
+    '22': ['HUESCA'],
+    '23': ['JAÉN'],
+    '24': ['LEÓN'],
+    '25': ['LLEIDA', 'LÉRIDA'],
+    '26': ['LA RIOJA', 'RIOJA'],
+    '27': ['LUGO'],
+    '28': ['MADRID'],
+    '29': ['MÁLAGA'],
+    '30': ['MURCIA'],
+    '31': ['NAVARRA', 'NAFARROA'],
+    '32': ['OURENSE', 'ORENSE'],
+    '33': ['ASTURIAS'],
+    '34': ['PALENCIA'],
+    '35': ['LAS PALMAS', 'PALMAS'],
+    '36': ['PONTEVEDRA'],
+    '37': ['SALAMANCA'],
+    '38': ['SANTA CRUZ DE TENERIFE', 'TENERIFE'],
+    '39': ['CANTABRIA'],
+    '40': ['SEGOVIA'],
+    '41': ['SEVILLA'],
+    '42': ['SORIA'],
+    '43': ['TARRAGONA'],
+    '44': ['TERUEL'],
+    '45': ['TOLEDO'],
+    '46': ['VALENCIA', 'VALÈNCIA'],
+    '47': ['VALLADOLID'],
+    '48': ['BIZKAIA', 'VIZCAYA'],
+    '49': ['ZAMORA'],
+    '50': ['ZARAGOZA'],
+    '51': ['CEUTA'],
+    '52': ['MELILLA'],
+}
+
+# Artículos que el INE pospone en los nombres oficiales ("Coruña, A")
+ARTICULOS = {'A', 'O', 'AS', 'OS', 'EL', 'LA', 'LOS', 'LAS', 'L\'', 'ELS', 'ES', 'SA', 'SES', 'LES', 'LO'}
+
+
+@lru_cache(maxsize=65536)
+def normalizar_texto(texto):
+    """Mayúsculas, sin tildes ni signos de puntuación y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', texto.upper())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'[^A-Z0-9]+', ' ', texto).strip()
+
+
+def variantes_nombre(nombre):
+    """
+    Formas en las que puede aparecer un nombre oficial del INE, ya en
+    mayúsculas: "Coruña, A" → "A CORUÑA"; "Alicante/Alacant" → cada idioma.
+    """
+    variantes = []
+    for parte in nombre.split('/'):
+        parte = parte.strip().upper()
+        if not parte:
+            continue
+        if ', ' in parte:
+            base, articulo = parte.rsplit(', ', 1)
+            if articulo in ARTICULOS:
+                separador = '' if articulo.endswith('\'') else ' '
+                parte = f'{articulo}{separador}{base}'
+        variantes.append(parte)
+    return variantes
+
+
+class IndiceINE:
+    """
+    Índices en memoria de las tablas maestras del INE.
+
+    Se cargan con una consulta por tabla al empezar la normalización y se
+    consultan con búsquedas en diccionario, sin acceder a la base de datos
+    por cada fila. El índice de trigramas de cada provincia para sugerir
+    nombres se construye la primera vez que hace falta.
+    """
+
+    def __init__(self):
+        # código provincia -> {nombre normalizado: nombre canónico}
+        self.provincias = {}
+        self.poblaciones = {}
+        self._trigramas = {}
+        self._sugerencias = {}
+        for codigo, nombres in PROVINCIAS.items():
+            self.provincias[codigo] = {normalizar_texto(n): nombres[0] for n in nombres}
+
+    @classmethod
+    def cargar(cls):
+        indice = cls()
+        for cod_provincia, nombre in IneMunicipio.objects.values_list('cod_provincia', 'nombre_oficial').iterator():
+            indice._agregar_poblacion(cod_provincia, nombre)
+        for provincia_id, nombre in InePoblacion.objects.values_list('provincia_id', 'nombre').iterator():
+            indice._agregar_poblacion(provincia_id, nombre)
+        return indice
+
+    def _agregar_poblacion(self, cod_provincia, nombre):
+        nombres = self.poblaciones.setdefault(cod_provincia.zfill(2), {})
+        for variante in variantes_nombre(nombre):
+            nombres.setdefault(normalizar_texto(variante), variante)
+
+    def provincia(self, codigo, nombre):
+        """Nombre canónico de la provincia o None si no corresponde al código."""
+        return self.provincias.get(codigo, {}).get(normalizar_texto(nombre))
+
+    def tiene_poblaciones(self, codigo):
+        """Indica si hay datos del INE cargados para la provincia."""
+        return codigo in self.poblaciones
+
+    def poblacion(self, codigo, nombre):
+        """Nombre canónico de la población o None si no existe en la provincia."""
+        return self.poblaciones.get(codigo, {}).get(normalizar_texto(nombre))
+
+    def sugerir_poblacion(self, codigo, nombre):
+        """Poblaciones de la provincia con nombre parecido, de más a menos similar."""
+        clave = (codigo, normalizar_texto(nombre))
+        if clave not in self._sugerencias:
+            if codigo not in self._trigramas:
+                self._trigramas[codigo] = IndiceTrigramas(self.poblaciones.get(codigo, {}))
+            self._sugerencias[clave] = self._trigramas[codigo].buscar(clave[1])
+        return self._sugerencias[clave]
+
+
+class Incidencia(Exception):
+    """Error de normalización de una fila: campo, valor original, motivo y sugerencias."""
+
+    def __init__(self, campo, valor, motivo, sugerencias=()):
+        self.campo = campo
+        self.valor = valor
+        self.motivo = motivo
+        self.sugerencias = list(sugerencias)
+        super().__init__(motivo)
+
+
+def normalizar_fila(row, indice):
     """
-    ESTE ES EL ENCHUFE.
-    Aquí pegaremos el código de normalizción que ya está en uso.
-    Por ahora, simulamos que todo sale bien.
+    Valida una fila del fichero y devuelve (row_normalizada, cambiada).
+    Lanza Incidencia si la fila no puede normalizarse.
+    """
+    try:
+        datos = parsear_fila(row)
+    except FilaInvalida as e:
+        if e.campo:
+            raise Incidencia(e.campo, row[COLUMNAS_CABECERAS.index(e.campo)], str(e))
+        raise Incidencia('linea', ';'.join(row), str(e))
+
+    codigo = datos['codigopostal'].strip()[:2]
+    if codigo not in indice.provincias:
+        raise Incidencia('codigopostal', datos['codigopostal'], f'código postal {datos["codigopostal"]} no válido')
+
+    provincia = indice.provincia(codigo, datos['provincia'])
+    if provincia is None:
+        raise Incidencia(
+            'provincia', datos['provincia'],
+            f'provincia {datos["provincia"]} no corresponde al código postal {datos["codigopostal"]}',
+            [PROVINCIAS[codigo][0]],
+        )
+
+    poblacion = datos['poblacion']
+    if indice.tiene_poblaciones(codigo):
+        poblacion = indice.poblacion(codigo, datos['poblacion'])
+        if poblacion is None:
+            raise Incidencia(
+                'poblacion', datos['poblacion'],
+                f'población {datos["poblacion"]} no existe en el INE para {provincia}',
+                indice.sugerir_poblacion(codigo, datos['poblacion']),
+            )
+
+    row = list(row)
+    cambiada = row[2] != provincia or row[3] != poblacion
+    row[2] = provincia
+    row[3] = poblacion
+    return row, cambiada
+
+
+def _limpiar(valor):
+    """Evita que un valor rompa el formato de fichero_errores (separado por |)."""
+    return str(valor).replace('|', '/').replace('\n', ' ').replace('\r', ' ')
+
+
+def _linea_errores(num_linea, valor, motivo, sugerencias):
+    """Línea de fichero_errores: numLinea|valor original|motivo|sugerencias|"""
+    sugerencias = ','.join(_limpiar(n).replace(',', ' ') for n in sugerencias)
+    return f'{num_linea}|{_limpiar(valor)}|{_limpiar(motivo)}|{sugerencias}|\n'
+
+
+def _linea_csv(row, delimiter):
+    """Fila del CSV otra vez como texto, con el entrecomillado que necesite."""
+    salida = io.StringIO()
+    csv.writer(salida, delimiter=delimiter, lineterminator='').writerow(row)
+    return salida.getvalue()
+
+
+def normalizar_archivo(importacion_id, delimiter=';'):
+    """
+    Normaliza el fichero original de una importación.
+
+    Escribe fichero_normalizado con las filas válidas (provincia y población
+    en su forma canónica) y fichero_errores con una línea por incidencia:
+        numLinea|valor original|motivo|sugerencias|
+    Devuelve un diccionario con los contadores de la normalización.
     """
     print(f"--- Iniciando normalización para la importación {importacion_id} ---")
-    
+
+    importacion = ImportacionHuella.objects.get(id=importacion_id)
+    importacion.incidencias.all().delete()
+    indice = IndiceINE.cargar()
+    resumen = {'lineas': 0, 'validas': 0, 'normalizadas': 0, 'errores': 0}
+    incidencias = []
+
+    salida = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.csv', delete=False)
+    errores = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.txt', delete=False)
     try:
-        # Recuperamos la importación de la base de datos
-        importacion = ImportacionHuella.objects.get(id=importacion_id)
-        
-
-        
-        # Simulamos que ha terminado bien
-        importacion.log_proceso = "Script pendiente de integración. Simulación exitosa."
-        importacion.estado = 'COMPLETADO' 
-        importacion.save()
-        
-        print(f"--- Fin de la simulación ---")
-
-    except Exception as e:
-        print(f"Error: {e}")
-        # Si fallara, actualizamos el estado
-        # importacion.estado = 'ERROR'
-        # importacion.save()
\ No newline at end of file
+        with salida, errores, importacion.fichero_original.open('rb') as binario:
+            reader = csv.reader(io.TextIOWrapper(binario, encoding='utf-8', newline=''), delimiter=delimiter)
+            writer = csv.writer(salida, delimiter=delimiter, lineterminator='\n')
+
+            for num_linea, row in enumerate(reader, 1):
+                resumen['lineas'] += 1
+                try:
+                    row, cambiada = normalizar_fila(row, indice)
+                except Incidencia as e:
+                    resumen['errores'] += 1
+                    errores.write(_linea_errores(num_linea, e.valor, e.motivo, e.sugerencias))
+                    incidencias.append(IncidenciaImportacion(
+                        importacion=importacion, num_linea=num_linea, campo=e.campo, valor=e.valor,
+                        motivo=e.motivo, sugerencias=e.sugerencias, linea=_linea_csv(row, delimiter),
+                    ))
+                    if len(incidencias) >= TAMANO_LOTE_INCIDENCIAS:
+                        IncidenciaImportacion.objects.bulk_create(incidencias)
+                        incidencias = []
+                    continue
+                resumen['validas'] += 1
+                resumen['normalizadas'] += cambiada
+                writer.writerow(row)
+            IncidenciaImportacion.objects.bulk_create(incidencias)
+
+        with open(salida.name, 'rb') as f:
+            importacion.fichero_normalizado.save(f'normalizado_{importacion.id}.csv', File(f), save=False)
+        if resumen['errores']:
+            with open(errores.name, 'rb') as f:
+                importacion.fichero_errores.save(f'errores_{importacion.id}.txt', File(f), save=False)
+        else:
+            importacion.fichero_errores = None
+    finally:
+        os.remove(salida.name)
+        os.remove(errores.name)
+
+    importacion.lineas_incidencias = resumen['errores']
+    importacion.lineas_error = resumen['errores']
+    importacion.log_proceso = (
+        f"[NORMALIZACIÓN] {resumen['lineas']} líneas: {resumen['validas']} válidas "
+        f"({resumen['normalizadas']} normalizadas), {resumen['errores']} con incidencias"
+    )
+    importacion.save(update_fields=['fichero_normalizado', 'fichero_errores', 'lineas_incidencias',
+                                    'lineas_error', 'log_proceso'])
+
+    print(f"--- Fin de la normalización ---")
+    return resumen
+
+
+def _escribir_fichero_errores(importacion):
+    """Regenera fichero_errores con las incidencias que siguen pendientes (sin guardar)."""
+    errores = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.txt', delete=False)
+    try:
+        with errores:
+            pendientes = importacion.incidencias.order_by('num_linea').values_list(
+                'num_linea', 'valor', 'motivo', 'sugerencias'
+            )
+            hay_pendientes = False
+            for num_linea, valor, motivo, sugerencias in pendientes.iterator(chunk_size=TAMANO_LOTE_INCIDENCIAS):
+                errores.write(_linea_errores(num_linea, valor, motivo, sugerencias))
+                hay_pendientes = True
+        if importacion.fichero_errores:
+            importacion.fichero_errores.delete(save=False)
+        if hay_pendientes:
+            with open(errores.name, 'rb') as f:
+                importacion.fichero_errores.save(f'errores_{importacion.id}.txt', File(f), save=False)
+        else:
+            importacion.fichero_errores = None
+    finally:
+        os.remove(errores.name)
+
+
+def _aplicar_correccion(incidencia, valor, delimiter):
+    """Fila original de la incidencia con el valor corregido en su campo."""
+    if incidencia.campo == 'linea':
+        # Error de formato: la corrección es la línea completa
+        return next(csv.reader([valor], delimiter=delimiter), [])
+    row = next(csv.reader([incidencia.linea], delimiter=delimiter), [])
+    posicion = COLUMNAS_CABECERAS.index(incidencia.campo)
+    row += [''] * (posicion + 1 - len(row))
+    row[posicion] = valor
+    return row
+
+
+def _cargar_correcciones(importacion, lineas):
+    """
+    Copia (COPY) las correcciones numLinea|valor a una tabla temporal y las
+    apunta en la incidencia de su línea (campo correccion) con una única
+    sentencia. Si una línea se corrige varias veces gana la última.
+    Devuelve (correcciones recibidas, líneas corregidas, líneas con incidencia).
+    """
+    recibidas = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE {TABLA_CORRECCIONES} '
+            f'(orden bigint GENERATED ALWAYS AS IDENTITY, num_linea integer NOT NULL, valor text NOT NULL)'
+        )
+        with cursor.copy(f'COPY {TABLA_CORRECCIONES} (num_linea, valor) FROM STDIN') as copy:
+            for linea in lineas:
+                num_linea, separador, valor = linea.rstrip('\r\n').partition('|')
+                if not separador or not num_linea.strip().isdigit():
+                    continue
+                recibidas += 1
+                copy.write_row((int(num_linea), valor.strip()))
+        cursor.execute(f'SELECT count(DISTINCT num_linea) FROM {TABLA_CORRECCIONES}')
+        corregidas = cursor.fetchone()[0]
+        cursor.execute(
+            f'UPDATE {IncidenciaImportacion._meta.db_table} i SET correccion = c.valor '
+            f'FROM (SELECT DISTINCT ON (num_linea) num_linea, valor FROM {TABLA_CORRECCIONES} '
+            f'ORDER BY num_linea, orden DESC) c '
+            f'WHERE i.importacion_id = %s AND i.num_linea = c.num_linea',
+            [importacion.id],
+        )
+        con_incidencia = cursor.rowcount
+        cursor.execute(f'DROP TABLE {TABLA_CORRECCIONES}')
+    return recibidas, corregidas, con_incidencia
+
+
+def aplicar_correcciones(importacion, delimiter=';', usuario_id=None):
+    """
+    Aplica a una importación las correcciones del usuario guardadas en
+    fichero_correcciones, una por línea en formato numLinea|valor. La llama
+    la tarea aplicar_correcciones_importacion.
+
+    Las correcciones se cargan primero en sus incidencias (_cargar_correcciones)
+    y el fichero se borra. Después solo se vuelven a validar las líneas
+    corregidas, por lotes de TAMANO_LOTE_INCIDENCIAS en orden de línea, cada
+    lote en su propia transacción: las que quedan bien se cargan en Huella
+    (UpsertHuellas) y se borra su incidencia; las que siguen mal actualizan
+    la suya con el nuevo motivo. Si la tarea se corta, las incidencias que
+    aún tienen corrección se aplican al volver a ejecutarla.
+    """
+    recibidas = corregidas = con_incidencia = 0
+    if importacion.fichero_correcciones:
+        with importacion.fichero_correcciones.open('rb') as fichero:
+            lineas = (linea.decode('utf-8-sig') for linea in fichero)
+            recibidas, corregidas, con_incidencia = _cargar_correcciones(importacion, lineas)
+        importacion.fichero_correcciones.delete(save=False)
+        importacion.save(update_fields=['fichero_correcciones'])
+
+    indice = IndiceINE.cargar()
+    upsert = UpsertHuellas(
+        usuario_id=usuario_id,
+        contexto_auditoria={'importacion': importacion.id, 'origen': 'correcciones'},
+    )
+    pendientes_de_aplicar = importacion.incidencias.filter(correccion__isnull=False).order_by('num_linea')
+    aplicadas = pendientes = 0
+    ultima = 0
+    while True:
+        bloque = list(pendientes_de_aplicar.filter(num_linea__gt=ultima)[:TAMANO_LOTE_INCIDENCIAS])
+        if not bloque:
+            break
+        ultima = bloque[-1].num_linea
+        antes = upsert.resumen()
+        resueltas = []
+        siguen = []
+        with transaction.atomic():
+            for incidencia in bloque:
+                row = _aplicar_correccion(incidencia, incidencia.correccion, delimiter)
+                incidencia.correccion = None
+                try:
+                    row, _ = normalizar_fila(row, indice)
+                except Incidencia as e:
+                    incidencia.campo = e.campo
+                    incidencia.valor = e.valor
+                    incidencia.motivo = e.motivo
+                    incidencia.sugerencias = e.sugerencias
+                    incidencia.linea = _linea_csv(row, delimiter)
+                    siguen.append(incidencia)
+                    continue
+                upsert.agregar(parsear_fila(row))
+                resueltas.append(incidencia.id)
+            upsert.volcar()
+            lote = {clave: valor - antes[clave] for clave, valor in upsert.resumen().items()}
+
+            IncidenciaImportacion.objects.filter(id__in=resueltas).delete()
+            IncidenciaImportacion.objects.bulk_update(
+                siguen, ['campo', 'valor', 'motivo', 'sugerencias', 'linea', 'correccion'],
+            )
+            ImportacionHuella.objects.filter(id=importacion.id).update(
+                lineas_incidencias=F('lineas_incidencias') - len(resueltas),
+                lineas_error=F('lineas_error') - len(resueltas),
+                lineas_creadas=F('lineas_creadas') + lote['creadas'],
+                lineas_actualizadas=F('lineas_actualizadas') + lote['actualizadas'],
+                lineas_sin_cambios=F('lineas_sin_cambios') + lote['sin_cambios'] + lote['duplicadas'],
+            )
+        aplicadas += len(resueltas)
+        pendientes += len(siguen)
+
+    resumen_carga = upsert.resumen()
+    resumen = {
+        'recibidas': recibidas,
+        'aplicadas': aplicadas,
+        'pendientes': pendientes,
+        'sin_incidencia': corregidas - con_incidencia,
+        'creadas': resumen_carga['creadas'],
+        'actualizadas': resumen_carga['actualizadas'],
+        'sin_cambios': resumen_carga['sin_cambios'] + resumen_carga['duplicadas'],
+    }
+
+    importacion.refresh_from_db()
+    _escribir_fichero_errores(importacion)
+    importacion.log_proceso += (
+        f"\n[CORRECCIONES] {resumen['recibidas']} recibidas: {resumen['aplicadas']} aplicadas "
+        f"({resumen['creadas']} creadas, {resumen['actualizadas']} actualizadas), "
+        f"{resumen['pendientes']} siguen con incidencias, {resumen['sin_incidencia']} sin incidencia"
+    )
+    importacion.save(update_fields=['fichero_errores', 'log_proceso'])
+    return resumen
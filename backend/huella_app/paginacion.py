@@ -0,0 +1,291 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Paginaciones de los listados de huellas. La paginación por número de página
+# es la habitual; la paginación por cursor (keyset sobre (created, id)) evita
+# el OFFSET y el COUNT(*) en tablas grandes, y puede devolver un total
+# aproximado sacado de las estimaciones del planificador de PostgreSQL.
+# La paginación con conteo estimado usa esa estimación cuando supera un umbral
+# y, por debajo, guarda en caché el COUNT(*) exacto de cada filtro.
+
+import binascii
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimar_total(queryset):
+    """
+    Número de filas estimado por PostgreSQL para `queryset`, sin recorrerlo.
+    Sin filtros se usa pg_class.reltuples; con filtros, la estimación de
+    EXPLAIN. Devuelve None si no hay estimación disponible.
+    """
+    if not queryset.query.where:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            fila = cursor.fetchone()
+        # reltuples vale -1 si la tabla no se ha analizado nunca
+        if fila and fila[0] >= 0:
+            return fila[0]
+
+    try:
+        queryset.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        # Filtro que no puede devolver filas (p. ej. pk__in=[]): no hay plan
+        return 0
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    filas = plan[0]['Plan'].get('Plan Rows')
+    return int(filas) if filas is not None else None
+
+
+def contar(queryset):
+    """
+    Devuelve (total, aproximado) para `queryset`. Si el planificador estima
+    al menos HUELLA_CONTEO_UMBRAL_ESTIMADO filas se devuelve la estimación;
+    si no, el COUNT(*) exacto, guardado en caché HUELLA_CONTEO_CACHE_TTL
+    segundos con la consulta SQL (filtros y parámetros) como clave.
+    """
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return 0, False
+
+    estimado = estimar_total(queryset)
+    if estimado is not None and estimado >= settings.HUELLA_CONTEO_UMBRAL_ESTIMADO:
+        return estimado, True
+
+    firma = hashlib.md5(f'{queryset.db}|{sql}|{params!r}'.encode('utf-8')).hexdigest()
+    clave = f'huella:conteo:{firma}'
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, settings.HUELLA_CONTEO_CACHE_TTL)
+    return total, False
+
+
+class PaginaEstimada(Page):
+    """Página de un total estimado: sabe si hay siguiente sin fiarse del total."""
+
+    def __init__(self, object_list, number, paginator, hay_siguiente):
+        super().__init__(object_list, number, paginator)
+        self.hay_siguiente = hay_siguiente
+
+    def has_next(self):
+        return self.hay_siguiente
+
+
+class PaginadorConteoEstimado(Paginator):
+    """Paginator de Django cuyo total sale de contar()."""
+
+    @cached_property
+    def _conteo(self):
+        return contar(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self._conteo[0]
+
+    @property
+    def aproximado(self):
+        return self._conteo[1]
+
+    def validate_number(self, number):
+        if not self.aproximado:
+            return super().validate_number(number)
+        # Con un total estimado no se puede saber cuál es la última página
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Esa página no es un número entero')
+        if number < 1:
+            raise EmptyPage('Esa página es menor que 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.aproximado:
+            return super().page(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not filas and number > 1:
+            raise EmptyPage('Esa página no contiene resultados')
+        return PaginaEstimada(filas[:self.per_page], number, self, len(filas) > self.per_page)
+
+
+class HuellaPagination(PageNumberPagination):
+    """Paginación personalizada para listados de huellas."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class HuellaConteoEstimadoPagination(HuellaPagination):
+    """
+    Paginación por número de página para tablas grandes: `count` es la
+    estimación del planificador cuando pasa del umbral (con
+    `count_aproximado: true`) y, si no, el conteo exacto cacheado.
+    """
+    django_paginator_class = PaginadorConteoEstimado
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_aproximado', self.page.paginator.aproximado),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        esquema = super().get_paginated_response_schema(schema)
+        esquema['properties']['count_aproximado'] = {'type': 'boolean', 'example': False}
+        return esquema
+
+
+class HuellaCursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) para listados de huellas.
+
+    Ordena siempre por (-created, -id), que es único y está indexado, y cada
+    página se pide con una comparación de fila sobre esa pareja: es un rango
+    del índice tanto en la primera página como en la 2.000, y aunque miles de
+    filas de una misma importación compartan `created`.
+    No calcula el total; con ?total=aproximado se añade `count` estimado por
+    el planificador y `count_aproximado: true`.
+
+    Solo sirve para listados en ese orden: si la consulta ya viene ordenada
+    de otra forma (?ordering por otro campo, la distancia de por_radio)
+    responde 400 en vez de cambiar el orden sin avisar. ?search con cursor
+    no ordena por relevancia (ver BusquedaTextoFilter).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    mensaje_cursor_invalido = 'Cursor no válido'
+    mensaje_orden_incompatible = (
+        'La paginación por cursor solo admite el orden por defecto (-created); '
+        'quita ?paginacion=cursor o pide ?ordering=-created'
+    )
+    # Órdenes de la consulta que coinciden con el del cursor (vacío: el del modelo)
+    ORDENES_COMPATIBLES = {(), ('-created',), ('-created', '-id')}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if tuple(queryset.query.order_by) not in self.ORDENES_COMPATIBLES:
+            raise ParseError(self.mensaje_orden_incompatible)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        tamano = self.get_page_size(request)
+        hacia_atras, posicion = self.decodificar_cursor(request)
+
+        # El total es el del listado completo, no lo que queda tras el cursor
+        self.total = None
+        if request.query_params.get('total') == 'aproximado':
+            self.total = estimar_total(queryset)
+
+        tabla = queryset.model._meta.db_table
+        if hacia_atras:
+            queryset = queryset.order_by('created', 'id')
+            comparacion = '>'
+        else:
+            queryset = queryset.order_by('-created', '-id')
+            comparacion = '<'
+        if posicion is not None:
+            queryset = queryset.extra(
+                where=[f'("{tabla}"."created", "{tabla}"."id") {comparacion} (%s, %s)'],
+                params=list(posicion),
+            )
+
+        pagina = list(queryset[:tamano + 1])
+        hay_mas = len(pagina) > tamano
+        pagina = pagina[:tamano]
+        if hacia_atras:
+            pagina.reverse()
+            self.hay_anterior, self.hay_siguiente = hay_mas, posicion is not None
+        else:
+            self.hay_anterior, self.hay_siguiente = posicion is not None, hay_mas
+        self.pagina = pagina
+        return pagina
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(tamano, 1), self.max_page_size)
+
+    def decodificar_cursor(self, request):
+        """Devuelve (hacia_atras, (created, id) | None) a partir de ?cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            datos = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            creado = parse_datetime(datos['c'])
+            if creado is None:
+                raise ValueError(datos['c'])
+            return bool(datos.get('r')), (creado, int(datos['i']))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.mensaje_cursor_invalido)
+
+    def codificar_cursor(self, huella, hacia_atras):
+        datos = {'c': huella.created.isoformat(), 'i': huella.id}
+        if hacia_atras:
+            datos['r'] = 1
+        cursor = urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.hay_siguiente or not self.pagina:
+            return None
+        return self.codificar_cursor(self.pagina[-1], hacia_atras=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if not self.pagina:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.codificar_cursor(self.pagina[0], hacia_atras=True)
+
+    def get_paginated_response(self, data):
+        respuesta = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total is not None:
+            respuesta['count'] = self.total
+            respuesta['count_aproximado'] = True
+        respuesta['results'] = data
+        return Response(respuesta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'example': 123},
+                'count_aproximado': {'type': 'boolean', 'example': True},
+                'results': schema,
+            },
+        }
@@ -2,14 +2,16 @@
 # Veersion: 1.1
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
-# Última Modificación: 02-02-2026
-# Cambio realizado: Añadido serializador para gestión de usuarios.
+# Última Modificación: 17-10-2026
+# Cambio realizado: ExportacionHuellaSerializer para las exportaciones en segundo plano.
 # Descripción:
 # Serializadores para la aplicación Huella.
 
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
-from .models import Huella, ImportacionHuella, UserProfile, MenuConfig, AuditLog
+from django.urls import reverse
+from .exportacion import FILTROS_EXPORTACION
+from .models import Huella, ImportacionHuella, ExportacionHuella, UserProfile, MenuConfig, AuditLog
 
 # =======================================================
 # TUS SERIALIZADORES ORIGINALES (INTACTOS)
@@ -94,7 +96,47 @@ class ImportacionHuellaSerializer(serializers.ModelSerializer):
         model = ImportacionHuella
         fields = '__all__'
         # Estos campos no se pueden editar desde la API, los rellena el sistema
-        read_only_fields = ('usuario', 'estado', 'log_proceso', 'fichero_errores', 'fichero_normalizado')
+        read_only_fields = (
+            'usuario', 'estado', 'tarea_id', 'log_proceso', 'fichero_errores', 'fichero_normalizado',
+            'fichero_correcciones',
+            'lineas_procesadas', 'lineas_creadas', 'lineas_actualizadas', 'lineas_sin_cambios', 'lineas_error',
+            'lineas_incidencias',
+        )
+
+
+class ExportacionHuellaSerializer(serializers.ModelSerializer):
+    """
+    Exportación en segundo plano. Al crearla solo se indican el formato y los
+    filtros (claves de exportacion.FILTROS_EXPORTACION); el fichero se
+    descarga con la acción descargar cuando el estado es COMPLETADO.
+    """
+    usuario_nombre = serializers.ReadOnlyField(source='usuario.username')
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportacionHuella
+        fields = (
+            'id', 'usuario', 'usuario_nombre', 'formato', 'filtros', 'estado', 'tarea_id',
+            'filas', 'error', 'fecha_creacion', 'fecha_fin', 'url_descarga',
+        )
+        read_only_fields = ('usuario', 'estado', 'tarea_id', 'filas', 'error', 'fecha_creacion', 'fecha_fin')
+
+    def validate_filtros(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Los filtros deben ser un objeto JSON')
+        desconocidos = sorted(set(value) - set(FILTROS_EXPORTACION))
+        if desconocidos:
+            raise serializers.ValidationError(f"Filtros no admitidos: {', '.join(desconocidos)}")
+        if any(not isinstance(valor, (str, int)) for valor in value.values() if valor is not None):
+            raise serializers.ValidationError('Cada filtro debe ser un texto')
+        return value
+
+    def get_url_descarga(self, obj):
+        if obj.estado != 'COMPLETADO' or not obj.fichero:
+            return None
+        url = reverse('huella_app:exportacion-descargar', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 
 # =======================================================
@@ -2,14 +2,130 @@
 # Veersion: 1.0
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
+# Última Modificación: 17-10-2026
+# Cambio realizado: las escrituras en Huella y el fin de una importación invalidan la caché de respuestas.
 # Descripción:
 # Señales para auditar cambios en los modelos Huella, ImportacionHuella, IneMunicipio, InePoblacion y MenuConfig.
+# Uso del modo masivo (un bulk_create por lote en lugar de un INSERT por instancia):
+#   from huella_app.signals import auditoria_masiva
+#   with auditoria_masiva():
+#       ...
 
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from . import auditoria, cache_respuestas
 from .models import Huella, ImportacionHuella, IneMunicipio, InePoblacion, MenuConfig, AuditLog
 
+# Registros de auditoría que se escriben juntos en modo masivo
+TAMANO_LOTE_AUDITORIA = 1000
+
+# Campos que no se registran en las diferencias (automáticos o demasiado largos)
+CAMPOS_NO_AUDITADOS = {'created', 'updated', 'hash_contenido', 'busqueda', 'provincia_normalizada',
+                       'poblacion_normalizada', 'nombrevia_normalizada', 'numero_int', 'celda_geo',
+                       'log_proceso'}
+
+# Lote abierto por auditoria_masiva() en el contexto actual (None fuera de él)
+_lote_actual = contextvars.ContextVar('lote_auditoria', default=None)
+
+
+class _LoteAuditoria:
+    """Registros de auditoría pendientes de un bloque auditoria_masiva()."""
+
+    def __init__(self, tamano_lote):
+        self.tamano_lote = max(1, tamano_lote)
+        self.registros = []
+
+    def agregar(self, registro):
+        self.registros.append(registro)
+        if len(self.registros) >= self.tamano_lote:
+            self.volcar()
+
+    def volcar(self):
+        if self.registros:
+            AuditLog.objects.bulk_create(self.registros)
+            self.registros = []
+
+
+@contextmanager
+def auditoria_masiva(tamano_lote=TAMANO_LOTE_AUDITORIA):
+    """
+    Suspende el INSERT de AuditLog por instancia durante el bloque: las
+    señales acumulan los registros y se escriben con bulk_create cada
+    `tamano_lote` y al salir. Los bloques anidados usan el lote exterior.
+    """
+    if _lote_actual.get() is not None:
+        yield
+        return
+
+    lote = _LoteAuditoria(tamano_lote)
+    token = _lote_actual.set(lote)
+    try:
+        yield
+    finally:
+        _lote_actual.reset(token)
+        # Si la transacción va a deshacerse, los cambios auditados tampoco existen
+        if not transaction.get_connection().needs_rollback:
+            lote.volcar()
+
+
+def _registrar(registro):
+    lote = _lote_actual.get()
+    if lote is not None:
+        lote.agregar(registro)
+    elif settings.HUELLA_AUDITORIA_DIFERIDA:
+        # Fuera de la petición: lo escribe la tarea volcar_auditoria
+        auditoria.encolar(registro)
+    else:
+        registro.save()
+
+
+def _valor_cargado(valor):
+    """Valor tal como lo devuelve la base de datos (los ficheros, por su nombre)."""
+    return valor.name if isinstance(valor, FieldFile) else valor
+
+
+def _valor_json(valor):
+    if isinstance(valor, FieldFile):
+        return valor.name or None
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    try:
+        return DjangoJSONEncoder().default(valor)
+    except TypeError:
+        return str(valor)
+
+
+def _diferencias(instance, update_fields=None):
+    """
+    Campos que cambian respecto a los valores cargados de la base de datos
+    (ValoresCargadosMixin), como {campo: [antes, después]}. Después actualiza
+    los valores cargados para que el siguiente guardado compare con estos.
+    """
+    cargados = getattr(instance, '_valores_cargados', None)
+    if cargados is None:
+        return {}
+    cambios = {}
+    for campo in instance._meta.concrete_fields:
+        nombre = campo.attname
+        if nombre not in cargados or nombre in CAMPOS_NO_AUDITADOS:
+            continue
+        if update_fields is not None and campo.name not in update_fields:
+            continue
+        antes, despues = cargados[nombre], getattr(instance, nombre)
+        if antes != despues:
+            cambios[nombre] = [_valor_json(antes), _valor_json(despues)]
+        cargados[nombre] = _valor_cargado(despues)
+    return cambios
+
+
 def get_current_user():
     # Esto es un marcador de posición. En una aplicación real, obtendrías el usuario de la solicitud.
     # Para las señales, esto puede ser complicado. Un patrón común es almacenar el usuario en una variable local del hilo.
@@ -21,23 +137,28 @@ def get_current_user():
 @receiver(post_save, sender=IneMunicipio)
 @receiver(post_save, sender=InePoblacion)
 @receiver(post_save, sender=MenuConfig)
-def log_model_save(sender, instance, created, **kwargs):
+def log_model_save(sender, instance, created, update_fields=None, **kwargs):
     action = 'CREATED' if created else 'UPDATED'
     user = get_current_user() # Marcador de posición para obtener el usuario actual
 
     changes = {}
-    if not created:
-        # Para las actualizaciones, necesitaríamos comparar los datos antiguos con los nuevos.
-        # Este es un enfoque simplificado. Una solución más robusta implicaría obtener la instancia antigua.
-        pass # Por ahora, solo registraremos la acción sin cambios detallados para las actualizaciones
+    if created:
+        # A partir de aquí la instancia compara con lo que se acaba de insertar
+        instance._valores_cargados = {
+            campo.attname: _valor_cargado(getattr(instance, campo.attname))
+            for campo in instance._meta.concrete_fields
+        }
+    else:
+        # Diferencias con los valores cargados al leer la instancia, sin otra consulta
+        changes = _diferencias(instance, update_fields)
 
-    AuditLog.objects.create(
+    _registrar(AuditLog(
         user=user,
         action=action,
         model_name=sender.__name__,
         instance_id=instance.pk,
         changes=changes
-    )
+    ))
 
 @receiver(post_delete, sender=Huella)
 @receiver(post_delete, sender=ImportacionHuella)
@@ -47,10 +168,23 @@ def log_model_save(sender, instance, created, **kwargs):
 def log_model_delete(sender, instance, **kwargs):
     user = get_current_user() # Marcador de posición para obtener el usuario actual
 
-    AuditLog.objects.create(
+    _registrar(AuditLog(
         user=user,
         action='DELETED',
         model_name=sender.__name__,
         instance_id=instance.pk,
         changes={} # No se necesitan cambios para la eliminación
-    )
\ No newline at end of file
+    ))
+
+
+# Caché de respuestas de la API (cache_respuestas.py): cualquier escritura en
+# Huella o el final de una importación deja obsoletas las respuestas guardadas
+@receiver(post_save, sender=Huella)
+@receiver(post_delete, sender=Huella)
+def invalidar_cache_huella(sender, **kwargs):
+    cache_respuestas.invalidar()
+
+@receiver(post_save, sender=ImportacionHuella)
+def invalidar_cache_importacion(sender, instance, **kwargs):
+    if instance.estado in ('COMPLETADO', 'ERROR'):
+        cache_respuestas.invalidar()
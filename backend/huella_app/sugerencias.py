@@ -0,0 +1,79 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Índice de trigramas para sugerir nombres del INE parecidos a un valor mal
+# escrito. Se usa al escribir fichero_errores (columna de sugerencias).
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import chain
+
+# Puntuación mínima (coeficiente de Dice sobre trigramas) para sugerir un nombre
+UMBRAL_SIMILITUD = 0.4
+NUM_SUGERENCIAS = 5
+
+
+def trigramas(texto):
+    """Trigramas de un texto ya normalizado, con relleno al estilo pg_trgm."""
+    relleno = f'  {texto} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama → nombres.
+
+    Para cada consulta solo se recorren las listas de los trigramas que
+    contiene el texto buscado, no toda la tabla de nombres.
+
+    Uso:
+        indice = IndiceTrigramas({'FENE': 'FENE', 'FERROL': 'FERROL'})
+        indice.buscar('FEROL')  # ['FERROL', ...]
+    """
+
+    def __init__(self, nombres):
+        """`nombres` es un diccionario {nombre normalizado: nombre a sugerir}."""
+        self.nombres = []
+        self.tamanos = []
+        self.invertido = defaultdict(list)
+        for clave, nombre in nombres.items():
+            posicion = len(self.nombres)
+            self.nombres.append(nombre)
+            grupos = trigramas(clave)
+            self.tamanos.append(len(grupos))
+            for trigrama in grupos:
+                self.invertido[trigrama].append(posicion)
+
+    def buscar(self, texto, k=NUM_SUGERENCIAS, umbral=UMBRAL_SIMILITUD):
+        """
+        Devuelve hasta k nombres ordenados de más a menos parecido a `texto`,
+        que debe venir normalizado (normalization.normalizar_texto).
+        """
+        grupos = trigramas(texto)
+        if not grupos:
+            return []
+        # Counter sobre las listas encadenadas cuenta los trigramas compartidos
+        # con cada nombre sin bucles en Python por cada aparición
+        comunes = Counter(chain.from_iterable(
+            self.invertido.get(trigrama, ()) for trigrama in grupos
+        ))
+
+        # Con Dice >= umbral, un nombre necesita al menos este número de
+        # trigramas en común; el resto se descarta sin puntuar
+        total = len(grupos)
+        minimo = umbral * total / (2 - umbral)
+        puntuaciones = (
+            (2 * compartidos / (total + self.tamanos[posicion]), posicion)
+            for posicion, compartidos in comunes.items()
+            if compartidos >= minimo
+        )
+        mejores = heapq.nlargest(k, puntuaciones)
+        sugerencias = []
+        for puntuacion, posicion in mejores:
+            if puntuacion < umbral:
+                break
+            if self.nombres[posicion] not in sugerencias:
+                sugerencias.append(self.nombres[posicion])
+        return sugerencias
@@ -2,7 +2,9 @@
 # Veersion: 1.0
 # Autor: Equipo Weblla
 # Fecha: 30-01-2026
-# Última Modificación:
+# Última Modificación: 17-10-2026
+# Cambio realizado: aplicar_correcciones_importacion, correcciones de una
+# importación aplicadas en el worker.
 # Descripción: Ejemplos de tareas asíncronas con Celery
 # Tareas asíncronas para la aplicación Huella
 # Uso del código:
@@ -24,8 +26,28 @@
     # print(resultado.status)  # Estado: PENDING, STARTED, SUCCESS, FAILURE
     # print(resultado.get(timeout=30))  # Esperar resultado (bloquea)
 
-from celery import shared_task
+from celery import chord, shared_task
+from celery.signals import worker_shutdown
+from django.conf import settings
+from django.db import connection, InterfaceError, OperationalError
+from django.utils import timezone
+import logging
 import time
+from datetime import timedelta
+from . import auditoria, estadisticas, exportacion, mapa
+from .carga_copy import cargar_importacion
+from .importador import dividir_en_tramos, importar_rango
+from .models import ExportacionHuella, ImportacionHuella, TramoImportacion
+from .normalization import aplicar_correcciones, normalizar_archivo
+
+logger = logging.getLogger(__name__)
+
+# Errores que se copian al log_proceso al terminar una importación
+MAX_ERRORES_LOG = 200
+
+# Espacio de claves de los advisory locks de PostgreSQL que evitan que dos
+# workers procesen a la vez el mismo tramo
+CLAVE_BLOQUEO_TRAMOS = 4201
 
 
 @shared_task
@@ -37,6 +59,250 @@ def procesar_archivo(archivo_id):
     return f"Archivo {archivo_id} completado"
 
 
+def _marcar_error(importacion_id, mensaje):
+    importacion = ImportacionHuella.objects.get(id=importacion_id)
+    importacion.estado = 'ERROR'
+    importacion.log_proceso += f"\n[ERROR] {mensaje}"
+    importacion.save(update_fields=['estado', 'log_proceso'])
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def procesar_importacion(importacion_id):
+    """
+    Normaliza y carga el fichero de una ImportacionHuella en el worker.
+    Estados: PENDIENTE (encolada) → PROCESANDO → COMPLETADO / ERROR.
+
+    En modo 'paralelo' el fichero se divide en tramos alineados a línea; cada
+    tramo lo importa una sub-tarea y finalizar_importacion reúne los
+    resultados (chord). Si la importación tiene tramos sin terminar de una
+    ejecución anterior, se reanudan desde su punto de control en lugar de
+    empezar de nuevo. En modo 'copy' lo carga este mismo worker con COPY.
+    """
+    importacion = ImportacionHuella.objects.get(id=importacion_id)
+    reanudar = (
+        settings.HUELLA_IMPORT_MODO != 'copy'
+        and importacion.tramos.filter(completado=False).exists()
+    )
+
+    if reanudar:
+        pendientes = importacion.tramos.filter(completado=False).count()
+        importacion.estado = 'PROCESANDO'
+        importacion.log_proceso += f"\n[REANUDACIÓN] {pendientes} tramos pendientes"
+        importacion.save(update_fields=['estado', 'log_proceso'])
+        tramos = list(importacion.tramos.values_list('id', flat=True))
+    else:
+        ImportacionHuella.objects.filter(id=importacion_id).update(
+            estado='PROCESANDO',
+            lineas_procesadas=0,
+            lineas_creadas=0,
+            lineas_actualizadas=0,
+            lineas_sin_cambios=0,
+            lineas_error=0,
+            lineas_incidencias=0,
+        )
+        try:
+            normalizar_archivo(importacion_id)
+            importacion = ImportacionHuella.objects.get(id=importacion_id)
+
+            if settings.HUELLA_IMPORT_MODO == 'copy':
+                resumen = cargar_importacion(importacion)
+                importacion.lineas_creadas = resumen['creadas']
+                importacion.lineas_actualizadas = resumen['actualizadas']
+                importacion.lineas_sin_cambios = resumen['sin_cambios'] + resumen['duplicadas']
+                importacion.lineas_error = importacion.lineas_incidencias + resumen['rechazadas']
+                importacion.lineas_procesadas = (
+                    importacion.lineas_creadas + importacion.lineas_actualizadas
+                    + importacion.lineas_sin_cambios + importacion.lineas_error
+                )
+                importacion.estado = 'COMPLETADO'
+                importacion.save()
+                aplicar_agregados.delay()
+                return f"Importación {importacion_id} completada"
+
+            with importacion.fichero_a_cargar.open('rb') as fichero:
+                rangos = dividir_en_tramos(fichero, settings.HUELLA_IMPORT_TAMANO_TRAMO)
+            importacion.tramos.all().delete()
+            tramos = [
+                tramo.id for tramo in TramoImportacion.objects.bulk_create([
+                    TramoImportacion(
+                        importacion=importacion, inicio=inicio, fin=fin, primera_linea=primera_linea,
+                        posicion=inicio, linea=primera_linea,
+                    )
+                    for inicio, fin, primera_linea in rangos
+                ])
+            ]
+            importacion.log_proceso += f"\n[CARGA] {len(tramos)} tramos en paralelo"
+            importacion.save(update_fields=['log_proceso'])
+        except Exception as e:
+            _marcar_error(importacion_id, str(e))
+            raise
+
+    chord(importar_tramo.s(tramo_id) for tramo_id in tramos)(finalizar_importacion.s(importacion_id))
+    return f"Importación {importacion_id} repartida en {len(tramos)} tramos"
+
+
+def _guardar_punto_control(tramo_id, estado):
+    """Guarda el punto de control de un tramo (dentro de la transacción del lote)."""
+    campos = {
+        campo: estado[campo]
+        for campo in TramoImportacion().punto_control()
+        if campo in estado
+    }
+    TramoImportacion.objects.filter(id=tramo_id).update(actualizado=timezone.now(), **campos)
+
+
+def _tramos_en_curso(tramo_ids):
+    """Ids de los tramos cuyo advisory lock tiene ahora algún worker."""
+    if not tramo_ids:
+        return set()
+    with connection.cursor() as cursor:
+        # Con pg_advisory_lock(int, int) la clave va en classid y objid (objsubid 2)
+        cursor.execute(
+            "SELECT objid::bigint FROM pg_locks "
+            "WHERE locktype = 'advisory' AND objsubid = 2 AND granted "
+            "AND classid::bigint = %s AND objid::bigint = ANY(%s)",
+            [CLAVE_BLOQUEO_TRAMOS, list(tramo_ids)],
+        )
+        return {fila[0] for fila in cursor.fetchall()}
+
+
+def importacion_abandonada(importacion):
+    """
+    True si la importación tiene tramos sin terminar que ya no procesa nadie:
+    ninguno tiene el bloqueo de un worker ni ha guardado un punto de control
+    en los últimos HUELLA_IMPORT_TRAMO_CADUCIDAD segundos (worker caído o
+    despliegue a mitad de la importación). Se puede volver a encolar para
+    reanudarla desde los puntos de control.
+    """
+    pendientes = list(importacion.tramos.filter(completado=False).values_list('id', 'actualizado'))
+    if not pendientes:
+        return False
+    limite = timezone.now() - timedelta(seconds=settings.HUELLA_IMPORT_TRAMO_CADUCIDAD)
+    if any(actualizado > limite for _, actualizado in pendientes):
+        return False
+    return not _tramos_en_curso([tramo_id for tramo_id, _ in pendientes])
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=5)
+def importar_tramo(self, tramo_id):
+    """
+    Valida e importa un tramo del fichero de una importación, continuando
+    desde el último lote confirmado si el tramo ya se empezó.
+
+    Si el worker muere, la tarea se reentrega (acks_late) y reanuda desde el
+    punto de control. Los errores de conexión se reintentan; el resto se
+    devuelve en el resultado para que finalizar_importacion deje la
+    importación en ERROR.
+    """
+    tramo = TramoImportacion.objects.select_related('importacion').get(id=tramo_id)
+    if tramo.completado:
+        return {'tramo': tramo_id}
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [CLAVE_BLOQUEO_TRAMOS, tramo_id])
+        if not cursor.fetchone()[0]:
+            # Otro worker está procesando este tramo
+            return {'tramo': tramo_id, 'ocupado': True}
+
+    try:
+        tramo.refresh_from_db()
+        with tramo.importacion.fichero_a_cargar.open('rb') as fichero:
+            importar_rango(
+                fichero, tramo.inicio, tramo.fin, tramo.primera_linea,
+                tamano_lote=settings.HUELLA_IMPORT_TAMANO_LOTE,
+                punto_control=tramo.punto_control(),
+                al_confirmar=lambda estado: _guardar_punto_control(tramo_id, estado),
+                usuario_id=tramo.importacion.usuario_id,
+                contexto_auditoria={'importacion': tramo.importacion_id, 'tramo': tramo_id},
+            )
+    except (OperationalError, InterfaceError) as e:
+        if self.request.retries >= self.max_retries:
+            return {'tramo': tramo_id, 'fallo': f'Tramo {tramo.inicio}-{tramo.fin}: {str(e)}'}
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    except Exception as e:
+        return {'tramo': tramo_id, 'fallo': f'Tramo {tramo.inicio}-{tramo.fin}: {str(e)}'}
+    finally:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [CLAVE_BLOQUEO_TRAMOS, tramo_id])
+        except (OperationalError, InterfaceError):
+            # Conexión perdida: PostgreSQL ya ha liberado el bloqueo de sesión
+            pass
+    return {'tramo': tramo_id}
+
+
+@shared_task(bind=True, max_retries=None)
+def finalizar_importacion(self, resultados, importacion_id):
+    """
+    Suma los contadores guardados en los tramos y fija el estado final de la
+    importación. Los contadores incluyen los lotes confirmados de tramos que
+    fallaron a medias, porque esas filas sí están escritas.
+
+    El estado sale de los tramos, no solo de los resultados del chord: si un
+    tramo lo está procesando otra ejecución (p. ej. una tarea reentregada
+    que devolvió 'ocupado'), se espera a que termine; un tramo que queda sin
+    completar y sin nadie que lo procese cuenta como fallo.
+    """
+    importacion = ImportacionHuella.objects.get(id=importacion_id)
+    tramos = list(importacion.tramos.all())
+    pendientes = [t for t in tramos if not t.completado]
+    if _tramos_en_curso([t.id for t in pendientes]):
+        raise self.retry(countdown=settings.HUELLA_IMPORT_ESPERA_FINALIZAR)
+
+    fallos = [r['fallo'] for r in resultados if 'fallo' in r]
+    fallidos = {r['tramo'] for r in resultados if 'fallo' in r}
+    fallos += [
+        f'Tramo {t.inicio}-{t.fin}: no se completó' for t in pendientes if t.id not in fallidos
+    ]
+
+    importacion.lineas_creadas = sum(t.creadas for t in tramos)
+    importacion.lineas_actualizadas = sum(t.actualizadas for t in tramos)
+    importacion.lineas_sin_cambios = sum(t.sin_cambios + t.duplicadas for t in tramos)
+    importacion.lineas_error = importacion.lineas_incidencias + sum(t.errores for t in tramos)
+    importacion.lineas_procesadas = (
+        sum(t.procesadas for t in tramos) + importacion.lineas_error
+    )
+
+    detalle = sorted(tuple(error) for t in tramos for error in t.detalle_errores)
+    log = [
+        f"[RESUMEN] {importacion.lineas_procesadas} líneas: "
+        f"{importacion.lineas_creadas} creadas, {importacion.lineas_actualizadas} actualizadas, "
+        f"{importacion.lineas_sin_cambios} sin cambios, {importacion.lineas_error} con error"
+    ]
+    if importacion.fichero_errores:
+        log.append(f"  Incidencias de normalización en {importacion.fichero_errores.name}")
+    log += [f"  Línea {num_linea}: {motivo}" for num_linea, _, motivo in detalle[:MAX_ERRORES_LOG]]
+    log += [f"[ERROR] {fallo}" for fallo in fallos]
+    importacion.log_proceso += "\n" + "\n".join(log)
+
+    importacion.estado = 'ERROR' if fallos else 'COMPLETADO'
+    importacion.save()
+    aplicar_agregados.delay()
+    return importacion.estado
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def aplicar_correcciones_importacion(importacion_id, estado_final, usuario_id=None):
+    """
+    Aplica en el worker las correcciones (numLinea|valor) subidas a una
+    ImportacionHuella. Estados: PENDIENTE (encolada) → PROCESANDO → el que
+    tenía antes de las correcciones (estado_final), o ERROR si fallan.
+
+    Cada lote de correcciones se confirma por separado; si la tarea se
+    reentrega, aplica las que quedaron sin aplicar.
+    """
+    ImportacionHuella.objects.filter(id=importacion_id).update(estado='PROCESANDO')
+    importacion = ImportacionHuella.objects.get(id=importacion_id)
+    try:
+        resumen = aplicar_correcciones(importacion, usuario_id=usuario_id)
+    except Exception as e:
+        _marcar_error(importacion_id, f"Correcciones: {e}")
+        raise
+    ImportacionHuella.objects.filter(id=importacion_id).update(estado=estado_final)
+    aplicar_agregados.delay()
+    return resumen
+
+
 @shared_task
 def enviar_email(destinatario, asunto, mensaje):
     """Envía un email en segundo plano"""
@@ -47,6 +313,102 @@ def enviar_email(destinatario, asunto, mensaje):
 
 @shared_task
 def limpiar_logs():
-    """Tarea programada para limpiar logs antiguos"""
+    """
+    Tarea programada para limpiar logs antiguos.
+    Crea las particiones mensuales de AuditLog de los próximos meses y quita
+    las que superan HUELLA_AUDITORIA_RETENCION_MESES.
+    """
     print("Limpiando logs...")
-    return "Logs limpiados"
+    creadas = auditoria.asegurar_particiones()
+    purgadas = auditoria.purgar_particiones()
+    return f"Logs limpiados: {len(purgadas)} particiones purgadas, {len(creadas)} creadas"
+
+
+@shared_task(ignore_result=True)
+def aplicar_agregados():
+    """
+    Tarea programada (cada HUELLA_AGREGADOS_INTERVALO segundos y al terminar
+    una importación) que suma a EstadisticaHuella y a CeldaMapa las
+    diferencias pendientes que apuntan los triggers de Huella.
+    """
+    return {
+        'estadisticas': estadisticas.aplicar_cambios(),
+        'mapa': mapa.aplicar_cambios(),
+    }
+
+
+@shared_task
+def reconciliar_estadisticas():
+    """
+    Tarea programada que recalcula los contadores de EstadisticaHuella desde
+    Huella y corrige cualquier desviación de los triggers.
+    """
+    corregidos = estadisticas.reconciliar()
+    estadisticas.aplicar_cambios()
+    return f"Estadísticas reconciliadas: {corregidos} contadores corregidos"
+
+
+@shared_task
+def reconciliar_mapa():
+    """
+    Tarea programada que recalcula la rejilla del mapa (CeldaMapa) desde
+    Huella y corrige cualquier desviación de los triggers.
+    """
+    corregidas = mapa.reconciliar()
+    return f"Mapa reconciliado: {corregidas} celdas corregidas"
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def generar_exportacion(exportacion_id):
+    """
+    Genera el fichero comprimido de una ExportacionHuella.
+    Estados: PENDIENTE (encolada) → PROCESANDO → COMPLETADO / ERROR.
+    """
+    registro = ExportacionHuella.objects.get(id=exportacion_id)
+    if registro.estado == 'COMPLETADO':
+        # Reentrega de una tarea que ya terminó
+        return registro.estado
+
+    registro.estado = 'PROCESANDO'
+    registro.save(update_fields=['estado'])
+    try:
+        if registro.fichero:
+            # Fichero a medias de una ejecución interrumpida
+            registro.fichero.delete(save=False)
+        exportacion.escribir_exportacion(registro)
+    except Exception as e:
+        registro.estado = 'ERROR'
+        registro.error = str(e)
+        registro.fecha_fin = timezone.now()
+        registro.save(update_fields=['estado', 'error', 'fecha_fin', 'fichero'])
+        raise
+
+    registro.estado = 'COMPLETADO'
+    registro.fecha_fin = timezone.now()
+    registro.save(update_fields=['estado', 'fichero', 'filas', 'fecha_fin'])
+    return registro.estado
+
+
+@shared_task
+def limpiar_exportaciones():
+    """
+    Tarea programada que borra las exportaciones, y sus ficheros, más
+    antiguas que HUELLA_EXPORTACION_RETENCION.
+    """
+    borradas = exportacion.limpiar_exportaciones()
+    return f"Exportaciones limpiadas: {borradas} borradas"
+
+
+@shared_task(ignore_result=True)
+def volcar_auditoria():
+    """Escribe por lotes los AuditLog pendientes en Redis (ver auditoria.py)."""
+    return auditoria.volcar()
+
+
+@worker_shutdown.connect
+def volcar_auditoria_al_parar(**kwargs):
+    """Al parar el worker no se deja auditoría pendiente sin escribir."""
+    try:
+        auditoria.volcar()
+    except Exception:
+        logger.exception('No se pudo volcar la auditoría pendiente al parar el worker')
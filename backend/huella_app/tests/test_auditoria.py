@@ -0,0 +1,140 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas del registro de auditoría de las cargas masivas: en lugar de un
+# AuditLog por fila, sql_upsert escribe un resumen por acción y por cada
+# FILAS_POR_AUDITORIA filas, con los rangos de ids que cubre. Las
+# actualizaciones guardan las diferencias campo a campo, tanto en la fusión
+# como al guardar una instancia (sin volver a leerla). auditoria.volcar
+# recupera el lote de un volcado interrumpido sin duplicar registros.
+
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from huella_app import auditoria, importador
+from huella_app.importador import UpsertHuellas, parsear_fila
+from huella_app.models import AuditLog, Huella
+
+
+def datos(iddomicilio, poblacion='MADRID'):
+    row = [''] * 27
+    row[:4] = [iddomicilio, '28001', 'MADRID', poblacion]
+    return parsear_fila(row)
+
+
+def rangos(ids):
+    """Ids agrupados en rangos [desde, hasta] de ids consecutivos."""
+    resultado = []
+    for id_ in sorted(ids):
+        if resultado and resultado[-1][1] == id_ - 1:
+            resultado[-1][1] = id_
+        else:
+            resultado.append([id_, id_])
+    return resultado
+
+
+class ResumenFusionTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('auditoria', password='x')
+
+    def cargar(self, filas):
+        upsert = UpsertHuellas(usuario_id=self.usuario.id, contexto_auditoria={'importacion': 7})
+        for fila in filas:
+            upsert.agregar(fila)
+        return upsert.cerrar()
+
+    def resumenes(self, accion):
+        registros = AuditLog.objects.filter(model_name='Huella', action=accion)
+        return sorted((registro.changes for registro in registros), key=lambda cambios: cambios['rangos'])
+
+    def test_un_resumen_por_accion_con_rangos_de_ids(self):
+        self.cargar([datos(f'A{i}') for i in range(5)])
+        ids = dict(Huella.objects.values_list('iddomicilioto', 'id'))
+
+        self.cargar([datos('A0', 'GETAFE'), datos('A1', 'GETAFE'), datos('A3', 'GETAFE'), datos('A9')])
+
+        creadas = self.resumenes('CREATED')
+        self.assertEqual([c['filas'] for c in creadas], [5, 1])
+        self.assertEqual(creadas[0]['rangos'], rangos(ids.values()))
+        self.assertEqual(len(creadas[0]['rangos']), 1)
+        self.assertEqual(creadas[0]['importacion'], 7)
+        (actualizadas,) = self.resumenes('UPDATED')
+        self.assertEqual(actualizadas['filas'], 3)
+        self.assertEqual(actualizadas['rangos'], rangos([ids['A0'], ids['A1'], ids['A3']]))
+        self.assertEqual(AuditLog.objects.filter(model_name='Huella').count(), 3)
+        self.assertFalse(AuditLog.objects.filter(model_name='Huella').exclude(user=self.usuario).exists())
+
+    def test_un_resumen_cada_filas_por_auditoria(self):
+        with mock.patch.object(importador, 'FILAS_POR_AUDITORIA', 2):
+            self.cargar([datos(f'A{i}') for i in range(5)])
+
+        self.assertEqual([c['filas'] for c in self.resumenes('CREATED')], [2, 2, 1])
+
+    def test_la_fusion_guarda_las_diferencias(self):
+        self.cargar([datos('A0'), datos('A1')])
+        ids = dict(Huella.objects.values_list('iddomicilioto', 'id'))
+
+        self.cargar([datos('A0', 'GETAFE'), datos('A1')])
+
+        (actualizadas,) = self.resumenes('UPDATED')
+        self.assertEqual(actualizadas['cambios'], {str(ids['A0']): {'poblacion': ['MADRID', 'GETAFE']}})
+
+
+@override_settings(HUELLA_AUDITORIA_DIFERIDA=False)
+class DiferenciasInstanciaTests(TestCase):
+
+    def test_guardar_una_instancia_compara_con_lo_cargado(self):
+        Huella.objects.create(**datos('A0'))
+        huella = Huella.objects.get()
+        huella.poblacion = 'GETAFE'
+        huella.numero = '5'
+
+        with CaptureQueriesContext(connection) as consultas:
+            huella.save(update_fields=['poblacion'])
+
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if c['sql'].startswith('SELECT "huella')])
+        registro = AuditLog.objects.get(model_name='Huella', action='UPDATED', instance_id=huella.id)
+        self.assertEqual(registro.changes, {'poblacion': ['MADRID', 'GETAFE']})
+
+
+class VolcarTests(TestCase):
+
+    def setUp(self):
+        self.redis = mock.MagicMock()
+        self.redis.lock.return_value.acquire.return_value = True
+        parche = mock.patch.object(auditoria, 'cliente', return_value=self.redis)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def registro(self, instance_id):
+        return AuditLog(action='UPDATED', model_name='Huella', instance_id=instance_id, changes={})
+
+    def test_recupera_el_lote_interrumpido_sin_duplicar(self):
+        # El volcado anterior guardó el primer registro y murió antes de borrar el lote
+        guardado = self.registro(1)
+        guardado.save()
+        self.redis.lrange.return_value = [auditoria._serializar(guardado),
+                                          auditoria._serializar(self.registro(2))]
+        with mock.patch.object(auditoria, '_mover_lote',
+                               side_effect=[[auditoria._serializar(self.registro(3))], []]):
+            escritos = auditoria.volcar(tamano_lote=10)
+
+        self.assertEqual(escritos, 2)
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('instance_id', flat=True)), [1, 2, 3]
+        )
+        self.redis.delete.assert_any_call(auditoria.CLAVE_PROCESANDO)
+        self.redis.lock.return_value.release.assert_called_once()
+
+    def test_otro_proceso_esta_volcando(self):
+        self.redis.lock.return_value.acquire.return_value = False
+
+        self.assertEqual(auditoria.volcar(), 0)
+        self.redis.lrange.assert_not_called()
@@ -0,0 +1,68 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de cache_respuestas.invalidar: la versión de la huella sube una
+# sola vez por transacción confirmada, ninguna si se deshace, y los
+# savepoints deshechos no se llevan la subida del resto de la transacción.
+
+from unittest import mock
+
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from huella_app import cache_respuestas
+
+
+class Deshacer(Exception):
+    pass
+
+
+class InvalidarTests(TransactionTestCase):
+
+    def setUp(self):
+        parche = mock.patch.object(cache_respuestas, '_incrementar_version')
+        self.incrementar = parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_sin_transaccion_sube_en_el_acto(self):
+        cache_respuestas.invalidar()
+        cache_respuestas.invalidar()
+        self.assertEqual(self.incrementar.call_count, 2)
+
+    def test_una_subida_por_transaccion(self):
+        with transaction.atomic():
+            for _ in range(3):
+                cache_respuestas.invalidar()
+            self.assertEqual(self.incrementar.call_count, 0)
+        self.assertEqual(self.incrementar.call_count, 1)
+
+        with transaction.atomic():
+            cache_respuestas.invalidar()
+        self.assertEqual(self.incrementar.call_count, 2)
+
+    def test_transaccion_deshecha_no_sube(self):
+        with self.assertRaises(Deshacer), transaction.atomic():
+            cache_respuestas.invalidar()
+            raise Deshacer
+        self.assertEqual(self.incrementar.call_count, 0)
+
+        # La transacción deshecha no deja marcada la conexión
+        with transaction.atomic():
+            cache_respuestas.invalidar()
+        self.assertEqual(self.incrementar.call_count, 1)
+
+    def test_savepoint_deshecho(self):
+        with transaction.atomic():
+            with self.assertRaises(Deshacer), transaction.atomic():
+                cache_respuestas.invalidar()
+                raise Deshacer
+            cache_respuestas.invalidar()
+        self.assertEqual(self.incrementar.call_count, 1)
+
+        with transaction.atomic():
+            with self.assertRaises(Deshacer), transaction.atomic():
+                cache_respuestas.invalidar()
+                raise Deshacer
+        self.assertEqual(self.incrementar.call_count, 1)
@@ -0,0 +1,66 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de carga_copy.cargar_fichero_copy: COPY a staging, validación y
+# fusión set-based, con sus contadores de rechazadas, duplicadas, creadas,
+# actualizadas y sin cambios.
+
+import io
+from decimal import Decimal
+
+from django.test import TestCase
+
+from huella_app.carga_copy import CargaRechazada, cargar_fichero_copy
+from huella_app.models import Huella
+
+
+def linea(iddomicilio, provincia='MADRID', poblacion='MADRID', lat='', columnas=36):
+    row = [''] * columnas
+    row[:4] = [iddomicilio, '28001', provincia, poblacion]
+    if columnas > 34:
+        row[34] = lat
+    return ';'.join(row)
+
+
+def fichero(*lineas):
+    return io.StringIO('\n'.join(lineas) + '\n')
+
+
+class CargarFicheroCopyTests(TestCase):
+
+    def test_valida_y_fusiona(self):
+        resumen = cargar_fichero_copy(fichero(
+            linea('K1', lat='40,5'),
+            linea('K2', lat='no es un número'),
+            'K3;28001;MADRID',
+            linea('K4', provincia=' '),
+            linea('K1', poblacion='GETAFE', lat='40,5', columnas=27),
+        ))
+
+        self.assertEqual(
+            {clave: resumen[clave] for clave in ('cargadas', 'rechazadas', 'duplicadas', 'creadas', 'actualizadas')},
+            {'cargadas': 4, 'rechazadas': 2, 'duplicadas': 1, 'creadas': 2, 'actualizadas': 0},
+        )
+        self.assertEqual([num_linea for num_linea, _ in resumen['errores']], [3, 4])
+        self.assertEqual(resumen['errores'][1][1], 'provincia está vacío')
+        # Gana la última línea de K1 (27 columnas: sin coordenadas)
+        k1 = Huella.objects.get(iddomicilioto='K1')
+        self.assertEqual((k1.poblacion, k1.lat), ('GETAFE', None))
+        self.assertIsNone(Huella.objects.get(iddomicilioto='K2').lat)
+
+    def test_coordenadas_y_segunda_carga(self):
+        cargar_fichero_copy(fichero(linea('K1', lat='40,5'), linea('K2')))
+        self.assertEqual(Huella.objects.get(iddomicilioto='K1').lat, Decimal('40.5'))
+
+        resumen = cargar_fichero_copy(fichero(linea('K1', lat='40,5'), linea('K2', poblacion='GETAFE'),
+                                              linea('K3')))
+        self.assertEqual((resumen['creadas'], resumen['actualizadas'], resumen['sin_cambios']), (1, 1, 1))
+
+    def test_sin_rechazos_no_fusiona_nada(self):
+        with self.assertRaises(CargaRechazada) as error:
+            cargar_fichero_copy(fichero(linea('K1'), linea('K2', poblacion='')), permitir_rechazos=False)
+
+        self.assertEqual(error.exception.resumen['rechazadas'], 1)
+        self.assertFalse(Huella.objects.exists())
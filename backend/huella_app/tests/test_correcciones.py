@@ -0,0 +1,141 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de la aplicación de correcciones de una importación: el endpoint
+# aplicar_correcciones encola la tarea y responde 202, y
+# normalization.aplicar_correcciones carga las correcciones en sus
+# incidencias, aplica las válidas por lotes y reanuda las que quedaron a medias.
+
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from huella_app import normalization, tasks, views
+from huella_app.models import Huella, ImportacionHuella, IncidenciaImportacion, IneMunicipio
+from huella_app.normalization import aplicar_correcciones
+
+
+def fila(iddomicilio, poblacion):
+    row = [''] * 27
+    row[:4] = [iddomicilio, '28001', 'MADRID', poblacion]
+    return ';'.join(row)
+
+
+class CorreccionesTestCase(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        IneMunicipio.objects.create(cod_provincia='28', cod_municipio='079', digito_control='6',
+                                    nombre_oficial='Madrid')
+        self.usuario = User.objects.create_user('correcciones', password='x')
+        self.importacion = ImportacionHuella.objects.create(
+            usuario=self.usuario, fichero_original='cargas/originales/huella.csv', estado='COMPLETADO',
+            lineas_incidencias=3, lineas_error=3,
+        )
+        for num_linea, iddomicilio, poblacion in [(2, 'C1', 'MADRIDD'), (3, 'C2', 'MADRI'), (4, 'C3', 'MADRIZ')]:
+            IncidenciaImportacion.objects.create(
+                importacion=self.importacion, num_linea=num_linea, campo='poblacion', valor=poblacion,
+                motivo='población no encontrada', linea=fila(iddomicilio, poblacion),
+            )
+
+
+class AplicarCorreccionesTests(CorreccionesTestCase):
+
+    def aplicar(self, texto):
+        self.importacion.fichero_correcciones.save('correcciones.txt', ContentFile(texto.encode()), save=True)
+        return aplicar_correcciones(self.importacion)
+
+    def test_aplica_las_validas_por_lotes(self):
+        texto = '2|Madrid\n3|NO EXISTE\n3|Madrid\n4|NO EXISTE\n99|Madrid\nsin separador\n'
+        with mock.patch.object(normalization, 'TAMANO_LOTE_INCIDENCIAS', 1):
+            resumen = self.aplicar(texto)
+
+        self.assertEqual(resumen, {
+            'recibidas': 5, 'aplicadas': 2, 'pendientes': 1, 'sin_incidencia': 1,
+            'creadas': 2, 'actualizadas': 0, 'sin_cambios': 0,
+        })
+        # En la línea 3 gana la última corrección
+        self.assertEqual(
+            sorted(Huella.objects.values_list('iddomicilioto', 'poblacion')),
+            [('C1', 'MADRID'), ('C2', 'MADRID')],
+        )
+        incidencia = self.importacion.incidencias.get()
+        self.assertEqual((incidencia.num_linea, incidencia.valor, incidencia.correccion), (4, 'NO EXISTE', None))
+        self.assertIn(';NO EXISTE;', incidencia.linea)
+
+        self.importacion.refresh_from_db()
+        self.assertEqual(self.importacion.lineas_incidencias, 1)
+        self.assertEqual(self.importacion.lineas_error, 1)
+        self.assertEqual(self.importacion.lineas_creadas, 2)
+        self.assertFalse(self.importacion.fichero_correcciones)
+        self.assertTrue(self.importacion.fichero_errores)
+
+    def test_reanuda_las_correcciones_sin_aplicar(self):
+        # Tarea cortada después de cargar las correcciones: ya no hay fichero
+        self.importacion.incidencias.filter(num_linea=3).update(correccion='Madrid')
+
+        resumen = aplicar_correcciones(self.importacion)
+
+        self.assertEqual((resumen['recibidas'], resumen['aplicadas'], resumen['pendientes']), (0, 1, 0))
+        self.assertEqual(list(Huella.objects.values_list('iddomicilioto', flat=True)), ['C2'])
+        self.assertEqual(list(self.importacion.incidencias.values_list('num_linea', flat=True)), [2, 4])
+
+
+class EndpointCorreccionesTests(CorreccionesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.url = reverse('huella_app:importacion-aplicar-correcciones', args=[self.importacion.id])
+
+    def enviar(self):
+        fichero = SimpleUploadedFile('correcciones.csv', b'2|Madrid\n')
+        return self.client.post(self.url, {'correcciones': fichero}, format='multipart')
+
+    def test_encola_la_tarea(self):
+        with mock.patch.object(views.aplicar_correcciones_importacion, 'apply_async') as encolar:
+            respuesta = self.enviar()
+            segunda = self.enviar()
+
+        self.assertEqual(respuesta.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(segunda.status_code, status.HTTP_409_CONFLICT)
+        tarea_id = respuesta.data['tarea_id']
+        encolar.assert_called_once_with(
+            args=[self.importacion.id, 'COMPLETADO', self.usuario.id], task_id=tarea_id
+        )
+        self.importacion.refresh_from_db()
+        self.assertEqual((self.importacion.estado, self.importacion.tarea_id), ('PENDIENTE', tarea_id))
+        # Nada se aplica dentro de la petición
+        self.assertEqual(self.importacion.incidencias.count(), 3)
+
+        with mock.patch.object(tasks.aplicar_agregados, 'delay'):
+            resumen = tasks.aplicar_correcciones_importacion(*encolar.call_args.kwargs['args'])
+        self.assertEqual(resumen['aplicadas'], 1)
+        self.importacion.refresh_from_db()
+        self.assertEqual(self.importacion.estado, 'COMPLETADO')
+
+    def test_sin_worker_vuelve_a_su_estado(self):
+        with mock.patch.object(views.aplicar_correcciones_importacion, 'apply_async',
+                               side_effect=OSError('broker caído')):
+            respuesta = self.enviar()
+
+        self.assertEqual(respuesta.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.importacion.refresh_from_db()
+        self.assertEqual(self.importacion.estado, 'COMPLETADO')
+        self.assertIn('No se pudieron encolar las correcciones', self.importacion.log_proceso)
@@ -0,0 +1,75 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de los contadores de estadísticas: los triggers de Huella apuntan
+# las diferencias en CambioEstadistica, aplicar_cambios las suma en
+# EstadisticaHuella y reconciliar corrige los contadores que se desvían.
+# TransactionTestCase: reconciliar abre su propia transacción REPEATABLE READ.
+
+from django.test import TransactionTestCase
+
+from huella_app import estadisticas
+from huella_app.models import CambioEstadistica, EstadisticaHuella, Huella
+
+
+def contador(dimension, valor):
+    return EstadisticaHuella.objects.filter(dimension=dimension, valor=valor).values_list(
+        'cantidad', flat=True
+    ).first()
+
+
+def crear(iddomicilio, poblacion, codigopostal):
+    return Huella.objects.create(
+        iddomicilioto=iddomicilio, codigopostal=codigopostal, provincia='TERUEL', poblacion=poblacion
+    )
+
+
+class EstadisticasTests(TransactionTestCase):
+
+    def setUp(self):
+        # Punto de partida coherente con lo que haya en Huella
+        estadisticas.reconciliar()
+        estadisticas.aplicar_cambios()
+        self.total = contador(EstadisticaHuella.TOTAL, '') or 0
+
+    def test_aplicar_cambios_suma_las_diferencias(self):
+        primera = crear('E1', 'ALCAÑIZ', '44600')
+        segunda = crear('E2', 'CALANDA', '44570')
+        # Los triggers solo apuntan las diferencias
+        self.assertIsNone(contador('provincia', 'TERUEL'))
+        self.assertTrue(CambioEstadistica.objects.exists())
+
+        self.assertGreater(estadisticas.aplicar_cambios(), 0)
+
+        self.assertFalse(CambioEstadistica.objects.exists())
+        self.assertEqual(contador(EstadisticaHuella.TOTAL, ''), self.total + 2)
+        self.assertEqual(contador('provincia', 'TERUEL'), 2)
+        self.assertEqual(contador('codigopostal', '44570'), 1)
+
+        segunda.poblacion = 'ALCAÑIZ'
+        segunda.save()
+        primera.delete()
+        estadisticas.aplicar_cambios()
+
+        self.assertEqual(contador(EstadisticaHuella.TOTAL, ''), self.total + 1)
+        self.assertEqual(contador('poblacion', 'ALCAÑIZ'), 1)
+        # Los contadores que llegan a 0 se borran
+        self.assertIsNone(contador('poblacion', 'CALANDA'))
+        self.assertIsNone(contador('codigopostal', '44600'))
+
+    def test_reconciliar_corrige_los_desviados(self):
+        crear('E1', 'ALCAÑIZ', '44600')
+        estadisticas.aplicar_cambios()
+        EstadisticaHuella.objects.filter(dimension='provincia', valor='TERUEL').update(cantidad=7)
+        # Pendiente de aplicar: no cuenta como desviación
+        crear('E2', 'CALANDA', '44570')
+
+        self.assertEqual(estadisticas.reconciliar(), 1)
+        estadisticas.aplicar_cambios()
+
+        self.assertEqual(contador('provincia', 'TERUEL'), 2)
+        self.assertEqual(contador('poblacion', 'CALANDA'), 1)
+        self.assertEqual(contador(EstadisticaHuella.TOTAL, ''), self.total + 2)
+        self.assertEqual(estadisticas.reconciliar(), 0)
@@ -0,0 +1,71 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de la reutilización de exportaciones en
+# exportacion.solicitar_exportacion: la misma petición del mismo usuario,
+# dentro de HUELLA_EXPORTACION_TTL y con la misma versión de la huella,
+# devuelve la exportación existente.
+
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from huella_app import cache_respuestas
+from huella_app.exportacion import solicitar_exportacion
+from huella_app.models import ExportacionHuella
+
+
+class SolicitarExportacionTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('exportacion', password='x')
+        parche = mock.patch.object(cache_respuestas, 'version', return_value=3)
+        self.version = parche.start()
+        self.addCleanup(parche.stop)
+
+    def solicitar(self, filtros=None, formato='csv', usuario=None):
+        return solicitar_exportacion(formato, filtros or {'provincia': 'A Coruña'}, usuario or self.usuario)
+
+    def test_reutiliza_la_misma_peticion(self):
+        exportacion, reutilizada = self.solicitar()
+        self.assertFalse(reutilizada)
+
+        # Mismos filtros escritos de otra forma
+        otra, reutilizada = self.solicitar({'provincia': '  a coruña ', 'poblacion': ''})
+
+        self.assertTrue(reutilizada)
+        self.assertEqual(otra.id, exportacion.id)
+
+    def test_no_reutiliza_si_cambia_la_peticion(self):
+        self.solicitar()
+        otro_usuario = User.objects.create_user('otro', password='x')
+
+        self.assertFalse(self.solicitar(formato='ndjson')[1])
+        self.assertFalse(self.solicitar({'provincia': 'Lugo'})[1])
+        self.assertFalse(self.solicitar(usuario=otro_usuario)[1])
+        # Se ha escrito en Huella desde que se generó
+        self.version.return_value = 4
+        self.assertFalse(self.solicitar()[1])
+
+    def test_no_reutiliza_las_caducadas_ni_las_fallidas(self):
+        exportacion, _ = self.solicitar()
+        ExportacionHuella.objects.filter(id=exportacion.id).update(
+            fecha_creacion=timezone.now() - timedelta(seconds=settings.HUELLA_EXPORTACION_TTL + 1)
+        )
+        nueva, reutilizada = self.solicitar()
+        self.assertFalse(reutilizada)
+
+        ExportacionHuella.objects.filter(id=nueva.id).update(estado='ERROR')
+        self.assertFalse(self.solicitar()[1])
+
+    def test_sin_redis_no_reutiliza(self):
+        self.version.return_value = None
+        self.solicitar()
+
+        self.assertFalse(self.solicitar()[1])
@@ -0,0 +1,109 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de la numeración de celdas de geoespacial.py: orden Z, rangos de
+# un área y coincidencia con la función SQL huella_celda_geo (migración 0020).
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from huella_app.geoespacial import (
+    NIVEL_MAXIMO, celda, cubrir_area, indices_celda, numero_celda, rango_celda, rangos_area,
+)
+
+# Puntos de prueba (lat, lng): esquinas, ejes, bordes de celda y huellas reales
+PUNTOS = [
+    (-90, -180), (90, 180), (0, 0), (-90, 180), (90, -180),
+    (43.3623, -8.4115), (40.4168, -3.7038), (28.1235, -15.4363), (39.5696, 2.6502),
+    (-33.8688, 151.2093), (64.1466, -21.9426),
+    # Bordes exactos de celdas de nivel 26 y valores a un paso de ellos
+    (Decimal('0.00000268220901489257812500'), Decimal('0.00000536441802978515625000')),
+    (Decimal('-0.00000001'), Decimal('-0.00000001')),
+    (Decimal('89.99999999'), Decimal('179.99999999')),
+    (Decimal('43.36230000'), Decimal('-8.41150000')),
+]
+
+
+class NumeracionCeldasTests(SimpleTestCase):
+
+    def test_intercala_bits_de_x_en_pares_y_de_y_en_impares(self):
+        self.assertEqual(numero_celda(0, 0), 0)
+        self.assertEqual(numero_celda(1, 0), 1)
+        self.assertEqual(numero_celda(0, 1), 2)
+        self.assertEqual(numero_celda(3, 3), 15)
+        self.assertEqual(numero_celda(0b101, 0b011), 0b011011)
+
+    def test_esquinas_del_mundo(self):
+        self.assertEqual(celda(-90, -180), 0)
+        self.assertEqual(celda(90, 180), (1 << (2 * NIVEL_MAXIMO)) - 1)
+
+    def test_cuadrantes_de_nivel_1(self):
+        self.assertEqual(celda(-45, -90, nivel=1), 0)
+        self.assertEqual(celda(-45, 90, nivel=1), 1)
+        self.assertEqual(celda(45, -90, nivel=1), 2)
+        self.assertEqual(celda(45, 90, nivel=1), 3)
+
+    def test_celda_gruesa_contiene_a_la_fina(self):
+        for lat, lng in PUNTOS:
+            fina = celda(lat, lng)
+            for nivel in (0, 5, 12, 20, NIVEL_MAXIMO):
+                desde, hasta = rango_celda(celda(lat, lng, nivel), nivel)
+                self.assertTrue(desde <= fina <= hasta, (lat, lng, nivel))
+
+    def test_coordenadas_fuera_de_rango_se_recortan(self):
+        self.assertEqual(indices_celda(91, 181), indices_celda(90, 180))
+        self.assertEqual(indices_celda(-91, -181), (0, 0))
+
+
+class RangosAreaTests(SimpleTestCase):
+
+    def assertRangosCubren(self, area, puntos, max_celdas=None):
+        rangos = rangos_area(*area, max_celdas=max_celdas)
+        for (desde, hasta), (siguiente, _) in zip(rangos, rangos[1:]):
+            # Ordenados, sin solaparse y sin dos rangos contiguos sin unir
+            self.assertLessEqual(desde, hasta)
+            self.assertGreater(siguiente, hasta + 1)
+        for lat, lng in puntos:
+            numero = celda(lat, lng)
+            self.assertTrue(any(desde <= numero <= hasta for desde, hasta in rangos), (lat, lng))
+        return rangos
+
+    def test_cubre_todos_los_puntos_del_area(self):
+        sur, oeste, norte, este = 43.35, -8.42, 43.37, -8.39
+        puntos = [
+            (sur + (norte - sur) * i / 10, oeste + (este - oeste) * j / 10)
+            for i in range(11) for j in range(11)
+        ]
+        self.assertRangosCubren((sur, oeste, norte, este), puntos)
+
+    def test_limita_el_numero_de_celdas(self):
+        for max_celdas in (1, 4, 16, 64):
+            nivel, celdas = cubrir_area(40.0, -4.0, 41.0, -3.0, max_celdas)
+            self.assertLessEqual(len(celdas), max_celdas)
+            self.assertEqual(celdas, sorted(celdas))
+            self.assertLessEqual(len(rangos_area(40.0, -4.0, 41.0, -3.0, max_celdas)), max_celdas)
+
+    def test_punto_en_el_borde_del_area(self):
+        area = (43.0, -9.0, 44.0, -8.0)
+        self.assertRangosCubren(area, [(43.0, -9.0), (44.0, -8.0), (43.0, -8.0), (44.0, -9.0)], 4)
+
+    def test_area_de_un_punto(self):
+        rangos = self.assertRangosCubren((43.3623, -8.4115, 43.3623, -8.4115), [(43.3623, -8.4115)])
+        self.assertEqual(len(rangos), 1)
+
+    def test_mundo_entero(self):
+        self.assertEqual(rangos_area(-90, -180, 90, 180), [[0, (1 << (2 * NIVEL_MAXIMO)) - 1]])
+
+
+class CeldaSqlTests(TestCase):
+    """geoespacial.celda y huella_celda_geo deben numerar igual, también en los bordes."""
+
+    def test_coincide_con_huella_celda_geo(self):
+        with connection.cursor() as cursor:
+            for lat, lng in PUNTOS:
+                cursor.execute('SELECT huella_celda_geo(%s::numeric, %s::numeric)', [str(lat), str(lng)])
+                self.assertEqual(cursor.fetchone()[0], celda(lat, lng), (lat, lng))
@@ -0,0 +1,101 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de la fusión por lotes de importador.UpsertHuellas (COPY a la tabla
+# temporal + sql_upsert): contadores de creadas / actualizadas / sin cambios,
+# duplicados dentro de un lote y escritura por lotes; y del hash de contenido
+# que deja sin tocar las filas que no han cambiado.
+
+import importlib
+
+from django.db import connection
+from django.test import TestCase
+
+from huella_app.importador import UpsertHuellas, parsear_fila
+from huella_app.models import Huella
+
+
+def datos(iddomicilio, poblacion='MADRID', lat=''):
+    row = [''] * 36
+    row[:4] = [iddomicilio, '28001', 'MADRID', poblacion]
+    row[34] = lat
+    return parsear_fila(row)
+
+
+class UpsertHuellasTests(TestCase):
+
+    def cargar(self, filas, **opciones):
+        upsert = UpsertHuellas(**opciones)
+        for fila in filas:
+            upsert.agregar(fila)
+        return upsert.cerrar()
+
+    def test_crea_actualiza_y_cuenta_sin_cambios(self):
+        resumen = self.cargar([datos('U1'), datos('U2'), datos('U3')])
+        self.assertEqual((resumen['creadas'], resumen['actualizadas'], resumen['sin_cambios']), (3, 0, 0))
+
+        resumen = self.cargar([datos('U1'), datos('U2', poblacion='GETAFE'), datos('U3'), datos('U4')])
+        self.assertEqual((resumen['creadas'], resumen['actualizadas'], resumen['sin_cambios']), (1, 1, 2))
+        self.assertEqual(Huella.objects.get(iddomicilioto='U2').poblacion, 'GETAFE')
+        self.assertEqual(Huella.objects.count(), 4)
+
+    def test_duplicados_en_un_lote_gana_el_ultimo(self):
+        resumen = self.cargar([datos('U1'), datos('U1', poblacion='GETAFE')])
+
+        self.assertEqual((resumen['procesadas'], resumen['creadas'], resumen['duplicadas']), (2, 1, 1))
+        self.assertEqual(Huella.objects.get(iddomicilioto='U1').poblacion, 'GETAFE')
+
+    def test_escribe_por_lotes(self):
+        volcados = []
+        resumen = self.cargar(
+            [datos(f'U{i}') for i in range(5)], tamano_lote=2,
+            al_volcar=lambda upsert: volcados.append(upsert.creadas),
+        )
+
+        self.assertEqual(resumen['lotes'], 3)
+        self.assertEqual(volcados, [2, 4, 5])
+        self.assertEqual(Huella.objects.count(), 5)
+
+
+class HashContenidoTests(TestCase):
+
+    cargar = UpsertHuellasTests.cargar
+
+    def test_no_reescribe_las_filas_sin_cambios(self):
+        self.cargar([datos('H1', lat='40.4'), datos('H2')])
+        antes = dict(Huella.objects.values_list('iddomicilioto', 'updated'))
+
+        # Mismas coordenadas escritas de otra forma: mismo hash
+        resumen = self.cargar([datos('H1', lat='40.40'), datos('H2', poblacion='GETAFE')])
+
+        self.assertEqual((resumen['actualizadas'], resumen['sin_cambios']), (1, 1))
+        despues = dict(Huella.objects.values_list('iddomicilioto', 'updated'))
+        self.assertEqual(despues['H1'], antes['H1'])
+        self.assertGreater(despues['H2'], antes['H2'])
+
+    def test_la_edicion_manual_invalida_el_hash(self):
+        self.cargar([datos('H1')])
+        huella = Huella.objects.get()
+        huella.observaciones = 'editada a mano'
+        huella.save(update_fields=['observaciones'])
+        huella.refresh_from_db()
+        self.assertIsNone(huella.hash_contenido)
+
+        resumen = self.cargar([datos('H1')])
+
+        self.assertEqual(resumen['actualizadas'], 1)
+        huella.refresh_from_db()
+        self.assertEqual(huella.observaciones, '')
+        self.assertIsNotNone(huella.hash_contenido)
+
+    def test_el_relleno_de_la_migracion_da_el_mismo_hash(self):
+        self.cargar([datos('H1', lat='40.4'), datos('H2')])
+        migracion = importlib.import_module('huella_app.migrations.0009_huella_hash_contenido')
+        guardados = dict(Huella.objects.values_list('id', 'hash_contenido'))
+
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.RELLENAR_HASH)
+
+        self.assertEqual(dict(Huella.objects.values_list('id', 'hash_contenido')), guardados)
@@ -0,0 +1,83 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de la rejilla del mapa: los triggers de Huella apuntan las
+# diferencias en CambioCeldaMapa, mapa.aplicar_cambios las sube a todos los
+# niveles de CeldaMapa y mapa.reconciliar corrige las celdas desviadas.
+# TransactionTestCase: reconciliar abre su propia transacción REPEATABLE READ.
+
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.test import TransactionTestCase
+
+from huella_app import mapa
+from huella_app.geoespacial import celda
+from huella_app.models import CambioCeldaMapa, CeldaMapa, Huella
+
+NIVELES = range(mapa.NIVEL_MINIMO, mapa.NIVEL_PRECALCULADO + 1)
+
+
+def crear(iddomicilio, lat, lng):
+    return Huella.objects.create(
+        iddomicilioto=iddomicilio, codigopostal='44600', provincia='TERUEL', poblacion='ALCAÑIZ',
+        lat=Decimal(lat), lng=Decimal(lng),
+    )
+
+
+def celdas(**filtros):
+    return CeldaMapa.objects.filter(provincia_normalizada='TERUEL', **filtros)
+
+
+class MapaTests(TransactionTestCase):
+
+    def setUp(self):
+        # Punto de partida coherente con lo que haya en Huella
+        mapa.reconciliar()
+        mapa.aplicar_cambios()
+
+    def cantidades_por_nivel(self):
+        return dict(celdas().values('nivel').annotate(total=Sum('cantidad')).values_list('nivel', 'total'))
+
+    def test_aplicar_cambios_sube_todos_los_niveles(self):
+        primera = crear('M1', '41.05', '-0.13')
+        crear('M2', '41.06', '-0.14')
+        self.assertFalse(celdas().exists())
+        self.assertTrue(CambioCeldaMapa.objects.exists())
+
+        mapa.aplicar_cambios()
+
+        self.assertFalse(CambioCeldaMapa.objects.exists())
+        self.assertEqual(self.cantidades_por_nivel(), {nivel: 2 for nivel in NIVELES})
+        gruesa = celdas(nivel=mapa.NIVEL_MINIMO).get()
+        self.assertEqual(gruesa.celda, celda(41.05, -0.13, mapa.NIVEL_MINIMO))
+        self.assertEqual((gruesa.suma_lat, gruesa.suma_lng), (Decimal('82.11'), Decimal('-0.27')))
+
+        # Mover una huella lejos: sale de su celda fina y entra en otra
+        primera.lat, primera.lng = Decimal('40.34'), Decimal('-1.10')
+        primera.save()
+        mapa.aplicar_cambios()
+
+        self.assertEqual(self.cantidades_por_nivel(), {nivel: 2 for nivel in NIVELES})
+        fina = celda(40.34, -1.10, mapa.NIVEL_PRECALCULADO)
+        self.assertEqual(celdas(nivel=mapa.NIVEL_PRECALCULADO, celda=fina).get().cantidad, 1)
+
+        Huella.objects.filter(provincia='TERUEL').delete()
+        mapa.aplicar_cambios()
+        # Las celdas que se quedan sin huellas se borran
+        self.assertFalse(celdas().exists())
+
+    def test_reconciliar_corrige_las_desviadas(self):
+        crear('M1', '41.05', '-0.13')
+        mapa.aplicar_cambios()
+        celdas(nivel=10).update(cantidad=9)
+        # Pendiente de aplicar: no cuenta como desviación
+        crear('M2', '41.06', '-0.14')
+
+        self.assertEqual(mapa.reconciliar(), 1)
+        mapa.aplicar_cambios()
+
+        self.assertEqual(self.cantidades_por_nivel(), {nivel: 2 for nivel in NIVELES})
+        self.assertEqual(mapa.reconciliar(), 0)
@@ -0,0 +1,45 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de normalization.normalizar_texto y de su versión SQL
+# huella_normalizar_texto (migración 0016), que rellena las columnas
+# *_normalizada: los filtros comparan un valor normalizado en Python con lo
+# que calculó el trigger, así que las dos tienen que dar lo mismo.
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from huella_app.normalization import normalizar_texto
+
+TEXTOS = [
+    '', '   ', 'MADRID', 'madrid', 'A Coruña', 'CORUÑA, A', "L'Hospitalet de Llobregat",
+    'Alicante/Alacant', 'Àvila', 'ÁVILA', 'Cádiz', 'Castelló de la Plana', 'Lleida · Lérida',
+    'Pça. de la Vila, 3º 2ª', 'C/ Mayor, nº 5', 'San Sebastián-Donostia', 'Güeñes',
+    'Vitoria-Gasteiz', 'O Grove', 'Ourense  (Orense)', 'Santa Cruz de Tenerife', 'Ñ-ñ',
+    'Sant Adrià de Besòs', 'Ciutadella de Menorca', 'Ÿ ÿ Š š Ž ž Ł ł', 'çÇ', 'Ā ā Ő ő',
+    '28001', 'Calle 1ª   Travesía', '¿Qué?¡Sí!', 'Puerto\tde\nla Cruz',
+]
+
+
+class NormalizarTextoTests(SimpleTestCase):
+
+    def test_mayusculas_sin_tildes_ni_signos(self):
+        self.assertEqual(normalizar_texto('A Coruña'), 'A CORUNA')
+        self.assertEqual(normalizar_texto("L'Hospitalet de Llobregat"), 'L HOSPITALET DE LLOBREGAT')
+        self.assertEqual(normalizar_texto('  San Sebastián-Donostia  '), 'SAN SEBASTIAN DONOSTIA')
+        self.assertEqual(normalizar_texto('Güeñes'), 'GUENES')
+
+    def test_vacio(self):
+        self.assertEqual(normalizar_texto(''), '')
+        self.assertEqual(normalizar_texto(' ,.- '), '')
+
+
+class NormalizarTextoSqlTests(TestCase):
+
+    def test_coincide_con_huella_normalizar_texto(self):
+        with connection.cursor() as cursor:
+            for texto in TEXTOS:
+                cursor.execute('SELECT huella_normalizar_texto(%s)', [texto])
+                self.assertEqual(cursor.fetchone()[0], normalizar_texto(texto), texto)
@@ -0,0 +1,116 @@
+# Programa: Weblla
+# Veersion: 1.0
+# Autor: Equipo Weblla
+# Fecha: 17-10-2026
+# Descripción:
+# Pruebas de HuellaCursorPagination: recorrer el listado hacia delante y
+# hacia atrás con los enlaces next/previous, también con muchas huellas que
+# comparten `created`, los errores de cursor y de orden, y la búsqueda del
+# listado con cursor.
+
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from huella_app.models import Huella
+from huella_app.paginacion import HuellaCursorPagination
+
+PREFIJO = 'TSTCURSOR'
+
+
+class HuellaCursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Huella.objects.bulk_create([
+            Huella(iddomicilioto=f'{PREFIJO}{i:03d}', codigopostal='15001', provincia='A CORUÑA',
+                   poblacion='A CORUÑA', nombrevia='REAL', numero=str(i))
+            for i in range(23)
+        ])
+        # Tres valores de `created` para 23 huellas: el id desempata
+        ahora = timezone.now()
+        for resto in range(3):
+            ids = [h.id for h in Huella.objects.filter(iddomicilioto__startswith=PREFIJO) if h.id % 3 == resto]
+            Huella.objects.filter(id__in=ids).update(created=ahora - timedelta(minutes=resto))
+        cls.esperados = list(
+            Huella.objects.filter(iddomicilioto__startswith=PREFIJO)
+            .order_by('-created', '-id').values_list('id', flat=True)
+        )
+
+    def queryset(self):
+        return Huella.objects.filter(iddomicilioto__startswith=PREFIJO)
+
+    def pagina(self, url):
+        """(ids, next, previous) de la página de `url`."""
+        paginador = HuellaCursorPagination()
+        request = Request(APIRequestFactory().get(url))
+        pagina = paginador.paginate_queryset(self.queryset(), request)
+        return [huella.id for huella in pagina], paginador.get_next_link(), paginador.get_previous_link()
+
+    def test_recorre_hacia_delante_y_hacia_atras(self):
+        ids, siguiente, anterior = self.pagina('/api/huellas/?page_size=5')
+        self.assertIsNone(anterior)
+        paginas = [ids]
+        while siguiente:
+            ids, siguiente, anterior = self.pagina(siguiente)
+            self.assertIsNotNone(anterior)
+            paginas.append(ids)
+        self.assertEqual([i for ids in paginas for i in ids], self.esperados)
+        self.assertEqual([len(ids) for ids in paginas], [5, 5, 5, 5, 3])
+
+        # De la última página a la primera con los enlaces previous
+        vueltas = [paginas[-1]]
+        while anterior:
+            ids, _, anterior = self.pagina(anterior)
+            vueltas.append(ids)
+        self.assertEqual(vueltas[::-1], paginas)
+
+    def test_siguiente_desde_una_pagina_anterior(self):
+        _, siguiente, _ = self.pagina('/api/huellas/?page_size=4')
+        ids2, siguiente, _ = self.pagina(siguiente)
+        _, _, anterior = self.pagina(siguiente)
+        self.assertEqual(self.pagina(anterior)[0], ids2)
+
+    def test_conserva_los_demas_parametros(self):
+        _, siguiente, _ = self.pagina('/api/huellas/?page_size=5&paginacion=cursor&provincia=coruna')
+        parametros = parse_qs(urlparse(siguiente).query)
+        self.assertEqual(parametros['provincia'], ['coruna'])
+        self.assertEqual(parametros['page_size'], ['5'])
+        self.assertIn('cursor', parametros)
+
+    def test_cursor_no_valido(self):
+        for cursor in ('xyz', 'e30=', '!!'):
+            with self.assertRaises(NotFound):
+                self.pagina(f'/api/huellas/?cursor={cursor}')
+
+    def test_rechaza_otro_orden(self):
+        paginador = HuellaCursorPagination()
+        request = Request(APIRequestFactory().get('/api/huellas/'))
+        with self.assertRaises(ParseError):
+            paginador.paginate_queryset(self.queryset().order_by('provincia'), request)
+        self.assertEqual(len(paginador.paginate_queryset(self.queryset().order_by('-created'), request)), 23)
+
+    def test_busqueda_con_cursor(self):
+        # El listado de React pide siempre ?paginacion=cursor, también al buscar
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('cursor', password='x'))
+        url = reverse('huella_app:huella-list')
+        respuesta = cliente.get(url, {'paginacion': 'cursor', 'search': 'real', 'page_size': 10})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        ids = [fila['id'] for fila in respuesta.json()['results']]
+        while respuesta.json()['next']:
+            respuesta = cliente.get(respuesta.json()['next'])
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            ids += [fila['id'] for fila in respuesta.json()['results']]
+        self.assertEqual([i for i in ids if i in self.esperados], self.esperados)
+
+        # Un orden explícito distinto sigue siendo incompatible con el cursor
+        respuesta = cliente.get(url, {'paginacion': 'cursor', 'search': 'real', 'ordering': 'provincia'})
+        self.assertEqual(respuesta.status_code, 400)
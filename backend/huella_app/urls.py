@@ -2,21 +2,22 @@
 # Veersion: 1.1
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
-# Última Modificación: 02-02-2026
-# Cambios realizados: Actualización de rutas para gestión de usuarios.
+# Última Modificación: 17-10-2026
+# Cambios realizados: Rutas de las exportaciones en segundo plano.
 # Descripción:
 # Archivo de rutas para la aplicación huella_app.
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    HuellaViewSet, ImportacionViewSet, LoginView, LogoutView, 
+    HuellaViewSet, ImportacionViewSet, ExportacionViewSet, LoginView, LogoutView, 
     UserDetailView, MenuView, UserViewSet
 )
 
 router = DefaultRouter()
 router.register(r'huellas', HuellaViewSet, basename='huella')
 router.register(r'importaciones', ImportacionViewSet, basename='importacion')
+router.register(r'exportaciones', ExportacionViewSet, basename='exportacion')
 router.register(r'usuarios', UserViewSet, basename='usuario')
 
 app_name = 'huella_app'
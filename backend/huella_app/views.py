@@ -2,33 +2,38 @@
 # Veersion: 1.1
 # Autor: Equipo Weblla
 # Fecha: 28-01-2026
-# Última modificación: 02-02-2026
-# Cambio realizado: añadido vistas para gestión de usuarios.
+# Última modificación: 17-10-2026
+# Cambio realizado: aplicar_correcciones encola la tarea que las aplica.
 # Descripción:
 # Vistas para la gestión de huellas y autenticación de usuarios.
 
-from rest_framework import viewsets, filters, status
+from rest_framework import mixins, viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.authtoken.models import Token
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Huella, ImportacionHuella
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from .models import Huella, ImportacionHuella, ExportacionHuella
 from .serializers import HuellaSerializer, HuellaListSerializer, LoginSerializer, UserSerializer, ImportacionHuellaSerializer
+from .serializers import ExportacionHuellaSerializer
 from rest_framework import parsers
-from .normalization import normalizar_archivo
+from .cache_respuestas import respuesta_cacheada
+from .estadisticas import leer_estadisticas
+from .exportacion import filtrar_exportacion, generar_csv, solicitar_exportacion
+from .geoespacial import filtro_area, huellas_en_radio, leer_area, leer_numero
+from .mapa import FILTROS_MAPA, ZOOM_MAXIMO, clusters
+from .filtros import BusquedaTextoFilter, HuellaFilter, filtro_direccion
+from .paginacion import HuellaPagination, HuellaConteoEstimadoPagination, HuellaCursorPagination
+from .tasks import aplicar_correcciones_importacion, generar_exportacion, importacion_abandonada, procesar_importacion
 from django.contrib.auth.models import User, Group
 from .serializers import UserManagementSerializer, GroupSerializer
 
-class HuellaPagination(PageNumberPagination):
-    """Paginación personalizada para listados de huellas."""
-    page_size = 50
-    page_size_query_param = 'page_size'
-    max_page_size = 1000
-
 class HuellaViewSet(viewsets.ModelViewSet):
     """
     ViewSet completo para gestionar líneas de huella.
@@ -39,31 +44,28 @@ class HuellaViewSet(viewsets.ModelViewSet):
     - Búsqueda por múltiples campos
     - Ordenamiento
     - Acciones personalizadas para búsquedas específicas
+    - Paginación por cursor opcional (?paginacion=cursor) en el listado y
+      en las acciones por_*
+    - Caché en Redis de las lecturas (listado, por_* y estadisticas),
+      invalidada por versión al escribir en Huella
     
     Permisos: Requiere autenticación. Los cambios requieren permisos específicos.
     """
     
-    queryset = Huella.objects.all()
+    # El vector de búsqueda no se serializa: no se lee de la base de datos
+    queryset = Huella.objects.defer('busqueda')
     serializer_class = HuellaSerializer
-    pagination_class = HuellaPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = HuellaConteoEstimadoPagination
+    # La búsqueda va la última para poder ordenar por relevancia
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, BusquedaTextoFilter]
     permission_classes = [IsAuthenticated]
     authentication_classes = [TokenAuthentication]
     
-    # Campos disponibles para filtrado
-    filterset_fields = [
-        'iddomicilioto',
-        'codigopostal',
-        'provincia',
-        'poblacion',
-        'tipovia',
-        'nombrevia',
-        'codigoolt',
-        'codigocto',
-        'tipocto',
-    ]
+    # Campos disponibles para filtrado (provincia, poblacion y nombrevia
+    # sobre las columnas normalizadas)
+    filterset_class = HuellaFilter
     
-    # Campos disponibles para búsqueda
+    # Campos incluidos en la búsqueda (columna Huella.busqueda, migración 0015)
     search_fields = [
         'iddomicilioto',
         'nombrevia',
@@ -88,6 +90,21 @@ class HuellaViewSet(viewsets.ModelViewSet):
     # Orden por defecto
     ordering = ['-created']
     
+    @property
+    def paginator(self):
+        """Con ?paginacion=cursor se pagina por (created, id) en vez de por número de página."""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('paginacion') == 'cursor':
+                self._paginator = HuellaCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @respuesta_cacheada('list')
+    def list(self, request, *args, **kwargs):
+        """Listado paginado; la respuesta se guarda en la caché de respuestas."""
+        return super().list(request, *args, **kwargs)
+
     def get_serializer_class(self):
         """Usa serializador reducido en listados para mejor rendimiento."""
         if self.action == 'list':
@@ -95,6 +112,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return HuellaSerializer
     
     @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_codigo_postal')
     def por_codigo_postal(self, request):
         """
         Endpoint para obtener huellas filtradas por código postal.
@@ -118,6 +136,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_provincia')
     def por_provincia(self, request):
         """
         Endpoint para obtener huellas filtradas por provincia.
@@ -131,7 +150,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        huellas = Huella.objects.filter(provincia__icontains=provincia)
+        huellas = Huella.objects.filter(filtro_direccion('provincia', provincia, prefijo=True))
         page = self.paginate_queryset(huellas)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -141,6 +160,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_poblacion')
     def por_poblacion(self, request):
         """
         Endpoint para obtener huellas filtradas por población/municipio.
@@ -154,7 +174,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        huellas = Huella.objects.filter(poblacion__icontains=poblacion)
+        huellas = Huella.objects.filter(filtro_direccion('poblacion', poblacion, prefijo=True))
         page = self.paginate_queryset(huellas)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -164,6 +184,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_cto')
     def por_cto(self, request):
         """
         Endpoint para obtener huellas filtradas por CTO.
@@ -187,6 +208,7 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_olt')
     def por_olt(self, request):
         """
         Endpoint para obtener huellas filtradas por OLT.
@@ -210,51 +232,132 @@ class HuellaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
-    def estadisticas(self, request):
+    @respuesta_cacheada('por_radio')
+    def por_radio(self, request):
         """
-        Endpoint para obtener estadísticas generales.
+        Endpoint para obtener las huellas a menos de `radio` metros de un
+        punto, de la más cercana a la más lejana. Cada resultado incluye
+        `distancia` en metros.
         
-        Uso: GET /api/huellas/estadisticas/
+        Uso: GET /api/huellas/por_radio/?lat=43.36&lng=-8.41&radio=500
+        
+        Sin radio se usa HUELLA_GEO_RADIO_DEFECTO; el máximo es
+        HUELLA_GEO_RADIO_MAX.
         """
-        from django.db.models import Count
+        try:
+            lat = leer_numero(request.query_params, 'lat', -90, 90)
+            lng = leer_numero(request.query_params, 'lng', -180, 180)
+            radio = leer_numero(
+                request.query_params, 'radio', 0, settings.HUELLA_GEO_RADIO_MAX,
+                defecto=settings.HUELLA_GEO_RADIO_DEFECTO,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        total = Huella.objects.count()
-        provincias = Huella.objects.values('provincia').distinct().count()
-        poblaciones = Huella.objects.values('poblacion').distinct().count()
-        codigos_postal = Huella.objects.values('codigopostal').distinct().count()
+        huellas = huellas_en_radio(Huella.objects.defer('busqueda'), lat, lng, radio)
+        page = self.paginate_queryset(huellas)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(self._con_distancia(serializer.data, page))
         
-        # Top 5 provincias por cantidad de huellas
-        top_provincias = Huella.objects.values('provincia').annotate(
-            cantidad=Count('id')
-        ).order_by('-cantidad')[:5]
+        serializer = self.get_serializer(huellas, many=True)
+        return Response(self._con_distancia(serializer.data, huellas))
+    
+    @staticmethod
+    def _con_distancia(datos, huellas):
+        for fila, huella in zip(datos, huellas):
+            fila['distancia'] = round(huella.distancia, 1)
+        return datos
+    
+    @action(detail=False, methods=['get'])
+    @respuesta_cacheada('por_area')
+    def por_area(self, request):
+        """
+        Endpoint para obtener las huellas dentro de un rectángulo de
+        coordenadas.
         
-        # Top 5 poblaciones por cantidad de huellas
-        top_poblaciones = Huella.objects.values('poblacion').annotate(
-            cantidad=Count('id')
-        ).order_by('-cantidad')[:5]
+        Uso: GET /api/huellas/por_area/?sur=43.35&oeste=-8.42&norte=43.37&este=-8.39
+        """
+        try:
+            area = leer_area(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'total_huellas': total,
-            'total_provincias': provincias,
-            'total_poblaciones': poblaciones,
-            'total_codigos_postal': codigos_postal,
-            'top_provincias': list(top_provincias),
-            'top_poblaciones': list(top_poblaciones),
-        })
+        huellas = Huella.objects.defer('busqueda').filter(filtro_area(*area))
+        page = self.paginate_queryset(huellas)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = self.get_serializer(huellas, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @respuesta_cacheada('mapa')
+    def mapa(self, request):
+        """
+        Endpoint para pintar la huella en un mapa: en lugar de las huellas
+        devuelve, por cada celda de una rejilla acorde al zoom, el número de
+        huellas y su centroide (unos cientos de clusters como mucho).
+        
+        Uso: GET /api/huellas/mapa/?sur=42&oeste=-9.3&norte=43.8&este=-6.7&zoom=8
+        
+        Filtros opcionales: provincia, codigoolt, codigocto
+        """
+        try:
+            area = leer_area(request.query_params)
+            zoom = int(leer_numero(request.query_params, 'zoom', 0, ZOOM_MAXIMO))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        filtros = {campo: request.query_params.get(campo) for campo in FILTROS_MAPA}
+        return Response(clusters(area, zoom, filtros))
+    
+    @action(detail=False, methods=['get'])
+    @respuesta_cacheada('estadisticas')
+    def estadisticas(self, request):
+        """
+        Endpoint para obtener estadísticas generales.
+        
+        Se leen de los contadores de EstadisticaHuella, que recogen las
+        escrituras en Huella con un retraso de HUELLA_AGREGADOS_INTERVALO
+        segundos como mucho: el coste no depende del tamaño de la tabla.
+        
+        Uso: GET /api/huellas/estadisticas/
+        """
+        return Response(leer_estadisticas())
     
     @action(detail=True, methods=['get'])
     def vecinos(self, request, pk=None):
         """
-        Endpoint para obtener huellas cercanas por dirección.
+        Endpoint para obtener huellas cercanas por dirección: las de la misma
+        población y vía cuyo número está a ±rango del de la huella.
         
-        Uso: GET /api/huellas/{id}/vecinos/
+        Uso: GET /api/huellas/{id}/vecinos/?rango=2
+        
+        Sin ?rango se usa HUELLA_VECINOS_RANGO; el máximo es
+        HUELLA_VECINOS_RANGO_MAX. Compara numero_int, así que "00005" y "5"
+        son el mismo número, y se resuelve con un rango del índice
+        (poblacion, nombrevia, numero_int).
         """
+        try:
+            rango = int(request.query_params.get('rango', settings.HUELLA_VECINOS_RANGO))
+        except ValueError:
+            return Response(
+                {'error': 'El parámetro rango debe ser un número entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        rango = min(max(rango, 0), settings.HUELLA_VECINOS_RANGO_MAX)
+
         huella = self.get_object()
-        vecinas = Huella.objects.filter(
+        if huella.numero_int is None:
+            # Sin número (p. ej. "S/N") no hay portales contiguos
+            return Response([])
+        vecinas = Huella.objects.defer('busqueda').filter(
+            poblacion=huella.poblacion,
             nombrevia=huella.nombrevia,
-            numero__in=[str(int(huella.numero or 0) - 1), huella.numero, str(int(huella.numero or 0) + 1)],
-            poblacion=huella.poblacion
-        ).exclude(id=huella.id)
+            numero_int__range=(huella.numero_int - rango, huella.numero_int + rango),
+        ).exclude(id=huella.id).order_by('numero_int', 'id')
         
         serializer = self.get_serializer(vecinas, many=True)
         return Response(serializer.data)
@@ -272,58 +375,14 @@ class HuellaViewSet(viewsets.ModelViewSet):
         - poblacion
         - codigoolt
         - codigocto
+        
+        El CSV se envía a medida que se lee de la base de datos (cursor de
+        servidor), sin cargar la exportación entera en memoria. Para
+        exportaciones grandes, mejor POST /api/exportaciones/ (en segundo plano).
         """
-        import csv
-        from io import StringIO
-        from django.http import StreamingHttpResponse
-        
-        # Aplicar filtros
-        queryset = Huella.objects.all()
-        
-        if request.query_params.get('codigopostal'):
-            queryset = queryset.filter(codigopostal=request.query_params.get('codigopostal'))
-        if request.query_params.get('provincia'):
-            queryset = queryset.filter(provincia__icontains=request.query_params.get('provincia'))
-        if request.query_params.get('poblacion'):
-            queryset = queryset.filter(poblacion__icontains=request.query_params.get('poblacion'))
-        if request.query_params.get('codigoolt'):
-            queryset = queryset.filter(codigoolt__icontains=request.query_params.get('codigoolt'))
-        if request.query_params.get('codigocto'):
-            queryset = queryset.filter(codigocto__icontains=request.query_params.get('codigocto'))
-        
-        # Crear CSV en memoria
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Escribir encabezados
-        campos = [
-            'iddomicilioto', 'codigopostal', 'provincia', 'poblacion', 'tipovia', 'nombrevia',
-            'numero', 'codigoolt', 'codigocto', 'tipocto', 'observaciones'
-        ]
-        writer.writerow(campos)
-        
-        # Escribir datos
-        for huella in queryset:
-            fila = [
-                huella.iddomicilioto,
-                huella.codigopostal,
-                huella.provincia,
-                huella.poblacion,
-                huella.tipovia,
-                huella.nombrevia,
-                huella.numero,
-                huella.codigoolt,
-                huella.codigocto,
-                huella.tipocto,
-                huella.observaciones,
-            ]
-            writer.writerow(fila)
-        
-        # Crear respuesta descargable
-        output.seek(0)
-        response = StreamingHttpResponse(output, content_type='text/csv')
+        queryset = filtrar_exportacion(request.query_params)
+        response = StreamingHttpResponse(generar_csv(queryset), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="huella_export.csv"'
-        
         return response
 
 
@@ -364,77 +423,223 @@ class ImportacionViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def procesar(self, request, pk=None):
         """
-        Procesa y normaliza el fichero CSV importado.
-        
+        Encola el procesado (normalización y carga) del fichero CSV importado.
+        Responde 202 con el id de la tarea; el estado de la importación lo
+        actualiza el worker de Celery. Responde 409 si ya está encolada
+        (PENDIENTE con tarea) o en proceso, salvo que sus tramos sin terminar
+        estén abandonados (worker caído o despliegue; ver
+        tasks.importacion_abandonada): entonces se vuelve a encolar y se
+        reanuda desde el último punto de control de cada tramo.
+
         POST /api/importaciones/{id}/procesar/
         """
+        import uuid
         importacion = self.get_object()
-        
-        # Cambiar estado a procesando
-        importacion.estado = 'PROCESANDO'
-        importacion.save()
-        
+
+        # Actualización condicional: si llegan dos peticiones a la vez (doble
+        # clic) solo una encuentra la importación sin encolar y encola la tarea
+        tarea_id = str(uuid.uuid4())
+        encolada = ImportacionHuella.objects.filter(pk=importacion.pk).exclude(
+            estado='PROCESANDO'
+        ).exclude(
+            estado='PENDIENTE', tarea_id__gt=''
+        ).update(estado='PENDIENTE', tarea_id=tarea_id)
+        if not encolada and importacion_abandonada(importacion):
+            with transaction.atomic():
+                # Solo si nadie la ha vuelto a encolar desde que se leyó
+                encolada = ImportacionHuella.objects.filter(
+                    pk=importacion.pk, estado=importacion.estado, tarea_id=importacion.tarea_id
+                ).update(estado='PENDIENTE', tarea_id=tarea_id)
+                if encolada:
+                    # Los tramos vuelven a contar como activos: otra petición no
+                    # la encola de nuevo hasta que caduquen otra vez
+                    importacion.tramos.filter(completado=False).update(actualizado=timezone.now())
+        if not encolada:
+            return Response(
+                {'error': 'La importación ya está encolada o se está procesando'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        importacion.estado = 'PENDIENTE'
+        importacion.tarea_id = tarea_id
+
         try:
-            # Ejecutar el script de normalización
-            normalizar_archivo(importacion.id)
-            importacion.refresh_from_db()
-            return Response({
-                'status': 'Procesado exitosamente',
-                'estado': importacion.estado,
-                'id': importacion.id
-            })
+            procesar_importacion.apply_async(args=[importacion.id], task_id=importacion.tarea_id)
         except Exception as e:
             importacion.estado = 'ERROR'
-            importacion.log_proceso += f"\n[ERROR] {str(e)}"
-            importacion.save()
+            importacion.log_proceso += f"\n[ERROR] No se pudo encolar el procesado: {str(e)}"
+            importacion.save(update_fields=['estado', 'log_proceso'])
             return Response(
                 {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
+        
+        return Response({
+            'status': 'Procesado encolado',
+            'estado': importacion.estado,
+            'id': importacion.id,
+            'tarea_id': importacion.tarea_id,
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def aplicar_correcciones(self, request, pk=None):
         """
-        Aplica las correcciones manuales a los registros con errores.
+        Encola la aplicación de las correcciones manuales a los registros con
+        errores (tarea aplicar_correcciones_importacion). Las líneas
+        corregidas se validan de nuevo y las correctas se cargan en Huella;
+        las demás siguen en fichero_errores con el nuevo motivo.
+        Responde 202 con el id de la tarea, o 409 si la importación ya está
+        encolada o en proceso; al terminar vuelve a su estado anterior.
         
         POST /api/importaciones/{id}/aplicar_correcciones/
-        Body: archivo CSV con correcciones
+        Body: archivo CSV con correcciones (numLinea|valor por línea)
         """
+        import uuid
         importacion = self.get_object()
         
+        if 'correcciones' not in request.FILES:
+            return Response(
+                {'error': 'No se envió archivo de correcciones'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Misma actualización condicional que procesar, y solo si nadie la ha
+        # cambiado desde que se leyó: la tarea la devuelve a ese estado
+        tarea_id = str(uuid.uuid4())
+        estado_anterior = importacion.estado
+        encolada = ImportacionHuella.objects.filter(
+            pk=importacion.pk, estado=estado_anterior, tarea_id=importacion.tarea_id
+        ).exclude(
+            estado='PROCESANDO'
+        ).exclude(
+            estado='PENDIENTE', tarea_id__gt=''
+        ).update(estado='PENDIENTE', tarea_id=tarea_id)
+        if not encolada:
+            return Response(
+                {'error': 'La importación ya está encolada o se está procesando'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        importacion.tarea_id = tarea_id
+        usuario_id = request.user.id if request.user.is_authenticated else None
         try:
-            # Procesar el archivo de correcciones
-            if 'correcciones' in request.FILES:
-                archivo = request.FILES['correcciones']
-                correcciones = {}
-                
-                for linea in archivo.read().decode('utf-8').split('\n'):
-                    if linea.strip():
-                        partes = linea.split('|')
-                        if len(partes) >= 2:
-                            num_linea = partes[0].strip()
-                            valor = partes[1].strip()
-                            correcciones[num_linea] = valor
-                
-                # Guardar correcciones en el log
-                importacion.log_proceso += f"\n[CORRECCIONES APLICADAS] {len(correcciones)} registros"
-                importacion.save()
-                
-                return Response({
-                    'status': 'Correcciones aplicadas',
-                    'cantidad': len(correcciones)
-                })
-            else:
-                return Response(
-                    {'error': 'No se envió archivo de correcciones'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # El worker lee las correcciones del fichero guardado, no de la petición
+            if importacion.fichero_correcciones:
+                importacion.fichero_correcciones.delete(save=False)
+            importacion.fichero_correcciones.save(
+                f'correcciones_{importacion.id}.txt', request.FILES['correcciones'], save=False
+            )
+            importacion.save(update_fields=['fichero_correcciones'])
+            aplicar_correcciones_importacion.apply_async(
+                args=[importacion.id, estado_anterior, usuario_id], task_id=tarea_id
+            )
         except Exception as e:
+            importacion.estado = estado_anterior
+            importacion.log_proceso += f"\n[ERROR] No se pudieron encolar las correcciones: {str(e)}"
+            importacion.save(update_fields=['estado', 'log_proceso'])
             return Response(
                 {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
+        return Response({
+            'status': 'Correcciones encoladas',
+            'estado': 'PENDIENTE',
+            'id': importacion.id,
+            'tarea_id': tarea_id,
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportacionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                         mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    API de exportaciones de huellas en segundo plano.
+
+    Funcionalidades:
+    - POST /api/exportaciones/ → Pedir una exportación
+      Body: {"formato": "csv" | "ndjson", "filtros": {"provincia": "...", ...}}
+    - GET /api/exportaciones/{id}/ → Consultar su estado
+    - GET /api/exportaciones/{id}/descargar/ → Descargar el fichero .gz
+
+    La misma petición del mismo usuario (formato y filtros normalizados)
+    dentro de HUELLA_EXPORTACION_TTL, y sin escrituras en Huella entre
+    medias, devuelve la exportación existente (`reutilizada: true`) en lugar
+    de generar otro fichero.
+
+    Permisos: Requiere autenticación. Cada usuario ve sus exportaciones; el
+    staff las ve todas.
+    """
+    queryset = ExportacionHuella.objects.select_related('usuario')
+    serializer_class = ExportacionHuellaSerializer
+    pagination_class = HuellaPagination
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [TokenAuthentication]
+
+    def get_queryset(self):
+        """Exportaciones del usuario actual (todas si es staff)."""
+        if self.request.user.is_staff:
+            return self.queryset
+        return self.queryset.filter(usuario=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Responde 202 con la exportación encolada (o reutilizada y aún en
+        curso), o 200 si se reutiliza una ya completada.
+        """
+        import uuid
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        exportacion, reutilizada = solicitar_exportacion(
+            serializer.validated_data.get('formato', 'csv'),
+            serializer.validated_data.get('filtros', {}),
+            usuario=request.user,
+        )
+        if not reutilizada:
+            exportacion.tarea_id = str(uuid.uuid4())
+            exportacion.save(update_fields=['tarea_id'])
+            try:
+                generar_exportacion.apply_async(args=[exportacion.id], task_id=exportacion.tarea_id)
+            except Exception as e:
+                exportacion.estado = 'ERROR'
+                exportacion.error = f"No se pudo encolar la exportación: {str(e)}"
+                exportacion.save(update_fields=['estado', 'error'])
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+            exportacion.refresh_from_db()
+
+        datos = self.get_serializer(exportacion).data
+        datos['reutilizada'] = reutilizada
+        codigo = status.HTTP_200_OK if exportacion.estado == 'COMPLETADO' else status.HTTP_202_ACCEPTED
+        return Response(datos, status=codigo)
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """
+        Descarga el fichero comprimido (gzip) de una exportación completada.
+
+        GET /api/exportaciones/{id}/descargar/
+        """
+        exportacion = self.get_object()
+        if exportacion.estado != 'COMPLETADO':
+            return Response(
+                {'error': f'La exportación no está completada (estado: {exportacion.estado})'},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not exportacion.fichero or not exportacion.fichero.storage.exists(exportacion.fichero.name):
+            return Response(
+                {'error': 'El fichero de la exportación ya no existe'},
+                status=status.HTTP_410_GONE
+            )
+        return FileResponse(
+            exportacion.fichero.open('rb'),
+            as_attachment=True,
+            filename=f'huella_export.{exportacion.formato}.gz',
+            content_type='application/gzip',
+        )
+
 
 # =======================================================
 # VISTAS DE AUTENTICACIÓN
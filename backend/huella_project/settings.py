@@ -8,6 +8,7 @@
 from pathlib import Path
 import os
 import dj_database_url
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -171,4 +172,86 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'huella_app.tasks.limpiar_logs',
         'schedule': 86400.0,  # cada 24 horas
     },
-}
\ No newline at end of file
+    'reconciliar-estadisticas-diario': {
+        'task': 'huella_app.tasks.reconciliar_estadisticas',
+        'schedule': crontab(hour=3, minute=15),  # cada día, de madrugada
+    },
+    'reconciliar-mapa-diario': {
+        'task': 'huella_app.tasks.reconciliar_mapa',
+        'schedule': crontab(hour=4, minute=15),  # una hora después de las estadísticas
+    },
+}
+
+# Importación de ficheros de huella
+# 'paralelo': el fichero se reparte en tramos que procesan varios workers de Celery
+# 'copy': un único worker lo carga con COPY a una tabla de staging
+HUELLA_IMPORT_MODO = os.environ.get('HUELLA_IMPORT_MODO', 'paralelo')
+HUELLA_IMPORT_TAMANO_TRAMO = int(os.environ.get('HUELLA_IMPORT_TAMANO_TRAMO', 32 * 1024 * 1024))  # bytes
+HUELLA_IMPORT_TAMANO_LOTE = int(os.environ.get('HUELLA_IMPORT_TAMANO_LOTE', 5000))  # filas por INSERT
+# Un tramo sin terminar cuyo worker no tiene el bloqueo y que no guarda un punto
+# de control desde hace este tiempo se da por abandonado (worker caído o
+# despliegue): procesar puede volver a encolar la importación para reanudarla
+HUELLA_IMPORT_TRAMO_CADUCIDAD = int(os.environ.get('HUELLA_IMPORT_TRAMO_CADUCIDAD', 600))  # segundos
+# Espera de finalizar_importacion entre comprobaciones mientras otra ejecución
+# de un tramo (tarea reentregada) sigue en curso
+HUELLA_IMPORT_ESPERA_FINALIZAR = int(os.environ.get('HUELLA_IMPORT_ESPERA_FINALIZAR', 30))  # segundos
+
+# Paginación de huellas: por encima de este número de filas estimadas el
+# `count` es la estimación del planificador; por debajo, un COUNT(*) cacheado
+HUELLA_CONTEO_UMBRAL_ESTIMADO = int(os.environ.get('HUELLA_CONTEO_UMBRAL_ESTIMADO', 100000))
+HUELLA_CONTEO_CACHE_TTL = int(os.environ.get('HUELLA_CONTEO_CACHE_TTL', 60))  # segundos
+
+# Caché en Redis de las respuestas de lectura de HuellaViewSet. Se invalida
+# por versión; el TTL solo acota la memoria y el caso de que Redis no
+# recibiera una subida de versión
+HUELLA_CACHE_ACTIVA = os.environ.get('HUELLA_CACHE_ACTIVA', 'true').lower() == 'true'
+HUELLA_CACHE_REDIS_URL = os.environ.get('HUELLA_CACHE_REDIS_URL', CELERY_BROKER_URL)
+HUELLA_CACHE_TTL = int(os.environ.get('HUELLA_CACHE_TTL', 300))  # segundos
+
+# Acción vecinos: portales a ±rango del número de la huella (?rango= hasta el máximo)
+HUELLA_VECINOS_RANGO = int(os.environ.get('HUELLA_VECINOS_RANGO', 1))
+HUELLA_VECINOS_RANGO_MAX = int(os.environ.get('HUELLA_VECINOS_RANGO_MAX', 50))
+
+# Consultas espaciales (por_radio, por_area): celdas como máximo en la
+# cobertura de un área (cada una, un rango del índice de celda_geo) y radio máximo
+HUELLA_GEO_MAX_CELDAS = int(os.environ.get('HUELLA_GEO_MAX_CELDAS', 16))
+HUELLA_GEO_RADIO_DEFECTO = int(os.environ.get('HUELLA_GEO_RADIO_DEFECTO', 500))  # metros
+HUELLA_GEO_RADIO_MAX = int(os.environ.get('HUELLA_GEO_RADIO_MAX', 50000))  # metros
+# Endpoint mapa: clusters como máximo por respuesta (si el área es mayor se baja de nivel)
+HUELLA_MAPA_MAX_CELDAS = int(os.environ.get('HUELLA_MAPA_MAX_CELDAS', 1024))
+
+# Los triggers de Huella apuntan las diferencias de los contadores de
+# estadísticas y de la rejilla del mapa, y la tarea aplicar_agregados las
+# suma cada este tiempo
+HUELLA_AGREGADOS_INTERVALO = int(os.environ.get('HUELLA_AGREGADOS_INTERVALO', 30))  # segundos
+CELERY_BEAT_SCHEDULE['aplicar-agregados'] = {
+    'task': 'huella_app.tasks.aplicar_agregados',
+    'schedule': float(HUELLA_AGREGADOS_INTERVALO),
+}
+
+# Exportación de huellas: filas leídas por viaje al cursor de servidor y por trozo de CSV
+HUELLA_EXPORTACION_TAMANO_BLOQUE = int(os.environ.get('HUELLA_EXPORTACION_TAMANO_BLOQUE', 2000))
+# Exportaciones en segundo plano: una petición con los mismos filtros y formato
+# reutiliza el fichero generado hace menos de HUELLA_EXPORTACION_TTL; los
+# ficheros se borran pasada HUELLA_EXPORTACION_RETENCION (debe ser mayor)
+HUELLA_EXPORTACION_TTL = int(os.environ.get('HUELLA_EXPORTACION_TTL', 3600))  # segundos
+HUELLA_EXPORTACION_RETENCION = int(os.environ.get('HUELLA_EXPORTACION_RETENCION', 86400))  # segundos
+CELERY_BEAT_SCHEDULE['limpiar-exportaciones'] = {
+    'task': 'huella_app.tasks.limpiar_exportaciones',
+    'schedule': 3600.0,  # cada hora
+}
+
+# Auditoría diferida: las señales dejan los AuditLog en una lista de Redis y
+# la tarea volcar_auditoria los escribe por lotes (también al parar el worker)
+HUELLA_AUDITORIA_DIFERIDA = os.environ.get('HUELLA_AUDITORIA_DIFERIDA', 'true').lower() == 'true'
+HUELLA_AUDITORIA_REDIS_URL = os.environ.get('HUELLA_AUDITORIA_REDIS_URL', CELERY_BROKER_URL)
+HUELLA_AUDITORIA_TAMANO_VOLCADO = int(os.environ.get('HUELLA_AUDITORIA_TAMANO_VOLCADO', 500))  # registros
+HUELLA_AUDITORIA_INTERVALO_VOLCADO = int(os.environ.get('HUELLA_AUDITORIA_INTERVALO_VOLCADO', 10))  # segundos
+# Particiones mensuales de AuditLog (tarea limpiar_logs)
+HUELLA_AUDITORIA_RETENCION_MESES = int(os.environ.get('HUELLA_AUDITORIA_RETENCION_MESES', 12))
+HUELLA_AUDITORIA_PURGA = os.environ.get('HUELLA_AUDITORIA_PURGA', 'drop')  # 'drop' o 'detach'
+HUELLA_AUDITORIA_MESES_ADELANTE = int(os.environ.get('HUELLA_AUDITORIA_MESES_ADELANTE', 3))
+CELERY_BEAT_SCHEDULE['volcar-auditoria'] = {
+    'task': 'huella_app.tasks.volcar_auditoria',
+    'schedule': float(HUELLA_AUDITORIA_INTERVALO_VOLCADO),
+}
@@ -2,6 +2,8 @@
 // Veersion: 1.0
 // Autor: Equipo Weblla
 // Fecha: 28-01-2026
+// Última Modificación: 17-10-2026
+// Cambio realizado: exportación CSV en segundo plano (fichero comprimido).
 // Descripción:
 // Componente React para listar, buscar, filtrar, paginar, crear, editar y eliminar huellas.
 // Incluye exportación a CSV y gestión de permisos basada en roles de usuario.
@@ -12,6 +14,7 @@ import axios from "axios";
 const API_URL = import.meta.env.VITE_API_URL
   ? `${import.meta.env.VITE_API_URL}/api/huellas/`
   : "/api/huellas/";
+const EXPORTACIONES_URL = `${import.meta.env.VITE_API_URL || ""}/api/exportaciones/`;
 
 export default function HuellaList({ token, usuario }) {
   const [huellas, setHuellas] = useState([]);
@@ -24,6 +27,12 @@ export default function HuellaList({ token, usuario }) {
   const [page, setPage] = useState(1);
   const [pageSize, setPageSize] = useState(50);
   const [count, setCount] = useState(0);
+  const [countAproximado, setCountAproximado] = useState(false);
+  // Paginación por cursor: cursor de la página actual y enlaces del backend
+  const [cursor, setCursor] = useState(null);
+  const [siguiente, setSiguiente] = useState(null);
+  const [anterior, setAnterior] = useState(null);
+  const [exportando, setExportando] = useState(false);
 
   // Modal
   const [modalAbierto, setModalAbierto] = useState(false);
@@ -50,16 +59,24 @@ export default function HuellaList({ token, usuario }) {
 
   useEffect(() => {
     fetchHuellas();
-  }, [page, pageSize]);
+  }, [cursor, pageSize]);
+
+  // Extrae el parámetro cursor de un enlace next/previous
+  function cursorDe(enlace) {
+    if (!enlace) return null;
+    return new URL(enlace, window.location.origin).searchParams.get("cursor");
+  }
 
   async function fetchHuellas() {
     setLoading(true);
     setError(null);
     try {
       const params = {
-        page: page,
+        paginacion: "cursor",
+        total: "aproximado",
         page_size: pageSize,
       };
+      if (cursor) params.cursor = cursor;
       if (search) params.search = search;
       if (codigopostal) params.codigopostal = codigopostal;
       if (provincia) params.provincia = provincia;
@@ -75,6 +92,9 @@ export default function HuellaList({ token, usuario }) {
       const results = Array.isArray(data) ? data : data.results || [];
       setHuellas(results);
       setCount(data.count || results.length);
+      setCountAproximado(Boolean(data.count_aproximado));
+      setSiguiente(data.next || null);
+      setAnterior(data.previous || null);
     } catch (e) {
       setError("Error cargando huellas: " + (e.message || e));
       setHuellas([]);
@@ -86,6 +106,7 @@ export default function HuellaList({ token, usuario }) {
   function handleSearchSubmit(e) {
     e.preventDefault();
     setPage(1);
+    setCursor(null);
     fetchHuellas();
   }
 
@@ -95,6 +116,7 @@ export default function HuellaList({ token, usuario }) {
     setProvincia("");
     setPoblacion("");
     setPage(1);
+    setCursor(null);
     fetchHuellas();
   }
 
@@ -191,35 +213,55 @@ export default function HuellaList({ token, usuario }) {
   };
 
   async function handleExportarCSV() {
+    // La exportación la genera un worker: se pide, se consulta su estado
+    // cada pocos segundos y al completarse se descarga el fichero .csv.gz
     try {
-      const params = new URLSearchParams();
-      if (codigopostal) params.append("codigopostal", codigopostal);
-      if (provincia) params.append("provincia", provincia);
-      if (poblacion) params.append("poblacion", poblacion);
+      setExportando(true);
+      const filtros = {};
+      if (codigopostal) filtros.codigopostal = codigopostal;
+      if (provincia) filtros.provincia = provincia;
+      if (poblacion) filtros.poblacion = poblacion;
 
       const headers = {};
       if (token) {
         headers["Authorization"] = `Token ${token}`;
       }
 
-      const exportUrl =
-        `${import.meta.env.VITE_API_URL || ""}/api/huellas/exportar_csv/` +
-        (params.toString() ? "?" + params.toString() : "");
+      const response = await axios.post(
+        EXPORTACIONES_URL,
+        { formato: "csv", filtros },
+        { headers },
+      );
+      let exportacion = response.data;
+      while (exportacion.estado === "PENDIENTE" || exportacion.estado === "PROCESANDO") {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const estado = await axios.get(`${EXPORTACIONES_URL}${exportacion.id}/`, { headers });
+        exportacion = estado.data;
+      }
+      if (exportacion.estado !== "COMPLETADO") {
+        throw new Error(exportacion.error || "la exportación ha fallado");
+      }
 
-      const response = await axios.get(exportUrl, {
-        headers,
-        responseType: "blob",
-      });
+      const descarga = await axios.get(
+        `${EXPORTACIONES_URL}${exportacion.id}/descargar/`,
+        { headers, responseType: "blob" },
+      );
 
-      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const url = window.URL.createObjectURL(new Blob([descarga.data]));
       const link = document.createElement("a");
       link.href = url;
-      link.setAttribute("download", "huellas.csv");
+      link.setAttribute("download", "huellas.csv.gz");
       document.body.appendChild(link);
       link.click();
       link.parentNode.removeChild(link);
+      window.URL.revokeObjectURL(url);
     } catch (error) {
-      alert("Error al exportar: " + error.message);
+      alert(
+        "Error al exportar: " +
+          (error.response?.data?.error || error.message),
+      );
+    } finally {
+      setExportando(false);
     }
   }
 
@@ -273,8 +315,9 @@ export default function HuellaList({ token, usuario }) {
           type="button"
           onClick={handleExportarCSV}
           className="btn btn-success"
+          disabled={exportando}
         >
-          Exportar CSV
+          {exportando ? "Exportando..." : "Exportar CSV"}
         </button>
       </form>
 
@@ -352,6 +395,7 @@ export default function HuellaList({ token, usuario }) {
               onChange={(e) => {
                 setPageSize(Number(e.target.value));
                 setPage(1);
+                setCursor(null);
               }}
               style={{ marginLeft: "8px" }}
             >
@@ -365,22 +409,33 @@ export default function HuellaList({ token, usuario }) {
 
         <div className="pagination">
           <button
-            disabled={page <= 1}
-            onClick={() => setPage((p) => Math.max(1, p - 1))}
+            disabled={!anterior}
+            onClick={() => {
+              setPage((p) => Math.max(1, p - 1));
+              setCursor(cursorDe(anterior));
+            }}
           >
             Anterior
           </button>
           <span>Página {page}</span>
           <button
-            disabled={huellas.length < pageSize}
-            onClick={() => setPage((p) => p + 1)}
+            disabled={!siguiente}
+            onClick={() => {
+              setPage((p) => p + 1);
+              setCursor(cursorDe(siguiente));
+            }}
           >
             Siguiente
           </button>
         </div>
       </div>
 
-      {count > 0 && <div className="footer-info">Total: {count} registros</div>}
+      {count > 0 && (
+        <div className="footer-info">
+          Total: {countAproximado ? "≈ " : ""}
+          {count} registros
+        </div>
+      )}
 
       {/* MODAL */}
       {modalAbierto && (
@@ -2,6 +2,8 @@
 // Veersion: 1.0
 // Autor: Equipo Weblla
 // Fecha: 28-01-2026
+// Última Modificación: 17-10-2026
+// Cambio realizado: las correcciones se aplican en segundo plano.
 // Descripción:
 // Componente React para la resolución de incidencias en importaciones de datos.
 // Permite a los usuarios ver, corregir y guardar incidencias detectadas durante la importación.
@@ -98,7 +100,8 @@ export default function ResolucionIncidencias({ importacionId, token }) {
       );
 
       setError("");
-      alert("Correcciones guardadas exitosamente");
+      // Las aplica un worker: la lista se actualiza cuando termine
+      alert("Correcciones enviadas: se aplicarán en segundo plano");
       cargarIncidencias();
     } catch (err) {
       setError("Error guardando correcciones: " + err.message);
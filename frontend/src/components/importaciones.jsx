@@ -105,7 +105,7 @@ export default function Importaciones({ token, usuario }) {
           headers,
         },
       );
-      setMensaje(`Importación ${id} procesada`);
+      setMensaje(`Importación ${id} enviada a procesar`);
       fetchImportaciones();
     } catch (error) {
       setMensaje(